@@ -0,0 +1,77 @@
+"""
+Shared LLM and embeddings clients on one pooled HTTP transport.
+
+ChatOpenAI and OpenAIEmbeddings each wrap an OpenAI SDK client, which in turn
+wraps an httpx client holding the connection pool (open keep-alive sockets,
+TLS sessions). Building a new ChatOpenAI per request repeats the model
+validation and SDK client setup, and with a custom transport also a new pool.
+ClientRegistry builds the clients once, on sync and async httpx clients with
+explicit pool limits, and hands out per-request variants (another model or
+temperature) as bindings on the same client, so overrides never rebuild the
+transport.
+"""
+from typing import Optional
+
+import httpx
+from langchain_core.runnables import Runnable
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+
+class ClientRegistry:
+    """LLM, embeddings and HTTP clients shared by every request of a process."""
+
+    def __init__(self, settings):
+        limits = httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        )
+        timeout = httpx.Timeout(settings.HTTP_TIMEOUT_SECONDS, connect=settings.HTTP_CONNECT_TIMEOUT_SECONDS)
+        self.http_client = httpx.Client(limits=limits, timeout=timeout)
+        self.http_async_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+
+        self.llm = ChatOpenAI(
+            model=settings.LLM_MODEL,
+            temperature=settings.LLM_TEMPERATURE,  # minimize hallucination - 0 is the most deterministic
+            streaming=True,
+            stream_usage=True,  # Token usage for streamed responses too (run token budgets)
+            http_client=self.http_client,
+            http_async_client=self.http_async_client,
+        )
+        self.embeddings = OpenAIEmbeddings(
+            model=settings.EMBEDDING_MODEL,
+            check_embedding_ctx_length=settings.EMBEDDING_CHECK_CTX_LENGTH,
+            http_client=self.http_client,
+            http_async_client=self.http_async_client,
+        )
+
+    def chat_model(
+        self,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        llm: Optional[Runnable] = None,
+    ) -> Runnable:
+        """
+        The shared chat model, with per-request overrides bound as call arguments.
+
+        Args:
+            model (Optional[str]): Model name for this request (default: LLM_MODEL)
+            temperature (Optional[float]): Sampling temperature for this request
+            llm (Optional[Runnable]): Variant of the shared model to start from,
+                e.g. the one with tools bound
+
+        Returns:
+            Runnable: A binding of the shared client; no new HTTP client is created
+        """
+        overrides = {}
+        if model is not None:
+            overrides["model"] = model
+        if temperature is not None:
+            overrides["temperature"] = temperature
+        base = self.llm if llm is None else llm
+        return base.bind(**overrides) if overrides else base
+
+    async def aclose(self):
+        """Close the connection pools."""
+        await self.http_async_client.aclose()
+        self.http_client.close()
@@ -0,0 +1,163 @@
+"""
+Single-flight coalescing of identical in-flight questions.
+
+When a dashboard or several users ask the same question at the same time,
+each request would run the whole graph (LLM calls, retrieval) on its own.
+SingleFlight runs one graph execution per key (normalized question plus
+collection version) and lets every concurrent request subscribe to it:
+streaming subscribers get the live events, and ones that join late get the
+events produced so far replayed first. Blocking subscribers wait for the
+final messages.
+
+The run is cancelled only when its last subscriber leaves. Once it ends the
+key is free again, so later requests start a new run (or hit the caches).
+"""
+import asyncio
+from typing import AsyncGenerator, AsyncIterator, Callable, Dict, List, Optional
+
+from langchain_core.messages import BaseMessage
+
+from src.retrieval.cache import normalize_query
+
+# Starts a run: gets the list to collect the run's messages in, returns its events
+RunFactory = Callable[[List[BaseMessage]], AsyncIterator[dict]]
+
+
+def flight_key(question: str, collection_version: str) -> str:
+    return f"{collection_version}:{normalize_query(question)}"
+
+
+class _Flight:
+    """One shared run: its events so far, its messages and its subscribers."""
+
+    def __init__(self, run: RunFactory):
+        self.events: List[dict] = []
+        self.messages: List[BaseMessage] = []
+        self.error = None
+        self.done = False
+        self.subscribers = 0
+        self._changed = asyncio.Event()
+        self.task = asyncio.create_task(self._run(run))
+
+    def _notify(self):
+        # Wake everyone waiting on the current event, then start a new one
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _run(self, run: RunFactory):
+        try:
+            async for event in run(self.messages):
+                self.events.append(event)
+                self._notify()
+        except asyncio.CancelledError:
+            self.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+
+    async def wait_for_change(self):
+        await self._changed.wait()
+
+
+class SingleFlight:
+    """Shared runs for identical concurrent questions, plus counters."""
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self.runs = 0
+        self.coalesced = 0
+        self.replayed_events = 0
+
+    def _join(self, key: str, run: RunFactory) -> _Flight:
+        flight = self._flights.get(key)
+        # A finished run is forgotten by a done callback; until then it must not be joined
+        if flight is None or flight.done:
+            flight = _Flight(run)
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            self.runs += 1
+        else:
+            self.coalesced += 1
+            self.replayed_events += len(flight.events)
+        flight.subscribers += 1
+        return flight
+
+    def _forget(self, key: str, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def _leave(self, key: str, flight: _Flight):
+        flight.subscribers -= 1
+        if flight.subscribers == 0 and not flight.done:
+            # Nobody is listening any more; stop the LLM and retrieval calls
+            self._forget(key, flight)
+            flight.task.cancel()
+
+    async def events(
+        self,
+        key: str,
+        run: RunFactory,
+        messages: Optional[List[BaseMessage]] = None,
+    ) -> AsyncGenerator[dict, None]:
+        """
+        Stream the events of the shared run for a key, starting it if needed.
+
+        Args:
+            key (str): flight_key() of the question
+            run (RunFactory): Starts the run when no identical one is in flight
+            messages (Optional[List[BaseMessage]]): Gets the messages the run
+                produced, once it has finished
+
+        Yields:
+            dict: Every event of the run, from its first one (replayed for late joiners)
+        """
+        flight = self._join(key, run)
+        try:
+            position = 0
+            while True:
+                while position < len(flight.events):
+                    yield flight.events[position]
+                    position += 1
+                if flight.done:
+                    break
+                await flight.wait_for_change()
+            if flight.error is not None:
+                raise flight.error
+            if messages is not None:
+                messages.extend(flight.messages)
+        finally:
+            self._leave(key, flight)
+
+    async def result(self, key: str, run: RunFactory) -> List[BaseMessage]:
+        """
+        Wait for the shared run for a key, starting it if needed.
+
+        Args:
+            key (str): flight_key() of the question
+            run (RunFactory): Starts the run when no identical one is in flight
+
+        Returns:
+            List[BaseMessage]: The messages the run produced after the question
+        """
+        flight = self._join(key, run)
+        try:
+            while not flight.done:
+                await flight.wait_for_change()
+            if flight.error is not None:
+                raise flight.error
+            return list(flight.messages)
+        finally:
+            self._leave(key, flight)
+
+    def stats(self) -> dict:
+        requests = self.runs + self.coalesced
+        return {
+            "runs": self.runs,
+            "coalesced": self.coalesced,
+            "coalesced_rate": self.coalesced / requests if requests else 0.0,
+            "replayed_events": self.replayed_events,
+            "in_flight": len(self._flights),
+        }
@@ -0,0 +1,574 @@
+"""
+Document collections served by one agent.
+
+A collection is a directory of source files with its own vector store, BM25
+and metadata indexes, retrieval cache, retriever tool and (with
+FACT_INDEX_ENABLED) fact index and lookup tool. The default collection
+(DATA_DIR, named COLLECTION_NAME) is opened at startup, answers every
+request that selects no collection and is searched by retriever_tool and
+fact_lookup_tool. Every subdirectory of COLLECTIONS_DIR is another
+collection, stored under COLLECTIONS_VECTORSTORE_DIR/<name> and searched by
+search_<name> and lookup_<name> tools.
+
+Other collections are opened (and synced with their files, like the default
+one at startup) when a request first selects them. Open collections hold
+memory: mapped vectors, Chroma's HNSW segments, BM25 postings, caches.
+CollectionRegistry keeps them in an LRU bounded by COLLECTION_CACHE_MAX_BYTES,
+with each collection's size estimated from its index files on disk. An
+evicted collection is closed once the runs still using it have finished.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict, defaultdict
+from pathlib import Path
+from typing import Annotated, Dict, Iterable, List, Optional, Sequence
+
+from langchain_core.tools import InjectedToolArg, StructuredTool
+from pydantic import BaseModel, Field
+
+from src.ingestion.facts import extract_file_facts
+from src.ingestion.pipeline import discover_sources, sync_sources
+from src.ingestion.writer import embedding_writer_from_settings
+from src.retrieval.bm25 import load_or_build_bm25
+from src.retrieval.cache import CachedRetriever, RetrievalCache
+from src.retrieval.facts import format_facts, load_or_build_fact_index
+from src.retrieval.filters import filter_spec, load_or_build_metadata_index
+from src.retrieval.hybrid import HybridRetriever
+from src.retrieval.packing import pack_context, render_passages
+from src.retrieval.rerank import RerankingRetriever, RerankStats
+from src.retrieval.stores import close_vectorstore, ingestion_paths, open_vectorstore
+
+# Tool of the default collection; the router and speculative retrieval call it by name
+DEFAULT_TOOL_NAME = "retriever_tool"
+TOOL_DESCRIPTION = "This tool searches and returns the information from {source}."
+FILTER_DESCRIPTION = "Optional filters narrow the search to one document, page range, section or date range."
+DEFAULT_FACT_TOOL_NAME = "fact_lookup_tool"
+FACT_TOOL_DESCRIPTION = (
+    "Looks up exact figures (returns, share prices, market caps, P/E ratios, revenue, EPS) in {source} "
+    "by entity, metric and year, e.g. \"S&P 500 2024 return\" or \"NVDA market cap\". Returns each figure "
+    "as written, with its page and sentence, without a document search. Use it first when the question "
+    "asks for a specific number; use the search tool for explanations and anything it doesn't find."
+)
+# Collection names double as directory names and (prefixed) as tool names
+COLLECTION_NAME_RE = re.compile(r"^[A-Za-z0-9_-]{1,50}$")
+
+
+class RetrieverToolInput(BaseModel):
+    query: str = Field(description="What to search for")
+    # Filled in by the graph, the LLM never sees them
+    token_budget: Annotated[Optional[int], InjectedToolArg] = None
+    exclude_ids: Annotated[Optional[List[str]], InjectedToolArg] = None
+
+
+class FilteredRetrieverToolInput(RetrieverToolInput):
+    document: Optional[str] = Field(None, description="Only search this document (words of its file name)")
+    page_from: Optional[int] = Field(None, description="Only search from this page on (1-based)")
+    page_to: Optional[int] = Field(None, description="Only search up to this page (inclusive)")
+    section: Optional[str] = Field(None, description="Only search this section (words of its heading, e.g. a company name)")
+    date_from: Optional[str] = Field(None, description="Only search documents dated on or after this date (YYYY-MM-DD or YYYY)")
+    date_to: Optional[str] = Field(None, description="Only search documents dated on or before this date (YYYY-MM-DD or YYYY)")
+
+
+class FactLookupToolInput(BaseModel):
+    query: str = Field(description="Entity (index, company or ticker), optionally with a metric and a year")
+
+
+class UnknownCollection(KeyError):
+    """A request selected a collection that has no directory under COLLECTIONS_DIR."""
+
+
+def format_retrieved_docs(
+    docs,
+    token_budget: int,
+    exclude_ids: Iterable[str] = (),
+    pack: bool = True,
+    source: str = "the documents",
+) -> tuple:
+    """
+    Pack retrieved chunks into the tool's text output (see src/retrieval/packing.py).
+
+    Args:
+        docs: Retrieved chunks, best first
+        token_budget (int): Max estimated tokens of the output
+        exclude_ids (Iterable[str]): Chunks already returned earlier in the conversation
+        pack (bool): Dedupe, merge and budget the chunks; otherwise list them as retrieved
+        source (str): What was searched, for the "nothing found" answer
+
+    Returns:
+        tuple: (text for the LLM, IDs of the chunks it contains)
+    """
+    if not docs:
+        return f"I found no relevant information in {source}.", []
+    if not pack:
+        text = "\n\n".join(f"Document {i+1}:\n{doc.page_content}" for i, doc in enumerate(docs))
+        return text, [doc.id for doc in docs if doc.id]
+    if token_budget <= 0:
+        return (
+            "The retrieval budget for this conversation is used up. "
+            "Answer from the documents already retrieved above."
+        ), []
+
+    included_ids, passages = pack_context(docs, token_budget, exclude_ids)
+    if not passages:
+        return "The relevant passages were already retrieved earlier in this conversation (see above).", []
+    return render_passages(passages), included_ids
+
+
+def collection_description(data_dir: Path, name: str, description_file: str) -> str:
+    """What a collection holds: its description file's text, or "the <name> collection"."""
+    try:
+        description = (Path(data_dir) / description_file).read_text(encoding="utf-8").strip()
+    except OSError:
+        description = ""
+    return description or f"the {name} collection"
+
+
+def collection_settings(settings, name: str):
+    """Settings of a collection: its source directory, store directory, name and description."""
+    if name == settings.COLLECTION_NAME:
+        return settings
+    data_dir = Path(settings.COLLECTIONS_DIR) / name
+    return settings.with_overrides(
+        COLLECTION_NAME=name,
+        COLLECTION_DESCRIPTION=collection_description(data_dir, name, settings.COLLECTION_DESCRIPTION_FILE),
+        DATA_DIR=data_dir,
+        VECTORSTORE_DIR=Path(settings.COLLECTIONS_VECTORSTORE_DIR) / name,
+        # The router's rules and centroid describe the default collection only
+        ROUTER_ENABLED=False,
+    )
+
+
+def directory_bytes(path: Path, skip: Sequence[Path] = ()) -> int:
+    """Total size of the files under a directory, leaving out the skipped subdirectories."""
+    skip = {Path(p).resolve() for p in skip}
+    total = 0
+    for root, dirs, files in os.walk(path):
+        dirs[:] = [d for d in dirs if (Path(root) / d).resolve() not in skip]
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class Collection:
+    """One collection's vector store, indexes, retriever and retriever tool."""
+
+    def __init__(self, settings, embeddings, text_splitter, tool_name: str):
+        self.name = settings.COLLECTION_NAME
+        # Named in the tool descriptions and the system prompt, e.g. "the stock_market collection"
+        self.description = settings.COLLECTION_DESCRIPTION
+        self.settings = settings
+        self.embeddings = embeddings
+        self.text_splitter = text_splitter
+
+        self.vectorstore, self.ingestion_stats = self._open_vectorstore()
+        self.rerank_stats = RerankStats() if settings.RERANK_ENABLED else None
+        # The BM25 index serves hybrid search and the router's corpus vocabulary
+        if settings.HYBRID_RETRIEVAL_ENABLED or settings.ROUTER_ENABLED:
+            self.lexical_index = self._load_lexical_index()
+        else:
+            self.lexical_index = None
+        self.metadata_index = self._load_metadata_index() if settings.METADATA_FILTERS_ENABLED else None
+        self.retrieval_cache, self.retriever = self._build_retriever()
+        self.tool = self._build_retriever_tool(tool_name)
+        # Exact figures without an embedding call or a vector search
+        if settings.FACT_INDEX_ENABLED:
+            self.fact_index = self._load_fact_index()
+            self.fact_tool = self._build_fact_tool(
+                DEFAULT_FACT_TOOL_NAME if tool_name == DEFAULT_TOOL_NAME else f"lookup_{self.name}"
+            )
+        else:
+            self.fact_index, self.fact_tool = None, None
+
+        # Registry bookkeeping: runs using the collection, and whether it waits to be closed
+        self.leases = 0
+        self.evicted = False
+        self.nbytes = 0
+
+    @property
+    def collection_version(self) -> str:
+        return self.ingestion_stats["version"]
+
+    @property
+    def tools(self) -> list:
+        """The collection's tools: the retriever tool, then the fact lookup tool if enabled."""
+        return [self.tool] + ([self.fact_tool] if self.fact_tool is not None else [])
+
+    def _open_vectorstore(self):
+        source_paths = discover_sources(self.settings.DATA_DIR, self.settings.INGEST_FILE_PATTERNS)
+        if not source_paths:
+            raise FileNotFoundError(f"No source files found under {self.settings.DATA_DIR}")
+
+        manifest_path, checkpoint_path = ingestion_paths(self.settings)
+        backend = self.settings.VECTOR_STORE_BACKEND
+        try:
+            # Open the persisted collection instead of rebuilding it on every start
+            vectorstore = open_vectorstore(self.settings, self.embeddings)
+            # Only chunks that are new or changed since the last run get embedded
+            ingestion_stats = sync_sources(
+                vectorstore,
+                source_paths,
+                self.text_splitter,
+                manifest_path,
+                workers=self.settings.INGEST_WORKERS,
+                batch_size=self.settings.INGEST_BATCH_SIZE,
+                writer=embedding_writer_from_settings(
+                    vectorstore, self.embeddings, self.settings, checkpoint_path=checkpoint_path
+                ),
+            )
+            print(
+                f"{backend} vector store {self.name!r} ready: {ingestion_stats['added']} chunks added, "
+                f"{ingestion_stats['deleted']} deleted, {ingestion_stats['unchanged']} unchanged"
+            )
+        except Exception as e:
+            print(f"Error setting up the {backend} vector store {self.name!r}: {str(e)}")
+            raise
+
+        return vectorstore, ingestion_stats
+
+    def _load_lexical_index(self):
+        def fetch_chunks():
+            found = self.vectorstore.get(include=["documents"])
+            return found["ids"], found["documents"]
+
+        return load_or_build_bm25(
+            self.settings.BM25_INDEX_PATH,
+            self.collection_version,
+            fetch_chunks,
+            k1=self.settings.BM25_K1,
+            b=self.settings.BM25_B,
+        )
+
+    def _load_metadata_index(self):
+        def fetch_metadatas():
+            found = self.vectorstore.get(include=["metadatas"])
+            return found["ids"], found["metadatas"]
+
+        return load_or_build_metadata_index(self.settings.METADATA_INDEX_PATH, self.collection_version, fetch_metadatas)
+
+    def _load_fact_index(self):
+        return load_or_build_fact_index(
+            self.settings.FACT_INDEX_DIR,
+            discover_sources(self.settings.DATA_DIR, self.settings.INGEST_FILE_PATTERNS),
+            extract_file_facts,
+        )
+
+    def _build_retriever(self):
+        # K is the amount of chunks to return; hybrid search and reranking work on larger pools
+        k = 5
+        hybrid = self.settings.HYBRID_RETRIEVAL_ENABLED
+        rerank = self.settings.RERANK_ENABLED
+        pool_k = self.settings.RERANK_CANDIDATES if rerank else k
+        vector_k = max(self.settings.HYBRID_CANDIDATES, pool_k) if hybrid else pool_k
+
+        retrieval_cache, retriever = self._build_vector_retriever(vector_k)
+        if hybrid:
+            retriever = HybridRetriever(
+                vector_retriever=retriever,
+                lexical_index=self.lexical_index,
+                vectorstore=self.vectorstore,
+                k=pool_k,
+                candidates=vector_k,
+                rrf_k=self.settings.RRF_K,
+            )
+
+        if rerank:
+            retriever = RerankingRetriever(
+                candidate_retriever=retriever,
+                vectorstore=self.vectorstore,
+                embeddings=self.embeddings,
+                cache=retrieval_cache,
+                lexical_index=self.lexical_index,
+                k=k,
+                dense_weight=self.settings.RERANK_DENSE_WEIGHT,
+                stats=self.rerank_stats,
+            )
+        return retrieval_cache, retriever
+
+    def _build_vector_retriever(self, k: int):
+        if not self.settings.RETRIEVAL_CACHE_ENABLED:
+            # Same as vectorstore.as_retriever(search_type="similarity"), plus metadata filters
+            retriever = CachedRetriever(vectorstore=self.vectorstore, embeddings=self.embeddings, k=k)
+            return None, retriever
+
+        # Repeated questions skip the embedding call and the similarity search
+        retrieval_cache = RetrievalCache(
+            collection_version=self.collection_version,
+            backend=self.settings.RETRIEVAL_CACHE_BACKEND,
+            path=self.settings.RETRIEVAL_CACHE_PATH,
+            max_entries=self.settings.RETRIEVAL_CACHE_MAX_ENTRIES,
+            ttl_seconds=self.settings.RETRIEVAL_CACHE_TTL_SECONDS,
+            embedding_model=self.settings.EMBEDDING_MODEL,
+        )
+        retriever = CachedRetriever(
+            vectorstore=self.vectorstore,
+            embeddings=self.embeddings,
+            cache=retrieval_cache,
+            k=k
+        )
+        return retrieval_cache, retriever
+
+    def _build_retriever_tool(self, name: str) -> StructuredTool:
+        retriever = self.retriever
+        metadata_index = self.metadata_index
+        default_budget = self.settings.TOOL_RESULT_TOKEN_BUDGET
+        pack = self.settings.CONTEXT_PACKING_ENABLED
+        source = self.description
+        description = TOOL_DESCRIPTION.format(source=source)
+
+        def resolve(filters: dict):
+            """The chunk filter for the call, and the tool output when nothing matches it."""
+            chunk_filter = metadata_index.resolve(**filters) if metadata_index and filters else None
+            if chunk_filter is None:
+                return None, None
+            print(f"Filter: {chunk_filter}")
+            if not chunk_filter.ids:
+                scope = ", ".join(f"{name}={value!r}" for name, value in chunk_filter.spec.items())
+                return chunk_filter, (
+                    f"No passages match the filter ({scope}). Search again with a different filter "
+                    f"or none.\n{metadata_index.describe()}", []
+                )
+            return chunk_filter, None
+
+        def retriever_tool(
+            query: str,
+            token_budget: Optional[int] = None,
+            exclude_ids: Optional[List[str]] = None,
+            **filters,
+        ) -> tuple:
+            chunk_filter, no_match = resolve(filter_spec(filters))
+            if no_match is not None:
+                return no_match
+            docs = retriever.invoke(query, chunk_filter=chunk_filter)
+            return format_retrieved_docs(
+                docs, default_budget if token_budget is None else token_budget, exclude_ids or (), pack, source
+            )
+
+        async def aretriever_tool(
+            query: str,
+            token_budget: Optional[int] = None,
+            exclude_ids: Optional[List[str]] = None,
+            **filters,
+        ) -> tuple:
+            """Async variant of retriever_tool used by the async graph nodes."""
+            chunk_filter, no_match = resolve(filter_spec(filters))
+            if no_match is not None:
+                return no_match
+            docs = await retriever.ainvoke(query, chunk_filter=chunk_filter)
+            return format_retrieved_docs(
+                docs, default_budget if token_budget is None else token_budget, exclude_ids or (), pack, source
+            )
+
+        # token_budget and exclude_ids are filled in by the graph, the LLM never sees them;
+        # the artifact carries the IDs of the chunks returned. The coroutine gives the tool
+        # a native async path so ainvoke doesn't fall back to a thread
+        return StructuredTool.from_function(
+            func=retriever_tool,
+            coroutine=aretriever_tool,
+            name=name,
+            description=f"{description}\n{FILTER_DESCRIPTION}" if metadata_index is not None else description,
+            args_schema=FilteredRetrieverToolInput if metadata_index is not None else RetrieverToolInput,
+            response_format="content_and_artifact",
+        )
+
+    def _build_fact_tool(self, name: str) -> StructuredTool:
+        fact_index = self.fact_index
+        limit = self.settings.FACT_LOOKUP_MAX_RESULTS
+
+        def fact_lookup_tool(query: str) -> tuple:
+            facts, parsed = fact_index.lookup(query, limit=limit)
+            print(f"Fact lookup: {parsed} -> {len(facts)} facts")
+            # No chunk IDs: the figures don't count as retrieved passages
+            return format_facts(facts, parsed, fact_index), []
+
+        async def afact_lookup_tool(query: str) -> tuple:
+            """A lookup takes microseconds, so the async path just runs it inline."""
+            return fact_lookup_tool(query)
+
+        return StructuredTool.from_function(
+            func=fact_lookup_tool,
+            coroutine=afact_lookup_tool,
+            name=name,
+            description=FACT_TOOL_DESCRIPTION.format(source=self.description),
+            args_schema=FactLookupToolInput,
+            response_format="content_and_artifact",
+        )
+
+    def index_bytes(self) -> int:
+        """Estimated memory of the open collection: the size of its index files."""
+        # The default collection's directory also holds the other collections' stores
+        return directory_bytes(self.settings.VECTORSTORE_DIR, skip=[self.settings.COLLECTIONS_VECTORSTORE_DIR])
+
+    def close(self):
+        close_vectorstore(self.vectorstore)
+        print(f"Closed collection {self.name!r}")
+
+
+class CollectionRegistry:
+    """
+    The default collection plus an LRU of other collections, opened on demand.
+
+    Runs acquire() the collections they search and release() them when done;
+    a collection evicted in between is closed by the last release.
+    """
+
+    def __init__(self, settings, embeddings, text_splitter, max_bytes: int):
+        self.settings = settings
+        self.embeddings = embeddings
+        self.text_splitter = text_splitter
+        self.max_bytes = max_bytes
+        self.default = Collection(settings, embeddings, text_splitter, DEFAULT_TOOL_NAME)
+        self._open: "OrderedDict[str, Collection]" = OrderedDict()
+        # Evicted, waiting for their last run to finish
+        self._closing: Dict[str, Collection] = {}
+        self._lock = threading.Lock()
+        # One open at a time per collection; different collections open in parallel
+        self._open_locks: Dict[str, threading.Lock] = defaultdict(threading.Lock)
+        self.hits = 0
+        self.opens = 0
+        self.evictions = 0
+
+    def available(self) -> List[str]:
+        """Names of the default collection and every collection directory."""
+        names = [self.default.name]
+        collections_dir = Path(self.settings.COLLECTIONS_DIR)
+        if collections_dir.is_dir():
+            names += sorted(
+                path.name for path in collections_dir.iterdir()
+                if path.is_dir() and COLLECTION_NAME_RE.match(path.name) and path.name != self.default.name
+            )
+        return names
+
+    def check(self, names: Iterable[str]):
+        """Raise UnknownCollection for a name without a collection directory."""
+        for name in names:
+            if name == self.default.name:
+                continue
+            if not COLLECTION_NAME_RE.match(name) or not (Path(self.settings.COLLECTIONS_DIR) / name).is_dir():
+                raise UnknownCollection(name)
+
+    def acquire(self, names: Sequence[str]) -> List[Collection]:
+        """
+        Open (or reuse) collections for a run; blocks while a collection is first synced.
+
+        Args:
+            names (Sequence[str]): Collection names, as selected by the request
+
+        Returns:
+            List[Collection]: The collections, in order; pass them to release() when the run ends
+        """
+        self.check(names)
+        acquired = []
+        try:
+            for name in dict.fromkeys(names):
+                acquired.append(self.default if name == self.default.name else self._acquire(name))
+        except BaseException:
+            self.release(acquired)
+            raise
+        self._evict(keep={collection.name for collection in acquired})
+        return acquired
+
+    def _lease(self, name: str) -> Optional[Collection]:
+        with self._lock:
+            collection = self._open.get(name)
+            if collection is None and name in self._closing:
+                # Evicted but still in use: take it back instead of opening a second copy
+                collection = self._open[name] = self._closing.pop(name)
+                collection.evicted = False
+            if collection is None:
+                return None
+            self._open.move_to_end(name)
+            collection.leases += 1
+            self.hits += 1
+            return collection
+
+    def _acquire(self, name: str) -> Collection:
+        collection = self._lease(name)
+        if collection is not None:
+            return collection
+        with self._open_locks[name]:
+            collection = self._lease(name)
+            if collection is not None:
+                return collection
+            collection = Collection(
+                collection_settings(self.settings, name),
+                self.embeddings,
+                self.text_splitter,
+                f"search_{name}",
+            )
+            collection.nbytes = collection.index_bytes()
+            with self._lock:
+                collection.leases = 1
+                self._open[name] = collection
+                self.opens += 1
+            print(f"Opened collection {name!r} ({collection.nbytes / 2**20:.1f} MiB of indexes)")
+            return collection
+
+    def _evict(self, keep: Iterable[str] = ()):
+        """Close least recently used collections until the open ones fit the byte budget."""
+        to_close = []
+        with self._lock:
+            total = sum(collection.nbytes for collection in self._open.values())
+            for name in list(self._open):
+                if total <= self.max_bytes:
+                    break
+                if name in keep:
+                    # A run needs it right now; it goes as soon as it is the LRU entry again
+                    continue
+                collection = self._open.pop(name)
+                total -= collection.nbytes
+                self.evictions += 1
+                if collection.leases:
+                    collection.evicted = True
+                    self._closing[name] = collection
+                else:
+                    to_close.append(collection)
+        for collection in to_close:
+            collection.close()
+
+    def release(self, collections: Iterable[Collection]):
+        """End a run's use of its collections, closing evicted ones nobody uses anymore."""
+        to_close = []
+        with self._lock:
+            for collection in collections:
+                if collection is self.default:
+                    continue
+                collection.leases -= 1
+                if collection.evicted and collection.leases == 0:
+                    self._closing.pop(collection.name, None)
+                    to_close.append(collection)
+        for collection in to_close:
+            collection.close()
+
+    def get(self, name: str) -> Collection:
+        """An acquired collection by name."""
+        if name == self.default.name:
+            return self.default
+        with self._lock:
+            collection = self._open.get(name) or self._closing.get(name)
+        if collection is None:
+            raise UnknownCollection(name)
+        return collection
+
+    def close(self):
+        with self._lock:
+            collections = list(self._open.values()) + list(self._closing.values())
+            self._open.clear()
+            self._closing.clear()
+        for collection in collections:
+            collection.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "open": {name: collection.nbytes for name, collection in self._open.items()},
+                "closing": sorted(self._closing),
+                "bytes": sum(collection.nbytes for collection in self._open.values()),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "opens": self.opens,
+                "evictions": self.evictions,
+            }
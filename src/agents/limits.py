@@ -0,0 +1,160 @@
+"""
+Per-request limits on the agent loop.
+
+Each run carries three limits in its LangGraph config ("configurable"):
+
+- max_tool_iterations: retrieval rounds per question; once reached, the LLM
+  is called without tools and told to answer from what it has
+- deadline: wall-clock time (time.monotonic()) by which the run must end;
+  async LLM and tool calls are cancelled when it passes
+- token_budget: estimated LLM tokens (prompts plus completions) per question
+
+When the deadline or the token budget runs out, the turn ends with a partial
+answer built from the passages retrieved so far, without another LLM call.
+Limited answers are marked in response_metadata["limit"], so they are never
+stored in the semantic answer cache.
+"""
+import time
+from typing import Optional, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+from src.agents.memory import history_tokens, message_tokens
+
+LIMIT_TOOL_ITERATIONS = "tool_iterations"
+LIMIT_DEADLINE = "deadline"
+LIMIT_TOKEN_BUDGET = "token_budget"
+
+_PARTIAL_INTROS = {
+    LIMIT_DEADLINE: "I ran out of time for this request before I could finish the answer.",
+    LIMIT_TOKEN_BUDGET: "I reached the processing budget for this request before I could finish the answer.",
+}
+
+
+def run_limits(
+    settings,
+    max_tool_iterations: Optional[int] = None,
+    deadline_seconds: Optional[float] = None,
+    token_budget: Optional[int] = None,
+) -> dict:
+    """
+    Limits for one run, starting the deadline clock now.
+
+    Args:
+        settings: Settings module or namespace (for the defaults)
+        max_tool_iterations (Optional[int]): Retrieval rounds per question
+        deadline_seconds (Optional[float]): Wall-clock time for the whole run
+        token_budget (Optional[int]): Estimated LLM tokens per question
+
+    Returns:
+        dict: Entries for the run config's "configurable" section
+    """
+    if deadline_seconds is None:
+        deadline_seconds = settings.AGENT_DEADLINE_SECONDS
+    return {
+        "max_tool_iterations": (
+            settings.AGENT_MAX_TOOL_ITERATIONS if max_tool_iterations is None else max_tool_iterations
+        ),
+        "deadline": time.monotonic() + deadline_seconds,
+        "token_budget": settings.AGENT_TOKEN_BUDGET if token_budget is None else token_budget,
+    }
+
+
+def limits_from_config(config) -> Optional[dict]:
+    """The run's limits, or None for runs started without them."""
+    configurable = (config or {}).get("configurable", {})
+    if "deadline" not in configurable:
+        return None
+    return {key: configurable[key] for key in ("max_tool_iterations", "deadline", "token_budget")}
+
+
+def remaining_seconds(limits: Optional[dict]) -> Optional[float]:
+    if limits is None:
+        return None
+    return max(limits["deadline"] - time.monotonic(), 0.0)
+
+
+def _current_turn(messages: Sequence[BaseMessage]) -> int:
+    for i in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[i], HumanMessage):
+            return i
+    return 0
+
+
+def turn_usage(messages: Sequence[BaseMessage]) -> Tuple[int, int]:
+    """
+    Retrieval rounds and LLM tokens spent on the current question so far.
+
+    Token counts come from the provider's usage metadata when it is
+    reported (it isn't for every streamed response) and are estimated from
+    the prompt and completion text otherwise.
+    """
+    start = _current_turn(messages)
+    rounds = tokens = 0
+    for i in range(start, len(messages)):
+        message = messages[i]
+        if not isinstance(message, AIMessage):
+            continue
+        rounds += bool(message.tool_calls)
+        usage = message.usage_metadata
+        if usage:
+            tokens += usage.get("total_tokens", 0)
+        else:
+            tokens += history_tokens(messages[:i]) + message_tokens(message)
+    return rounds, tokens
+
+
+def exhausted(limits: Optional[dict], messages: Sequence[BaseMessage]) -> Optional[str]:
+    """The limit that ends the turn before the next LLM call, if any."""
+    if limits is None:
+        return None
+    if time.monotonic() >= limits["deadline"]:
+        return LIMIT_DEADLINE
+    if turn_usage(messages)[1] >= limits["token_budget"]:
+        return LIMIT_TOKEN_BUDGET
+    return None
+
+
+def partial_answer(
+    messages: Sequence[BaseMessage],
+    reason: str,
+    max_passages: int = 3,
+    passage_chars: int = 600,
+) -> AIMessage:
+    """
+    Answer from the current question's tool results, without an LLM call.
+
+    Args:
+        messages (Sequence[BaseMessage]): Conversation so far
+        reason (str): LIMIT_DEADLINE or LIMIT_TOKEN_BUDGET
+        max_passages (int): Retrieved passages quoted in the answer
+        passage_chars (int): Characters kept per passage
+
+    Returns:
+        AIMessage: The partial answer, marked with response_metadata["limit"]
+    """
+    passages = []
+    for message in messages[_current_turn(messages):]:
+        if isinstance(message, ToolMessage) and message.artifact:
+            # Packed tool output separates passages with blank lines after a "Document i" header
+            for passage in str(message.content).split("\n\nDocument ")[:max_passages - len(passages)]:
+                passage = passage if passage.startswith("Document ") else "Document " + passage
+                passages.append(passage[:passage_chars].rstrip() + (" ..." if len(passage) > passage_chars else ""))
+        if len(passages) >= max_passages:
+            break
+
+    content = _PARTIAL_INTROS[reason]
+    if passages:
+        content += " Here is the most relevant information I found so far:\n\n" + "\n\n".join(passages)
+    else:
+        content += " Please try again, or ask a narrower question."
+    return AIMessage(content=content, response_metadata={"limit": reason})
+
+
+def is_limited(message: BaseMessage) -> bool:
+    return isinstance(message, AIMessage) and "limit" in message.response_metadata
+
+
+def is_partial_answer(message: BaseMessage) -> bool:
+    """True for answers built by partial_answer() rather than the LLM."""
+    return isinstance(message, AIMessage) and message.response_metadata.get("limit") in _PARTIAL_INTROS
@@ -0,0 +1,118 @@
+"""
+Bounded conversation history for thread-aware runs.
+
+With a checkpointer every turn is appended to the thread's state, and every
+LLM call re-sends all of it. compact_history keeps the prompt roughly
+constant over long sessions. Once the history passes a token threshold it
+first drops the tool calls and results of finished turns, since their
+answers already carry what mattered. If that is not enough, it folds the
+oldest turns into a short extractive summary (question plus the start of
+the answer). No extra LLM call is spent on summarizing.
+"""
+from typing import List, Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, RemoveMessage, SystemMessage, ToolMessage
+
+from src.retrieval.packing import estimate_tokens
+
+SUMMARY_NAME = "conversation_summary"
+
+
+def message_tokens(message: BaseMessage) -> int:
+    tokens = estimate_tokens(str(message.content))
+    for tool_call in getattr(message, "tool_calls", None) or []:
+        tokens += estimate_tokens(str(tool_call.get("args", "")))
+    return tokens
+
+
+def history_tokens(messages: Sequence[BaseMessage]) -> int:
+    return sum(message_tokens(message) for message in messages)
+
+
+def split_turns(messages: Sequence[BaseMessage]) -> List[List[BaseMessage]]:
+    """Group messages into turns, each starting at a HumanMessage (a leading summary forms its own group)."""
+    turns: List[List[BaseMessage]] = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def _is_summary(message: BaseMessage) -> bool:
+    return isinstance(message, SystemMessage) and message.name == SUMMARY_NAME
+
+
+def _summarize_turn(turn: List[BaseMessage], answer_chars: int) -> str:
+    question = next((str(m.content) for m in turn if isinstance(m, HumanMessage)), "")
+    answers = [m for m in turn if isinstance(m, AIMessage) and not m.tool_calls and m.content]
+    answer = str(answers[-1].content) if answers else "(no answer)"
+    # One line each, so an older summary can be trimmed line by line
+    question, answer = " ".join(question.split()), " ".join(answer.split())
+    if len(answer) > answer_chars:
+        answer = answer[:answer_chars].rsplit(" ", 1)[0] + " ..."
+    return f"- Q: {question}\n  A: {answer}"
+
+
+def compact_history(
+    messages: Sequence[BaseMessage],
+    threshold: int,
+    keep_turns: int = 2,
+    answer_chars: int = 400,
+) -> List[BaseMessage]:
+    """
+    Compute the state updates that shrink a thread's history below a token threshold.
+
+    Args:
+        messages (Sequence[BaseMessage]): Thread history, ending with the new question
+        threshold (int): Estimated tokens above which the history is compacted
+        keep_turns (int): Finished turns always kept verbatim (minus their tool messages)
+        answer_chars (int): Characters of each old answer kept in the summary
+
+    Returns:
+        List[BaseMessage]: RemoveMessage and replacement messages for the
+            add_messages reducer; empty when nothing needs to change
+    """
+    if history_tokens(messages) <= threshold:
+        return []
+
+    turns = split_turns(messages)
+    finished = turns[:-1]  # The last turn is the question being answered now
+    removed = set()
+
+    # 1. Tool traffic of finished turns: their final answers already carry the findings
+    for turn in finished:
+        for message in turn:
+            if isinstance(message, ToolMessage) or (isinstance(message, AIMessage) and message.tool_calls):
+                removed.add(message.id)
+
+    remaining = [m for m in messages if m.id not in removed]
+    updates: List[BaseMessage] = [RemoveMessage(id=message_id) for message_id in removed]
+    if history_tokens(remaining) <= threshold:
+        return updates
+
+    # 2. Fold the oldest finished turns (and any earlier summary) into one summary message
+    old_turns = finished[:-keep_turns] if keep_turns else finished
+    if not old_turns:
+        return updates
+
+    lines = []
+    for turn in old_turns:
+        if _is_summary(turn[0]):
+            lines.extend(str(turn[0].content).split("\n")[1:])
+        else:
+            lines.extend(_summarize_turn(turn, answer_chars).split("\n"))
+    # The summary itself stays bounded: the oldest entries go first
+    while len(lines) > 1 and estimate_tokens("\n".join(lines)) > threshold // 4:
+        lines.pop(0)
+        while lines and lines[0].startswith("  "):
+            lines.pop(0)
+
+    old_ids = [m.id for turn in old_turns for m in turn]
+    summary = SystemMessage(
+        id=old_ids[0],  # Same ID, so the reducer replaces the first old message in place
+        name=SUMMARY_NAME,
+        content="Summary of the earlier conversation:\n" + "\n".join(lines),
+    )
+    to_remove = set(old_ids[1:]) | removed
+    return [summary] + [RemoveMessage(id=message_id) for message_id in to_remove]
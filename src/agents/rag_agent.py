@@ -1,223 +1,990 @@
 from dotenv import load_dotenv
 import os
 import sys
+import threading
 from langgraph.graph import StateGraph, END
-from typing import TypedDict, Annotated, Sequence, AsyncGenerator
-from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage, ToolMessage
-from operator import add as add_messages
-from langchain_openai import ChatOpenAI
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.document_loaders import PyPDFLoader
+from typing import TypedDict, Annotated, Sequence, AsyncGenerator, Optional, List
+from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage, ToolMessage, AIMessage
+from langgraph.graph.message import add_messages
+from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+import aiosqlite
+import sqlite3
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_chroma import Chroma
-from langchain_core.tools import tool
+from langchain_core.runnables import RunnableLambda
 import asyncio
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
 # Add the project root to Python path to handle imports
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
+from src.retrieval.batching import MicroBatchingEmbeddings
+from src.retrieval.filters import filter_spec
+from src.retrieval.packing import estimate_tokens
+from src.agents.semantic_cache import SemanticAnswerCache
+from src.agents.memory import compact_history
+from src.agents.clients import ClientRegistry
+from src.agents.speculation import SpeculativeRetrieval
+from src.agents.coalescing import SingleFlight, flight_key
+from src.agents.limits import (
+    LIMIT_DEADLINE, LIMIT_TOOL_ITERATIONS, exhausted, is_limited, is_partial_answer, limits_from_config,
+    partial_answer, remaining_seconds, run_limits, turn_usage,
+)
+from src.agents.collections import CollectionRegistry, DEFAULT_TOOL_NAME, format_retrieved_docs
+from src.agents.router import QueryRouter, corpus_centroid, ROUTE_AGENT, ROUTE_DIRECT, ROUTE_RETRIEVE
+
 load_dotenv()
 
-llm = ChatOpenAI(
-    model="gpt-4o", 
-    temperature=0,
-    streaming=True  # Enable streaming
-) # minimize hallucination - temperature = 0 makes the model output more deterministic 
 
-# Our Embedding Model - has to also be compatible with the LLM
-embeddings = OpenAIEmbeddings(
-    model="text-embedding-3-small",
-)
+class AgentState(TypedDict):
+    messages: Annotated[Sequence[BaseMessage], add_messages]
+    route: str  # Set by the router node for the current question
 
 
-from src.config.settings import PDF_PATH
-pdf_path = str(PDF_PATH)
+def should_continue(state: AgentState):
+    """Check if the last message contains tool calls."""
+    result = state['messages'][-1]
+    return hasattr(result, 'tool_calls') and len(result.tool_calls) > 0
 
 
-if not os.path.exists(pdf_path):
-    raise FileNotFoundError(f"PDF file not found: {pdf_path}")
+# {source} is what the default collection holds (COLLECTION_DESCRIPTION)
+system_prompt = """
+You are an intelligent AI assistant who answers questions based on {source}, loaded into your knowledge base.
+Use the retriever tool available to answer questions about its contents. You can make multiple calls if needed.
+If you need to look up some information before asking a follow up question, you are allowed to do that!
+Please always cite the specific parts of the documents you use in your answers.
+"""
 
-pdf_loader = PyPDFLoader(pdf_path) # This loads the PDF
+# Appended to the system prompts when the collections have fact indexes (FACT_INDEX_ENABLED)
+fact_lookup_prompt = """
+For a specific figure (a return, share price, market cap, P/E ratio, revenue or EPS), call the fact lookup tool first: it answers from an index of the figures in the documents, with their page and sentence. Search the documents when it finds nothing or the question needs more than the number.
+"""
 
-# Checks if the PDF is there
-try:
-    pages = pdf_loader.load()
-    print(f"PDF has been loaded and has {len(pages)} pages")
-except Exception as e:
-    print(f"Error loading PDF: {e}")
-    raise
+# Appended when a question has used up its retrieval rounds; the LLM then has no tools
+final_answer_prompt = """
+You have reached the maximum number of document searches for this question.
+Answer now, using only the information retrieved above. If something the user asked about was not found, say so briefly.
+"""
 
-# Chunking Process
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=1000,
-    chunk_overlap=200
-)
+# For requests that select collections: one search tool per collection instead of retriever_tool
+collections_prompt = """
+You are an intelligent AI assistant who answers questions based on the document collections loaded into your knowledge base.
+Each collection has its own tools: {tools}. Search the collections relevant to the question. You can make multiple calls if needed.
+Please always cite the specific parts of the documents you use in your answers, and the collection they come from.
+"""
 
+# For messages the router sends straight to the LLM, without tools
+direct_prompt = """
+You are a friendly AI assistant who answers questions based on {source}.
+Reply briefly and naturally to greetings, thanks and small talk. If the user asks about its topic, invite them to ask their question.
+"""
 
-pages_split = text_splitter.split_documents(pages) # We now apply this to our pages
 
-from src.config.settings import VECTORSTORE_DIR
-persist_directory = str(VECTORSTORE_DIR)
-collection_name = "stock_market"
+def latest_turn(messages: Sequence[BaseMessage]) -> list:
+    """Messages from the last HumanMessage on, i.e. the turn that was just answered."""
+    for i in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[i], HumanMessage):
+            return list(messages[i:])
+    return list(messages)
 
-# If our collection does not exist in the directory, we create using the os command
-if not os.path.exists(persist_directory):
-    os.makedirs(persist_directory)
 
+def message_events(message: BaseMessage, include_text: bool = False) -> list:
+    """
+    Convert a finished graph message into /chat events.
 
-try:
-    # Here, we actually create the chroma database using our embeddigns model
-    vectorstore = Chroma.from_documents(
-        documents=pages_split,
-        embedding=embeddings,
-        persist_directory=persist_directory,
-        collection_name=collection_name
-    )
-    print(f"Created ChromaDB vector store!")
-    
-except Exception as e:
-    print(f"Error setting up ChromaDB: {str(e)}")
-    raise
+    Args:
+        message (BaseMessage): An AI message or tool result produced by the graph
+        include_text (bool): Also emit the AI message text (used when replaying
+            cached answers, since live text arrives as tokens)
 
+    Returns:
+        list: Events in the /chat wire format
+    """
+    if getattr(message, "tool_calls", None):
+        return [
+            {
+                "type": "tool_call",
+                "data": {
+                    "id": tool_call['id'],
+                    "name": tool_call['name'],
+                    "args": tool_call['args']
+                }
+            }
+            for tool_call in message.tool_calls
+        ]
+    if isinstance(message, ToolMessage):
+        return [{
+            "type": "tool_result",
+            "data": {
+                "toolCallId": message.tool_call_id,
+                "result": message.content
+            }
+        }]
+    if include_text and isinstance(message, AIMessage) and message.content:
+        return [{"type": "text", "data": message.content}]
+    return []
 
-# Now we create our retriever 
-retriever = vectorstore.as_retriever(
-    search_type="similarity",
-    search_kwargs={"k": 5} # K is the amount of chunks to return
-)
 
-@tool
-def retriever_tool(query: str) -> str:
+class RAGAgent:
     """
-    This tool searches and returns the information from the Stock Market Performance 2024 document.
+    The RAG agent and everything it runs on: LLM, embeddings, vector store,
+    retriever tool, caches and the compiled LangGraph graph.
+
+    Built once per process by build_rag_agent(); nothing here runs at import time.
     """
 
-    docs = retriever.invoke(query)
+    def __init__(self, settings):
+        self.settings = settings
 
-    if not docs:
-        return "I found no relevant information in the Stock Market Performance 2024 document."
-    
-    results = []
-    for i, doc in enumerate(docs):
-        results.append(f"Document {i+1}:\n{doc.page_content}")
-    
-    return "\n\n".join(results)
+        # LLM and embeddings clients share one pooled HTTP transport for the agent's lifetime
+        self.clients = ClientRegistry(settings)
+        self.llm = self.clients.llm
 
+        # Our Embedding Model - has to also be compatible with the LLM
+        # Concurrent query embeddings are coalesced into one API request
+        self.embeddings = MicroBatchingEmbeddings(
+            self.clients.embeddings,
+            window_ms=settings.EMBEDDING_BATCH_WINDOW_MS,
+            max_batch_size=settings.EMBEDDING_BATCH_MAX_SIZE,
+            max_inflight=settings.EMBEDDING_BATCH_MAX_INFLIGHT,
+        )
 
-tools = [retriever_tool]
+        # Chunking Process
+        self.text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=settings.CHUNK_SIZE,
+            chunk_overlap=settings.CHUNK_OVERLAP
+        )
 
-llm = llm.bind_tools(tools)
+        pdf_path = str(settings.PDF_PATH)
+        if not os.path.exists(pdf_path):
+            raise FileNotFoundError(f"PDF file not found: {pdf_path}")
+        # The default collection opens now; the others when a request first selects them
+        self.collections = CollectionRegistry(
+            settings, self.embeddings, self.text_splitter, max_bytes=settings.COLLECTION_CACHE_MAX_BYTES
+        )
+        default = self.collections.default
+        self.vectorstore, self.ingestion_stats = default.vectorstore, default.ingestion_stats
+        self.rerank_stats = default.rerank_stats
+        self.lexical_index = default.lexical_index
+        self.metadata_index = default.metadata_index
+        self.fact_index = default.fact_index
+        self.retrieval_cache, self.retriever = default.retrieval_cache, default.retriever
 
-class AgentState(TypedDict):
-    messages: Annotated[Sequence[BaseMessage], add_messages]
+        self.tools = default.tools
+        self.system_prompt = system_prompt.format(source=default.description) + (
+            fact_lookup_prompt if default.fact_tool is not None else ""
+        )
+        self.direct_prompt = direct_prompt.format(source=default.description)
+        self.tools_dict = {our_tool.name: our_tool for our_tool in self.tools} # Creating a dictionary of our tools
+        self.llm_with_tools = self.llm.bind_tools(self.tools)
+        self.router = self._build_router() if settings.ROUTER_ENABLED else None
+        if settings.SPECULATIVE_RETRIEVAL_ENABLED:
+            self.speculation = SpeculativeRetrieval(
+                self.retriever,
+                self._aembed_query,
+                min_similarity=settings.SPECULATIVE_MIN_SIMILARITY,
+            )
+        else:
+            self.speculation = None
 
+        # Answers to semantically equivalent questions are served without the LLM loop
+        if settings.SEMANTIC_CACHE_ENABLED:
+            self.semantic_cache = SemanticAnswerCache(
+                threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+                max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+                ttl_seconds=settings.SEMANTIC_CACHE_TTL_SECONDS,
+            )
+        else:
+            self.semantic_cache = None
 
-def should_continue(state: AgentState):
-    """Check if the last message contains tool calls."""
-    result = state['messages'][-1]
-    return hasattr(result, 'tool_calls') and len(result.tool_calls) > 0
+        # Identical questions asked at the same time share one graph run
+        self.single_flight = SingleFlight() if settings.COALESCING_ENABLED else None
 
+        self.graph = self._build_graph()
 
-system_prompt = """
-You are an intelligent AI assistant who answers questions about Stock Market Performance in 2024 based on the PDF document loaded into your knowledge base.
-Use the retriever tool available to answer questions about the stock market performance data. You can make multiple calls if needed.
-If you need to look up some information before asking a follow up question, you are allowed to do that!
-Please always cite the specific parts of the documents you use in your answers.
-"""
+        # Thread-aware runs persist their state in SQLite; sync and async callers
+        # need their own saver, both pointing at the same file
+        self.settings.CHECKPOINT_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        self._checkpoint_conn = sqlite3.connect(str(self.settings.CHECKPOINT_DB_PATH), check_same_thread=False)
+        self.thread_graph = self._build_graph(SqliteSaver(self._checkpoint_conn))
+        self._athread_graph = None
+        self._athread_conn = None
+        self._athread_lock = asyncio.Lock()
+
+    @property
+    def collection_version(self) -> str:
+        return self.ingestion_stats["version"]
+
+    def _build_router(self) -> QueryRouter:
+        centroid = corpus_centroid(self.vectorstore.get(include=["embeddings"])["embeddings"])
+        return QueryRouter(
+            lexical_index=self.lexical_index,
+            centroid=centroid,
+            centroid_threshold=self.settings.ROUTER_CENTROID_THRESHOLD,
+            specific_term_df=self.settings.ROUTER_SPECIFIC_TERM_DF,
+            min_term_coverage=self.settings.ROUTER_MIN_TERM_COVERAGE,
+        )
+
+    # LLM Agent
+    def _limited_answer(self, messages: list, reason: str) -> AgentState:
+        print(f"Run limit reached ({reason}), answering with what was retrieved so far")
+        return {'messages': [partial_answer(messages, reason)]}
+
+    def _run_tools(self, config) -> Optional[dict]:
+        """Tools by name of the collections a run selected; None for the default retriever_tool."""
+        names = (config or {}).get("configurable", {}).get("collections")
+        if not names:
+            return None
+        tools = [run_tool for name in names for run_tool in self.collections.get(name).tools]
+        return {run_tool.name: run_tool for run_tool in tools}
+
+    def _llm_request(self, messages: list, limits: Optional[dict], tools: Optional[dict] = None):
+        """Model, prompt and applied limit (or None) for the next LLM step."""
+        if tools is None:
+            prompt, llm_with_tools = [SystemMessage(content=self.system_prompt)] + messages, self.llm_with_tools
+        else:
+            prompt = collections_prompt.format(tools=", ".join(tools))
+            if self.settings.FACT_INDEX_ENABLED:
+                prompt += fact_lookup_prompt
+            prompt = [SystemMessage(content=prompt)] + messages
+            llm_with_tools = self.llm.bind_tools(list(tools.values()))
+        if limits is not None and turn_usage(messages)[0] >= limits["max_tool_iterations"]:
+            print(f"Run limit reached ({LIMIT_TOOL_ITERATIONS}), asking for a final answer")
+            return self.llm, prompt + [SystemMessage(content=final_answer_prompt)], LIMIT_TOOL_ITERATIONS
+        return llm_with_tools, prompt, None
+
+    def call_llm(self, state: AgentState, config=None) -> AgentState:
+        """Function to call the LLM with the current state."""
+        messages = list(state['messages'])
+        limits = limits_from_config(config)
+        reason = exhausted(limits, messages)
+        if reason is not None:
+            return self._limited_answer(messages, reason)
+
+        llm, prompt, limit = self._llm_request(messages, limits, self._run_tools(config))
+        message = llm.invoke(prompt)
+        if limit is not None:
+            message.response_metadata["limit"] = limit
+        return {'messages': [message]}
+
+    async def acall_llm(self, state: AgentState, config=None) -> AgentState:
+        """Async version of call_llm; the call is cancelled when the run's deadline passes."""
+        messages = list(state['messages'])
+        limits = limits_from_config(config)
+        reason = exhausted(limits, messages)
+        if reason is not None:
+            return self._limited_answer(messages, reason)
+
+        tools = self._run_tools(config)
+        llm, prompt, limit = self._llm_request(messages, limits, tools)
+        key = None
+        if (
+            self.speculation is not None
+            and tools is None
+            and limit is None
+            and isinstance(messages[-1], HumanMessage)
+            and messages[-1].id
+        ):
+            # First LLM call for this question: retrieve for the question meanwhile
+            key = messages[-1].id
+            self.speculation.start(key, str(messages[-1].content))
+        try:
+            message = await asyncio.wait_for(llm.ainvoke(prompt), remaining_seconds(limits))
+        except asyncio.TimeoutError:
+            if key is not None:
+                self.speculation.discard(key)
+            return self._limited_answer(messages, LIMIT_DEADLINE)
+        except BaseException:
+            if key is not None:
+                self.speculation.discard(key)
+            raise
+        if key is not None and not message.tool_calls:
+            self.speculation.discard(key)
+        if limit is not None:
+            message.response_metadata["limit"] = limit
+        return {'messages': [message]}
+
+    def _embed_query(self, text: str) -> List[float]:
+        if self.retrieval_cache is not None:
+            return self.retrieval_cache.embed_query(self.embeddings, text)
+        return self.embeddings.embed_query(text)
+
+    async def _aembed_query(self, text: str) -> List[float]:
+        # Through the retrieval cache, the retriever reuses this embedding
+        if self.retrieval_cache is not None:
+            return await self.retrieval_cache.aembed_query(self.embeddings, text)
+        return await self.embeddings.aembed_query(text)
+
+    def respond(self, state: AgentState) -> AgentState:
+        """Answer small talk with one plain LLM call: no tools, no retrieval."""
+        messages = [SystemMessage(content=self.direct_prompt)] + list(state['messages'])
+        return {'messages': [self.llm.invoke(messages)]}
+
+    async def arespond(self, state: AgentState) -> AgentState:
+        messages = [SystemMessage(content=self.direct_prompt)] + list(state['messages'])
+        return {'messages': [await self.llm.ainvoke(messages)]}
+
+    def _router_tool_call(self, question: str) -> dict:
+        return {
+            "name": DEFAULT_TOOL_NAME,
+            "args": {"query": question},
+            "id": f"call_router_{uuid.uuid4().hex[:12]}",
+            "type": "tool_call",
+        }
+
+    def _routed(self, route: str, by_embedding: bool, tool_call=None, result=None) -> AgentState:
+        self.router.record(route, by_embedding)
+        print(f"Router: {route}{' (embedding)' if by_embedding else ''}")
+        if route != ROUTE_RETRIEVE:
+            return {'route': route}
+        # Recorded as a regular tool call, so the LLM, the UI and the budgets see it like any other
+        return {'route': route, 'messages': [AIMessage(content="", tool_calls=[tool_call]), result]}
+
+    def route(self, state: AgentState, config=None) -> AgentState:
+        """Pick direct / retrieve / agent for the new question; retrieve fetches the context right away."""
+        if self._run_tools(config) is not None:
+            # The router knows the default collection only; runs over other collections go to the LLM
+            return {'route': ROUTE_AGENT}
+        question = str(state['messages'][-1].content)
+        route, by_embedding = self.router.route_by_rules(question), False
+        if route is None:
+            route, by_embedding = ROUTE_AGENT, self.router.uses_embedding
+            if by_embedding:
+                route = self.router.route_by_vector(self._embed_query(question))
+        if route != ROUTE_RETRIEVE:
+            return self._routed(route, by_embedding)
+        tool_call = self._router_tool_call(question)
+        result = self._run_tool_call(tool_call, self._tool_context(state, 1))
+        return self._routed(route, by_embedding, tool_call, result)
 
+    async def aroute(self, state: AgentState, config=None) -> AgentState:
+        """Async version of route."""
+        if self._run_tools(config) is not None:
+            return {'route': ROUTE_AGENT}
+        question = str(state['messages'][-1].content)
+        route, by_embedding = self.router.route_by_rules(question), False
+        if route is None:
+            route, by_embedding = ROUTE_AGENT, self.router.uses_embedding
+            if by_embedding:
+                route = self.router.route_by_vector(await self._aembed_query(question))
+        if route != ROUTE_RETRIEVE:
+            return self._routed(route, by_embedding)
+        tool_call = self._router_tool_call(question)
+        result = await self._arun_tool_call(tool_call, self._tool_context(state, 1))
+        return self._routed(route, by_embedding, tool_call, result)
 
-tools_dict = {our_tool.name: our_tool for our_tool in tools} # Creating a dictionary of our tools
+    def _unknown_tool_message(self, t) -> ToolMessage:
+        print(f"\nTool: {t['name']} does not exist.")
+        result = "Incorrect Tool Name, Please Retry and Select tool from List of Available tools."
+        return ToolMessage(tool_call_id=t['id'], name=t['name'], content=result)
 
-# LLM Agent
-def call_llm(state: AgentState) -> AgentState:
-    """Function to call the LLM with the current state."""
-    messages = list(state['messages'])
-    messages = [SystemMessage(content=system_prompt)] + messages
-    message = llm.invoke(messages)
-    return {'messages': [message]}
+    def _tool_context(self, state: AgentState, n_calls: int) -> dict:
+        """
+        Token budget and already-returned chunks for this turn's tool calls.
 
+        Every retrieval turn re-sends all earlier tool results to the LLM, so
+        the per-question budget shrinks with each one and is split between
+        the calls of the current turn. Chunks returned for earlier questions
+        of a thread are still excluded while their tool results are kept.
+        """
+        used, sent_ids = 0, []
+        for message in state['messages']:
+            if isinstance(message, HumanMessage):
+                # A new question in a thread starts a fresh budget; compaction bounds older turns
+                used = 0
+            elif isinstance(message, ToolMessage):
+                used += estimate_tokens(str(message.content))
+                if isinstance(message.artifact, list):
+                    sent_ids.extend(message.artifact)
+        remaining = max(self.settings.CONVERSATION_TOOL_TOKEN_BUDGET - used, 0)
+        token_budget = min(self.settings.TOOL_RESULT_TOKEN_BUDGET, remaining // max(n_calls, 1))
+        return {"token_budget": token_budget, "exclude_ids": sent_ids}
 
-# Retriever Agent
-def take_action(state: AgentState) -> AgentState:
-    """Execute tool calls from the LLM's response."""
+    def _tool_call_input(self, t, context: dict) -> dict:
+        return {
+            "type": "tool_call",
+            "id": t['id'],
+            "name": t['name'],
+            "args": {"query": t['args'].get('query', ''), **filter_spec(t['args']), **context},
+        }
 
-    tool_calls = state['messages'][-1].tool_calls
-    results = []
-    for t in tool_calls:
+    def _run_tool_call(self, t, context: dict, tools: Optional[dict] = None) -> ToolMessage:
+        """Run a single tool call; the tool returns a ToolMessage with the chunk IDs as artifact."""
         print(f"Calling Tool: {t['name']} with query: {t['args'].get('query', 'No query provided')}")
-        
+        tools_dict = self.tools_dict if tools is None else tools
+
         if not t['name'] in tools_dict: # Checks if a valid tool is present
-            print(f"\nTool: {t['name']} does not exist.")
-            result = "Incorrect Tool Name, Please Retry and Select tool from List of Available tools."
-        
+            return self._unknown_tool_message(t)
+
+        result = tools_dict[t['name']].invoke(self._tool_call_input(t, context))
+        print(f"Result length: {len(str(result.content))} (budget {context['token_budget']} tokens)")
+        return result
+
+    async def _arun_tool_call(
+        self,
+        t,
+        context: dict,
+        speculation_key: Optional[str] = None,
+        tools: Optional[dict] = None,
+    ) -> ToolMessage:
+        """Async version of _run_tool_call; uses the speculative retrieval when it matches the query."""
+        print(f"Calling Tool: {t['name']} with query: {t['args'].get('query', 'No query provided')}")
+        tools_dict = self.tools_dict if tools is None else tools
+
+        if not t['name'] in tools_dict: # Checks if a valid tool is present
+            return self._unknown_tool_message(t)
+
+        # The speculative search was for the whole corpus, a filtered call needs its own
+        if speculation_key is not None and t['name'] == DEFAULT_TOOL_NAME and not filter_spec(t['args']):
+            docs = await self.speculation.take(speculation_key, t['args'].get('query', ''))
+            if docs is not None:
+                content, artifact = format_retrieved_docs(
+                    docs, context['token_budget'], context['exclude_ids'], self.settings.CONTEXT_PACKING_ENABLED,
+                    self.collections.default.description,
+                )
+                print(f"Result length: {len(content)} (speculative, budget {context['token_budget']} tokens)")
+                return ToolMessage(content=content, artifact=artifact, tool_call_id=t['id'], name=t['name'])
+
+        result = await tools_dict[t['name']].ainvoke(self._tool_call_input(t, context))
+        print(f"Result length: {len(str(result.content))} (budget {context['token_budget']} tokens)")
+        return result
+
+    # Retriever Agent
+    def take_action(self, state: AgentState, config=None) -> AgentState:
+        """Execute tool calls from the LLM's response."""
+
+        tool_calls = state['messages'][-1].tool_calls
+        context = self._tool_context(state, len(tool_calls))
+        tools = self._run_tools(config)
+        if len(tool_calls) <= 1:
+            results = [self._run_tool_call(t, context, tools) for t in tool_calls]
         else:
-            result = tools_dict[t['name']].invoke(t['args'].get('query', ''))
-            print(f"Result length: {len(str(result))}")
-            
+            # Fan the calls out; map() keeps results in tool call order
+            workers = min(len(tool_calls), self.settings.TOOL_CALL_CONCURRENCY)
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(lambda t: self._run_tool_call(t, context, tools), tool_calls))
 
-        # Appends the Tool Message
-        results.append(ToolMessage(tool_call_id=t['id'], name=t['name'], content=str(result)))
+        print("Tools Execution Complete. Back to the model!")
+        return {'messages': results}
 
-    print("Tools Execution Complete. Back to the model!")
-    return {'messages': results}
+    async def atake_action(self, state: AgentState, config=None) -> AgentState:
+        """Async version of take_action; tool calls run concurrently and stop at the run's deadline."""
 
+        tool_calls = state['messages'][-1].tool_calls
+        context = self._tool_context(state, len(tool_calls))
+        semaphore = asyncio.Semaphore(self.settings.TOOL_CALL_CONCURRENCY)
+        tools = self._run_tools(config)
+        speculation_key = None
+        # Speculation only runs for the default collection (see acall_llm)
+        if self.speculation is not None and tools is None:
+            question = next((m for m in reversed(state['messages']) if isinstance(m, HumanMessage)), None)
+            speculation_key = question.id if question is not None else None
 
-graph = StateGraph(AgentState)
-graph.add_node("llm", call_llm)
-graph.add_node("retriever_agent", take_action)
+        async def run_bounded(t):
+            async with semaphore:
+                return await self._arun_tool_call(t, context, speculation_key, tools)
 
-graph.add_conditional_edges(
-    "llm",
-    should_continue,
-    {True: "retriever_agent", False: END}
-)
-graph.add_edge("retriever_agent", "llm")
-graph.set_entry_point("llm")
+        # gather() returns results in tool call order regardless of completion order
+        try:
+            results = await asyncio.wait_for(
+                asyncio.gather(*(run_bounded(t) for t in tool_calls)),
+                remaining_seconds(limits_from_config(config)),
+            )
+        except asyncio.TimeoutError:
+            # Every tool call needs a result; the LLM node then ends the turn on the deadline
+            results = [
+                ToolMessage(tool_call_id=t['id'], name=t['name'], content="The search timed out.")
+                for t in tool_calls
+            ]
+        finally:
+            if speculation_key is not None:
+                # Not matched by any of this turn's calls: it won't be later either
+                self.speculation.discard(speculation_key)
+
+        print("Tools Execution Complete. Back to the model!")
+        return {'messages': list(results)}
+
+    def compact(self, state: AgentState) -> AgentState:
+        """Keep a thread's history under HISTORY_TOKEN_THRESHOLD before the LLM sees it."""
+        updates = compact_history(
+            state['messages'],
+            threshold=self.settings.HISTORY_TOKEN_THRESHOLD,
+            keep_turns=self.settings.HISTORY_KEEP_TURNS,
+            answer_chars=self.settings.HISTORY_SUMMARY_ANSWER_CHARS,
+        )
+        if updates:
+            print(f"Compacting conversation history ({len(updates)} messages updated)")
+        return {'messages': updates}
+
+    def _build_graph(self, checkpointer=None):
+        graph = StateGraph(AgentState)
+        # Each node has a sync and an async implementation: invoke() uses the first,
+        # ainvoke()/astream() the second, so the API never blocks its event loop
+        graph.add_node("compact", self.compact)
+        graph.add_node("llm", RunnableLambda(self.call_llm, afunc=self.acall_llm))
+        graph.add_node("retriever_agent", RunnableLambda(self.take_action, afunc=self.atake_action))
+
+        graph.add_conditional_edges(
+            "llm",
+            should_continue,
+            {True: "retriever_agent", False: END}
+        )
+        graph.add_edge("retriever_agent", "llm")
+        if self.router is not None:
+            graph.add_node("router", RunnableLambda(self.route, afunc=self.aroute))
+            graph.add_node("respond", RunnableLambda(self.respond, afunc=self.arespond))
+            graph.add_edge("compact", "router")
+            graph.add_conditional_edges(
+                "router",
+                lambda state: state['route'],
+                {ROUTE_DIRECT: "respond", ROUTE_RETRIEVE: "llm", ROUTE_AGENT: "llm"}
+            )
+            graph.add_edge("respond", END)
+        else:
+            graph.add_edge("compact", "llm")
+        graph.set_entry_point("compact")
+
+        return graph.compile(checkpointer=checkpointer)
+
+    async def _async_thread_graph(self):
+        """Graph with an AsyncSqliteSaver, created on first use inside the running event loop."""
+        if self._athread_graph is None:
+            async with self._athread_lock:
+                if self._athread_graph is None:
+                    self._athread_conn = await aiosqlite.connect(str(self.settings.CHECKPOINT_DB_PATH))
+                    self._athread_graph = self._build_graph(AsyncSqliteSaver(self._athread_conn))
+        return self._athread_graph
 
-rag_agent = graph.compile()
+    def _run_config(
+        self,
+        thread_id: Optional[str],
+        limits: Optional[dict],
+        collections: Optional[List[str]] = None,
+    ) -> dict:
+        """LangGraph config carrying the thread, the run's limits (defaults from settings) and collections."""
+        limits = limits or run_limits(self.settings)
+        configurable = dict(limits)
+        if thread_id is not None:
+            configurable["thread_id"] = thread_id
+        if collections is not None:
+            configurable["collections"] = list(collections)
+        # Backstop only: compact, router, an LLM + tool step per retrieval round and the final answer
+        return {"configurable": configurable, "recursion_limit": 2 * limits["max_tool_iterations"] + 8}
+
+    async def _graph_for(self, thread_id: Optional[str], limits: Optional[dict], collections: Optional[List[str]] = None):
+        """Return (graph, run config) for a stateless or a thread-aware run."""
+        graph = self.graph if thread_id is None else await self._async_thread_graph()
+        return graph, self._run_config(thread_id, limits, collections)
+
+    def _selected_collections(self, collections: Optional[Sequence[str]]) -> Optional[List[str]]:
+        """
+        Collection names a run searches, or None for the default collection alone.
+
+        Raises:
+            UnknownCollection: A name has no collection directory
+        """
+        if not collections:
+            return None
+        names = list(dict.fromkeys(collections))
+        if names == [self.collections.default.name]:
+            return None
+        self.collections.check(names)
+        return names
+
+    async def _acquire_collections(self, collections: Optional[List[str]]) -> list:
+        """Open the run's collections off the event loop; release them with collections.release()."""
+        if collections is None:
+            return []
+        opening = asyncio.ensure_future(asyncio.to_thread(self.collections.acquire, collections))
+        try:
+            return await asyncio.shield(opening)
+        except asyncio.CancelledError:
+            # The thread still finishes opening; give the leases back when it does
+            opening.add_done_callback(
+                lambda done: done.cancelled() or done.exception() or self.collections.release(done.result())
+            )
+            raise
+
+    async def aclose(self):
+        """Close the checkpoint database connections, the embedding batcher and the HTTP connection pools."""
+        if self._athread_conn is not None:
+            await self._athread_conn.close()
+            self._athread_conn = None
+            self._athread_graph = None
+        self._checkpoint_conn.close()
+        self.collections.close()
+        self.embeddings.close()
+        await self.clients.aclose()
+
+    def _coalesces(self, thread_id: Optional[str], limits: Optional[dict], collections: Optional[List[str]]) -> bool:
+        # Thread turns depend on their history, custom limits and collections change the answer
+        return self.single_flight is not None and thread_id is None and limits is None and collections is None
+
+    async def _starts_thread(
+        self,
+        thread_id: Optional[str],
+        limits: Optional[dict],
+        collections: Optional[List[str]],
+    ) -> bool:
+        """
+        True for the first turn of a thread that can be answered like a stateless question.
+
+        The UI sends a thread_id from its first message on; without history
+        the answer doesn't depend on the thread, so it can be coalesced and
+        cached, then saved to the thread with _save_turn().
+        """
+        if thread_id is None or limits is not None or collections is not None:
+            return False
+        if self.single_flight is None and self.semantic_cache is None:
+            return False
+        graph = await self._async_thread_graph()
+        state = await graph.aget_state({"configurable": {"thread_id": thread_id}})
+        return not state.values.get("messages")
+
+    async def _save_turn(self, thread_id: str, messages: List[BaseMessage]):
+        """Write a turn answered outside the thread graph to the thread's checkpoint."""
+        graph = await self._async_thread_graph()
+        # As the llm node's output: its final answer ends the run, so nothing is left to execute
+        await graph.aupdate_state({"configurable": {"thread_id": thread_id}}, {"messages": messages}, as_node="llm")
+
+    async def _semantic_cache_lookup(
+        self,
+        question: str,
+        thread_id: Optional[str] = None,
+        collections: Optional[List[str]] = None,
+    ):
+        """Return (question embedding, cached messages or None); (None, None) when disabled."""
+        # In a thread the answer depends on the earlier turns, so it can't be shared;
+        # cached answers come from the default collection
+        if self.semantic_cache is None or thread_id is not None or collections is not None:
+            return None, None
+        vector = await self.embeddings.aembed_query(question)
+        entry = self.semantic_cache.lookup(vector, self.collection_version)
+        if entry is not None:
+            print(f"Semantic cache hit ({entry['similarity']:.3f}) for: {entry['question']}")
+            return vector, entry["messages"]
+        return vector, None
+
+    def invoke(
+        self,
+        question: str,
+        thread_id: Optional[str] = None,
+        limits: Optional[dict] = None,
+        collections: Optional[Sequence[str]] = None,
+    ) -> dict:
+        """
+        Run the graph synchronously for one question (CLI usage); see ainvoke for the arguments.
+
+        The deadline is checked between steps only; calls in progress are not cancelled.
+        """
+        messages = [HumanMessage(content=question)]
+        collections = self._selected_collections(collections)
+        config = self._run_config(thread_id, limits, collections)
+        acquired = self.collections.acquire(collections) if collections is not None else []
+        try:
+            if thread_id is None:
+                return self.graph.invoke({"messages": messages}, config)
+            result = self.thread_graph.invoke({"messages": messages}, config)
+        finally:
+            self.collections.release(acquired)
+        return {"messages": latest_turn(result['messages'])}
+
+    async def ainvoke(
+        self,
+        question: str,
+        thread_id: Optional[str] = None,
+        limits: Optional[dict] = None,
+        collections: Optional[Sequence[str]] = None,
+    ) -> dict:
+        """
+        Run the RAG agent for one question, answering from the semantic cache when possible.
+
+        Without a thread_id, limits or collections, a question identical to one
+        already in flight waits for that run instead of starting its own. So
+        does the first turn of a thread, which is then saved to the thread.
+
+        Args:
+            question (str): The question to ask the RAG agent
+            thread_id (Optional[str]): Continue this conversation; its history is
+                loaded from and saved to the checkpoint database
+            limits (Optional[dict]): Tool iterations, deadline and token budget
+                for this run, from run_limits() (default: the settings' limits)
+            collections (Optional[Sequence[str]]): Collections to search, each
+                with its own tool (default: the default collection)
+
+        Returns:
+            dict: The final graph state ({"messages": [...]}); for a thread only
+                the messages of this turn
+
+        Raises:
+            UnknownCollection: A selected collection does not exist
+        """
+        messages = [HumanMessage(content=question)]
+        collections = self._selected_collections(collections)
+        if await self._starts_thread(thread_id, limits, collections):
+            result = await self.ainvoke(question)
+            await self._save_turn(thread_id, result['messages'])
+            return result
+        if self._coalesces(thread_id, limits, collections):
+            # Identical questions in flight share one run (streamed, so /chat requests can join it too)
+            key = flight_key(question, self.collection_version)
+            produced = await self.single_flight.result(
+                key, lambda produced: self._stream_events(question, None, None, produced)
+            )
+            return {"messages": messages + produced}
+
+        vector, cached = await self._semantic_cache_lookup(question, thread_id, collections)
+        if cached is not None:
+            return {"messages": messages + cached}
+
+        graph, config = await self._graph_for(thread_id, limits, collections)
+        acquired = await self._acquire_collections(collections)
+        try:
+            result = await graph.ainvoke({"messages": messages}, config)
+        finally:
+            self.collections.release(acquired)
+        if thread_id is not None:
+            return {"messages": latest_turn(result['messages'])}
+        # Answers cut short by a limit are not worth repeating
+        if vector is not None and not any(is_limited(m) for m in result['messages']):
+            self.semantic_cache.store(
+                question, vector, self.collection_version, result['messages'][len(messages):]
+            )
+        return result
+
+    async def stream_events(
+        self,
+        question: str,
+        thread_id: Optional[str] = None,
+        limits: Optional[dict] = None,
+        collections: Optional[Sequence[str]] = None,
+    ) -> AsyncGenerator[dict, None]:
+        """
+        Stream tool calls, tool results and LLM tokens as the graph produces them.
+
+        Closing the generator (e.g. on a client disconnect) cancels the graph
+        run, including LLM and retrieval calls in flight; a run shared with
+        identical concurrent questions is cancelled when its last listener leaves.
+
+        Args:
+            question (str): The question to ask the RAG agent
+            thread_id (Optional[str]): Continue this conversation (see ainvoke)
+            limits (Optional[dict]): Run limits (see ainvoke)
+            collections (Optional[Sequence[str]]): Collections to search (see ainvoke)
+
+        Yields:
+            dict: Events in the /chat wire format ({"type": ..., "data": ...})
+        """
+        collections = self._selected_collections(collections)
+        save_to = None
+        if await self._starts_thread(thread_id, limits, collections):
+            save_to, thread_id = thread_id, None
+
+        produced: List[BaseMessage] = []
+        if self._coalesces(thread_id, limits, collections):
+            key = flight_key(question, self.collection_version)
+            events = self.single_flight.events(
+                key, lambda produced: self._stream_events(question, None, None, produced), produced
+            )
+        else:
+            events = self._stream_events(question, thread_id, limits, produced, collections)
+        async for event in events:
+            yield event
+
+        if save_to is not None:
+            await self._save_turn(save_to, [HumanMessage(content=question)] + produced)
+
+    async def _stream_events(
+        self,
+        question: str,
+        thread_id: Optional[str],
+        limits: Optional[dict],
+        produced: List[BaseMessage],
+        collections: Optional[List[str]] = None,
+    ) -> AsyncGenerator[dict, None]:
+        """stream_events() for one run of its own; the run's messages are appended to produced."""
+        messages = [HumanMessage(content=question)]
+
+        vector, cached = await self._semantic_cache_lookup(question, thread_id, collections)
+        if cached is not None:
+            produced.extend(cached)
+            # Replay the stored trace in the same event format as a live run
+            for message in cached:
+                for event in message_events(message, include_text=True):
+                    yield event
+            return
+
+        graph, config = await self._graph_for(thread_id, limits, collections)
+        acquired = await self._acquire_collections(collections)
+        try:
+            # "messages" carries LLM tokens, "updates" carries each node's finished output
+            async for mode, payload in graph.astream(
+                {"messages": messages},
+                config,
+                stream_mode=["messages", "updates"]
+            ):
+                if mode == "messages":
+                    chunk, metadata = payload
+                    if (
+                        metadata.get("langgraph_node") in ("llm", "respond")
+                        and isinstance(chunk, AIMessage)
+                        and isinstance(chunk.content, str)
+                        and chunk.content
+                    ):
+                        yield {"type": "text", "data": chunk.content}
+                    continue
+
+                for update in payload.values():
+                    for message in (update or {}).get("messages", []):
+                        produced.append(message)
+                        # Partial answers are built without an LLM call, so no tokens were streamed for them
+                        for event in message_events(message, include_text=is_partial_answer(message)):
+                            yield event
+        finally:
+            self.collections.release(acquired)
+
+        # Only complete runs are cached; a disconnect stops the generator before this point
+        if vector is not None and produced and not any(is_limited(m) for m in produced):
+            self.semantic_cache.store(question, vector, self.collection_version, produced)
+
+    def metrics(self) -> dict:
+        """Cache and batching counters for the /metrics endpoint."""
+        return {
+            "embedding_batches": self.embeddings.stats(),
+            "retrieval_cache": self.retrieval_cache.stats() if self.retrieval_cache else None,
+            "semantic_cache": self.semantic_cache.stats() if self.semantic_cache else None,
+            "reranker": self.rerank_stats.stats() if self.rerank_stats else None,
+            "router": self.router.stats() if self.router else None,
+            "speculative_retrieval": self.speculation.stats() if self.speculation else None,
+            "coalescing": self.single_flight.stats() if self.single_flight else None,
+            "vector_index": self.vectorstore.index_stats() if hasattr(self.vectorstore, "index_stats") else None,
+            "fact_index": self.fact_index.stats() if self.fact_index is not None else None,
+            "collections": self.collections.stats(),
+        }
+
+
+def build_rag_agent(settings=None) -> RAGAgent:
+    """
+    Build a RAG agent from a settings object.
+
+    Args:
+        settings: Module or namespace with the values from src.config.settings
+            (defaults to that module)
+
+    Returns:
+        RAGAgent: A ready-to-use agent with its vector store synced
+    """
+    if settings is None:
+        from src.config import settings
+    return RAGAgent(settings)
+
+
+_agent: Optional[RAGAgent] = None
+_agent_lock = threading.Lock()
+
+
+def get_rag_agent() -> RAGAgent:
+    """Return the process-wide agent, building it on first use."""
+    global _agent
+    if _agent is None:
+        with _agent_lock:
+            if _agent is None:
+                _agent = build_rag_agent()
+    return _agent
+
+
+def __getattr__(name):
+    # Keep `from src.agents.rag_agent import rag_agent` working without import-time side effects
+    if name == "rag_agent":
+        return get_rag_agent().graph
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # Function to query the RAG agent (for API usage)
-def query_rag_agent(question: str):
+def query_rag_agent(
+    question: str,
+    thread_id: Optional[str] = None,
+    limits: Optional[dict] = None,
+    collections: Optional[Sequence[str]] = None,
+):
     """
     Query the RAG agent with a specific question.
-    
+
     Args:
         question (str): The question to ask the RAG agent
-        
+        thread_id (Optional[str]): Conversation to continue, if any
+        limits (Optional[dict]): Run limits from run_limits(), if not the defaults
+        collections (Optional[Sequence[str]]): Collections to search, if not the default one
+
     Returns:
         str: The agent's response
     """
-    messages = [HumanMessage(content=question)]
-    result = rag_agent.invoke({"messages": messages})
+    result = get_rag_agent().invoke(question, thread_id, limits, collections)
     return result['messages'][-1].content
 
 
+async def ainvoke_rag_agent(
+    question: str,
+    thread_id: Optional[str] = None,
+    limits: Optional[dict] = None,
+    collections: Optional[Sequence[str]] = None,
+) -> dict:
+    """Async query of the process-wide agent (see RAGAgent.ainvoke)."""
+    return await get_rag_agent().ainvoke(question, thread_id, limits, collections)
+
+
+# Event streaming straight from the graph run (used by the /chat endpoint)
+async def stream_rag_agent_events(
+    question: str,
+    thread_id: Optional[str] = None,
+    limits: Optional[dict] = None,
+    collections: Optional[Sequence[str]] = None,
+) -> AsyncGenerator[dict, None]:
+    """Stream events from the process-wide agent (see RAGAgent.stream_events)."""
+    async for event in get_rag_agent().stream_events(question, thread_id, limits, collections):
+        yield event
+
+
+def agent_metrics() -> dict:
+    """Cache and batching counters of the process-wide agent."""
+    return get_rag_agent().metrics()
+
+
+async def close_rag_agent():
+    """Release the process-wide agent's resources, if it was built."""
+    if _agent is not None:
+        await _agent.aclose()
+
+
 # Advanced streaming function that handles the entire RAG process
-async def stream_rag_agent_advanced(question: str) -> AsyncGenerator[dict, None]:
+async def stream_rag_agent_advanced(
+    question: str,
+    model: Optional[str] = None,
+    temperature: Optional[float] = None,
+) -> AsyncGenerator[dict, None]:
     """
     Advanced streaming function that streams the entire RAG process including tool calls.
-    
+
     Args:
         question (str): The question to ask the RAG agent
-        
+        model (Optional[str]): Chat model for this call (default: LLM_MODEL)
+        temperature (Optional[float]): Sampling temperature for this call
+
     Yields:
         dict: Streamed events with type and content
     """
+    agent = get_rag_agent()
     messages = [HumanMessage(content=question)]
-    
-    # Create a streaming LLM for this specific call
-    streaming_llm = ChatOpenAI(
-        model="gpt-4o", 
-        temperature=0,
-        streaming=True
-    ).bind_tools(tools)
-    
+
+    # The shared streaming client with tools bound; overrides don't create a new client
+    streaming_llm = agent.clients.chat_model(model, temperature, llm=agent.llm_with_tools)
+
     # First, let's try to stream the initial LLM response
-    messages_with_system = [SystemMessage(content=system_prompt)] + messages
-    
+    messages_with_system = [SystemMessage(content=agent.system_prompt)] + messages
+
     try:
         # Try to stream the LLM response directly
         async for chunk in streaming_llm.astream(messages_with_system):
@@ -238,9 +1005,9 @@ async def stream_rag_agent_advanced(question: str) -> AsyncGenerator[dict, None]
                     }
     except Exception:
         # If direct streaming fails, fall back to the regular RAG agent
-        result = rag_agent.invoke({"messages": messages})
+        result = await agent.graph.ainvoke({"messages": messages})
         final_message = result['messages'][-1]
-        
+
         # Stream the final response word by word
         words = final_message.content.split(' ')
         for word in words:
@@ -254,76 +1021,61 @@ async def stream_rag_agent_advanced(question: str) -> AsyncGenerator[dict, None]
 async def stream_rag_agent(question: str) -> AsyncGenerator[str, None]:
     """
     Stream the RAG agent response with a specific question.
-    
+
     Args:
         question (str): The question to ask the RAG agent
-        
+
     Yields:
         str: Streamed chunks of the agent's response
     """
     messages = [HumanMessage(content=question)]
-    
+
     # Run the full RAG agent to get the complete response
-    result = rag_agent.invoke({"messages": messages})
-    
+    result = await get_rag_agent().graph.ainvoke({"messages": messages})
+
     # Get the final response
     final_message = result['messages'][-1]
-    
+
     # Check if there were tool calls
     tool_calls_present = any(
-        hasattr(msg, 'tool_calls') and msg.tool_calls 
+        hasattr(msg, 'tool_calls') and msg.tool_calls
         for msg in result['messages']
     )
-    
+
     if tool_calls_present:
         # If there were tool calls, indicate that tools were used
         yield "[Tool Call: retriever_tool] "
         # Add a small delay to simulate tool execution
         await asyncio.sleep(0.5)
-    
+
     # Extract the text content from the final message
     if hasattr(final_message, 'content'):
         final_text = final_message.content
     else:
         # If it's a structured message, try to extract text
         final_text = str(final_message)
-    
+
     # Stream the final response word by word
     words = final_text.split(' ')
     for word in words:
         yield f"{word} "
         await asyncio.sleep(0.03)  # 30ms delay between words
 
-# Get the PNG data
-png_data = rag_agent.get_graph().draw_mermaid_png()
-# Save the graph image to root directory
-import os
-# Get the current filename without extension
-current_filename = os.path.splitext(os.path.basename(__file__))[0]
-# Save to root directory (workspace root)
-root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-image_filename = os.path.join(root_dir, f"{current_filename}.png")
-# Save the PNG data to file
-with open(image_filename, 'wb') as f:
-    f.write(png_data)
-print(f"Graph image saved as: {image_filename}")
-
 
 # Only run the interactive mode if this file is run directly
 if __name__ == "__main__":
     def running_agent():
         print("\n=== RAG AGENT===")
-        
+        agent = get_rag_agent()
+
         while True:
             user_input = input("\nWhat is your question: ")
             if user_input.lower() in ['exit', 'quit']:
                 break
-                
-            messages = [HumanMessage(content=user_input)] # converts back to a HumanMessage type
 
-            result = rag_agent.invoke({"messages": messages})
-            
+            result = agent.invoke(user_input)
+
             print("\n=== ANSWER ===")
             print(result['messages'][-1].content)
 
-    running_agent()
\ No newline at end of file
+    running_agent()
@@ -0,0 +1,111 @@
+"""
+Query routing at the graph entry.
+
+Without routing every question pays an LLM call just to decide to call the
+retriever tool, and greetings pay for the whole tool-calling prompt. The
+router classifies the new question locally, without an LLM call:
+
+- direct: small talk ("hi", "thanks!"), answered by one plain LLM call
+  without tools or retrieval
+- retrieve: most of the question's terms occur in the corpus and one of them
+  is specific to it (a ticker, index, figure), or the question's embedding is
+  close to the corpus centroid; context is retrieved up front so the LLM can
+  answer in a single call
+- agent: anything else goes through the usual tool loop, where the LLM
+  decides whether to retrieve
+
+The rules run first; the embedding is only computed when they can't decide.
+"""
+import re
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.retrieval.bm25 import tokenize
+
+ROUTE_DIRECT = "direct"
+ROUTE_RETRIEVE = "retrieve"
+ROUTE_AGENT = "agent"
+
+_SMALLTALK_WORDS = frozenset(
+    "hi hello hey hiya yo thanks thank thx ty you so much very a lot bye goodbye see later cheers "
+    "good morning afternoon evening night ok okay cool great nice awesome perfect got it it's that's "
+    "that there all".split()
+)
+_WORD_RE = re.compile(r"[a-z']+")
+
+
+def is_smalltalk(question: str, max_words: int = 6) -> bool:
+    """True for short messages made only of greeting/thanks words."""
+    words = _WORD_RE.findall(question.lower())
+    return 0 < len(words) <= max_words and all(word in _SMALLTALK_WORDS for word in words)
+
+
+def corpus_centroid(vectors: List[List[float]]) -> Optional[np.ndarray]:
+    """Unit-length mean of the unit-normalized chunk embeddings, or None for an empty corpus."""
+    if vectors is None or len(vectors) == 0:
+        return None
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    centroid = (matrix / np.where(norms == 0, 1.0, norms)).mean(axis=0)
+    norm = np.linalg.norm(centroid)
+    return centroid / norm if norm > 0 else None
+
+
+class QueryRouter:
+    """Rule and embedding based classifier for the three routes."""
+
+    def __init__(
+        self,
+        lexical_index=None,
+        centroid: Optional[np.ndarray] = None,
+        centroid_threshold: float = 0.35,
+        specific_term_df: float = 0.25,
+        min_term_coverage: float = 0.5,
+    ):
+        self.lexical_index = lexical_index
+        self.centroid = centroid
+        self.centroid_threshold = centroid_threshold
+        self.specific_term_df = specific_term_df
+        self.min_term_coverage = min_term_coverage
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {ROUTE_DIRECT: 0, ROUTE_RETRIEVE: 0, ROUTE_AGENT: 0}
+        self.by_embedding = 0
+
+    def is_about_corpus(self, question: str) -> bool:
+        """Most question terms occur in the corpus, and one only in a small share of the chunks."""
+        terms = set(tokenize(question))
+        if self.lexical_index is None or not len(self.lexical_index) or not terms:
+            return False
+        max_df = max(1, int(len(self.lexical_index) * self.specific_term_df))
+        dfs = [len(self.lexical_index.postings.get(term, ())) for term in terms]
+        coverage = sum(df > 0 for df in dfs) / len(terms)
+        return coverage >= self.min_term_coverage and any(0 < df <= max_df for df in dfs)
+
+    def route_by_rules(self, question: str) -> Optional[str]:
+        """Route from the text alone; None when the embedding has to decide."""
+        if is_smalltalk(question):
+            return ROUTE_DIRECT
+        if self.is_about_corpus(question):
+            return ROUTE_RETRIEVE
+        return None
+
+    @property
+    def uses_embedding(self) -> bool:
+        return self.centroid is not None
+
+    def route_by_vector(self, vector: List[float]) -> str:
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        similarity = float(query @ self.centroid / norm) if norm > 0 else 0.0
+        return ROUTE_RETRIEVE if similarity >= self.centroid_threshold else ROUTE_AGENT
+
+    def record(self, route: str, by_embedding: bool = False):
+        with self._lock:
+            self.counts[route] += 1
+            self.by_embedding += by_embedding
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self.counts, "decided_by_embedding": self.by_embedding}
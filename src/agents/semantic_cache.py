@@ -0,0 +1,123 @@
+"""
+Semantic answer cache in front of the RAG agent.
+
+Stores the messages the agent produced for a question (tool calls, tool
+results and the final answer) together with the question's embedding. A new
+question whose embedding is within a cosine-similarity threshold of a cached
+one, for the same collection version, gets the stored messages back without
+running the LLM loop. Entries are evicted least-recently-used beyond
+max_entries and expire after ttl_seconds.
+"""
+import threading
+import time
+from collections import OrderedDict
+from itertools import count
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """In-memory LRU cache of agent answers keyed by question embedding."""
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 512, ttl_seconds: Optional[float] = None):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[int, dict]" = OrderedDict()
+        self._ids = count()
+        self._lock = threading.Lock()
+        # Row-normalized embedding matrix, rebuilt lazily after inserts/evictions
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_ids: List[int] = []
+
+    def _rebuild(self):
+        self._matrix_ids = list(self._entries)
+        if self._matrix_ids:
+            self._matrix = np.stack([self._entries[i]["vector"] for i in self._matrix_ids])
+        else:
+            self._matrix = None
+
+    def _expire(self, now: float):
+        if self.ttl_seconds is None:
+            return
+        expired = [i for i, entry in self._entries.items() if now - entry["created"] > self.ttl_seconds]
+        for i in expired:
+            del self._entries[i]
+        if expired:
+            self._matrix = None
+
+    def lookup(self, vector: Sequence[float], collection_version: str) -> Optional[dict]:
+        """
+        Find the most similar cached question above the threshold.
+
+        Args:
+            vector (Sequence[float]): Embedding of the new question
+            collection_version (str): Version of the indexed documents
+
+        Returns:
+            Optional[dict]: The cache entry ("question", "messages", "similarity") or None
+        """
+        # A copy: normalizing in place would change a caller's float32 array
+        query = np.array(vector, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+
+        with self._lock:
+            self._expire(time.time())
+            if self._matrix is None:
+                self._rebuild()
+            if self._matrix is None:
+                self.misses += 1
+                return None
+
+            similarities = self._matrix @ query
+            for row in np.argsort(-similarities):
+                if similarities[row] < self.threshold:
+                    break
+                entry = self._entries[self._matrix_ids[row]]
+                if entry["collection_version"] != collection_version:
+                    continue
+                self._entries.move_to_end(self._matrix_ids[row])
+                self.hits += 1
+                return {
+                    "question": entry["question"],
+                    "messages": entry["messages"],
+                    "similarity": float(similarities[row]),
+                }
+
+            self.misses += 1
+            return None
+
+    def store(self, question: str, vector: Sequence[float], collection_version: str, messages: list):
+        """Cache the messages the agent produced after the question."""
+        normalized = np.array(vector, dtype=np.float32)
+        normalized /= np.linalg.norm(normalized) or 1.0
+
+        with self._lock:
+            self._entries[next(self._ids)] = {
+                "question": question,
+                "vector": normalized,
+                "collection_version": collection_version,
+                "messages": list(messages),
+                "created": time.time(),
+            }
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "threshold": self.threshold,
+        }
@@ -0,0 +1,147 @@
+"""
+Speculative retrieval for the first LLM call of a question.
+
+Most questions end with the LLM calling retriever_tool with roughly the
+user's own words. While the first (tool-deciding) LLM call runs, the graph
+already retrieves for the raw question. If the tool call's query is close
+to the question (same text, or embeddings above a cosine threshold), the
+tool node uses that result instead of searching again, and the retrieval
+latency overlaps with the LLM call. Otherwise the speculative result is
+dropped and the tool runs as usual.
+"""
+import asyncio
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src.retrieval.cache import normalize_query
+
+
+class SpeculativeRetrieval:
+    """Pending speculative retrievals, keyed by the question's message ID, plus hit/miss counters."""
+
+    def __init__(
+        self,
+        retriever,
+        embed: Callable[[str], Awaitable[List[float]]],
+        min_similarity: float = 0.9,
+        ttl_seconds: float = 120.0,
+        window: int = 1024,
+    ):
+        self.retriever = retriever
+        self.embed = embed
+        self.min_similarity = min_similarity
+        self.ttl_seconds = ttl_seconds
+        self.window = window
+        self._pending: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self.unused = 0
+        self._saved: List[float] = []
+        self._saved_total = 0.0
+
+    async def _retrieve(self, question: str):
+        started = time.perf_counter()
+        docs = await self.retriever.ainvoke(question)
+        return docs, time.perf_counter() - started
+
+    def _drop(self, entry: dict):
+        if not entry["task"].done():
+            entry["task"].cancel()
+        if not entry["compared"]:
+            self.unused += 1
+
+    def start(self, key: str, question: str):
+        """Start retrieving for the question; must be called inside the running event loop."""
+        now = time.monotonic()
+        with self._lock:
+            # Runs that stopped between the LLM call and the tool node leave entries behind
+            for stale in [k for k, entry in self._pending.items() if now - entry["created"] > self.ttl_seconds]:
+                self._drop(self._pending.pop(stale))
+            if key in self._pending:
+                return
+            self._pending[key] = {
+                "task": asyncio.create_task(self._retrieve(question)),
+                "question": question,
+                "created": now,
+                "compared": False,  # A tool call was checked against it (hit or miss)
+            }
+            self.started += 1
+
+    def discard(self, key: str):
+        """Forget the speculation for a question (answered without a matching tool call)."""
+        with self._lock:
+            entry = self._pending.pop(key, None)
+            if entry is not None:
+                self._drop(entry)
+
+    async def _is_close(self, question: str, query: str) -> bool:
+        if normalize_query(question) == normalize_query(query):
+            return True
+        question_vector, query_vector = await asyncio.gather(self.embed(question), self.embed(query))
+        a = np.asarray(question_vector, dtype=np.float32)
+        b = np.asarray(query_vector, dtype=np.float32)
+        denominator = np.linalg.norm(a) * np.linalg.norm(b)
+        return denominator > 0 and float(a @ b / denominator) >= self.min_similarity
+
+    async def take(self, key: str, query: str) -> Optional[List[Document]]:
+        """
+        Return the speculative result for a tool call if its query is close to the question.
+
+        Args:
+            key (str): ID of the question's message
+            query (str): Query of the tool call
+
+        Returns:
+            Optional[List[Document]]: The retrieved chunks, or None when the tool
+                has to search itself (no speculation, query too different, or failed)
+        """
+        with self._lock:
+            entry = self._pending.get(key)
+        if entry is None:
+            return None
+        entry["compared"] = True
+        if not await self._is_close(entry["question"], query):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            # Parallel tool calls may match the same question; only the first one gets it
+            if self._pending.pop(key, None) is None:
+                return None
+        waited_from = time.perf_counter()
+        try:
+            docs, duration = await entry["task"]
+        except Exception:
+            with self._lock:
+                self.misses += 1
+            return None
+        # The part of the retrieval that ran concurrently with the LLM call
+        saved = max(duration - (time.perf_counter() - waited_from), 0.0)
+        with self._lock:
+            self.hits += 1
+            self._saved_total += saved
+            self._saved.append(saved)
+            if len(self._saved) > self.window:
+                del self._saved[0]
+        return docs
+
+    def stats(self) -> dict:
+        with self._lock:
+            saved = sorted(self._saved)
+            used = self.hits + self.misses
+            return {
+                "started": self.started,
+                "hits": self.hits,
+                "misses": self.misses,
+                "unused": self.unused,
+                "hit_rate": self.hits / used if used else 0.0,
+                "saved_ms_p50": saved[len(saved) // 2] * 1000 if saved else 0.0,
+                "saved_ms_total": self._saved_total * 1000,
+            }
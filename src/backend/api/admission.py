@@ -0,0 +1,174 @@
+"""
+Admission control for the agent endpoints.
+
+Each /query or /chat request runs LLM and retrieval calls for seconds, and a
+burst of them would hit the LLM provider all at once and fail together on
+rate limits. The controller lets at most max_concurrency requests run; the
+rest wait in a bounded queue, up to queue_timeout seconds. When a slot frees
+up it goes to the next client in round-robin order (each client's own
+requests stay in FIFO order), so one busy client can't starve the others.
+
+Requests that can't be queued are turned away at once with a Retry-After
+estimate: 429 when the client already has max_queued_per_client requests
+waiting, 503 when the whole queue is full or the wait timed out.
+"""
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List
+
+
+class AdmissionRejected(Exception):
+    """The request was not admitted; answer with status_code and a Retry-After header."""
+
+    def __init__(self, status_code: int, retry_after: int, reason: str):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class AdmissionTicket:
+    """A running slot; release() is idempotent so every exit path can call it."""
+
+    def __init__(self, controller: "AdmissionController"):
+        self._controller = controller
+        self._started = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release(time.monotonic() - self._started)
+
+
+class AdmissionController:
+    """Concurrency limit with a bounded, per-client fair wait queue."""
+
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        max_queue: int = 64,
+        max_queued_per_client: int = 8,
+        queue_timeout: float = 30.0,
+        window: int = 1024,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queued_per_client = max_queued_per_client
+        self.queue_timeout = queue_timeout
+        self.window = window
+        self.active = 0
+        # client -> its waiting requests; the order of the keys is the round-robin order
+        self._waiting: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._queued = 0
+        self._waits: List[float] = []
+        self._service_time = 1.0  # Moving average of a request's running time (s)
+        self.counters = {"admitted": 0, "queued": 0, "rejected_429": 0, "rejected_503": 0, "timed_out": 0}
+        self.max_queue_depth = 0
+
+    def retry_after(self) -> int:
+        """Seconds until the queue is likely to have drained enough for a new request."""
+        rounds = (self._queued + 1) / max(self.max_concurrency, 1)
+        return max(1, math.ceil(rounds * self._service_time))
+
+    def _reject(self, status_code: int, reason: str) -> AdmissionRejected:
+        self.counters[f"rejected_{status_code}"] += 1
+        return AdmissionRejected(status_code, self.retry_after(), reason)
+
+    def _record_wait(self, seconds: float):
+        self._waits.append(seconds)
+        if len(self._waits) > self.window:
+            del self._waits[0]
+
+    async def acquire(self, client: str) -> AdmissionTicket:
+        """
+        Wait for a slot for one request of the client.
+
+        Args:
+            client (str): Client identifier used for fair scheduling
+
+        Returns:
+            AdmissionTicket: The slot; release it when the request finishes
+
+        Raises:
+            AdmissionRejected: The queue (or the client's share of it) is full,
+                or no slot freed up within queue_timeout
+        """
+        if self.active < self.max_concurrency and not self._queued:
+            self.active += 1
+            self.counters["admitted"] += 1
+            self._record_wait(0.0)
+            return AdmissionTicket(self)
+
+        waiting = self._waiting.get(client)
+        if waiting is not None and len(waiting) >= self.max_queued_per_client:
+            raise self._reject(429, "Too many queued requests from this client")
+        if self._queued >= self.max_queue:
+            raise self._reject(503, "Server busy, request queue is full")
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(client, deque()).append(future)
+        self._queued += 1
+        self.counters["queued"] += 1
+        self.max_queue_depth = max(self.max_queue_depth, self._queued)
+        started = time.monotonic()
+        try:
+            # asyncio.wait doesn't cancel the future, so a slot handed over at the timeout isn't lost
+            await asyncio.wait({future}, timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            # The client went away while waiting
+            self._abandon(client, future)
+            raise
+        if not future.done():
+            self._abandon(client, future)
+            self.counters["timed_out"] += 1
+            raise self._reject(503, "Server busy, timed out waiting for a free slot")
+
+        self.counters["admitted"] += 1
+        self._record_wait(time.monotonic() - started)
+        return AdmissionTicket(self)
+
+    def _abandon(self, client: str, future: asyncio.Future):
+        if future.done() and not future.cancelled():
+            # The slot was handed over just now; pass it on
+            self._release(None)
+            return
+        future.cancel()
+        waiting = self._waiting.get(client)
+        if waiting is not None and future in waiting:
+            waiting.remove(future)
+            self._queued -= 1
+            if not waiting:
+                del self._waiting[client]
+
+    def _release(self, service_time):
+        if service_time is not None:
+            self._service_time = 0.9 * self._service_time + 0.1 * service_time
+        while self._waiting:
+            # Next client in round-robin order; it goes to the back if it has more waiting
+            client, waiting = self._waiting.popitem(last=False)
+            future = waiting.popleft()
+            self._queued -= 1
+            if waiting:
+                self._waiting[client] = waiting
+            if not future.done():
+                future.set_result(None)  # The slot passes to the waiter, active stays the same
+                return
+        self.active -= 1
+
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+        queued_by_client: Dict[str, int] = {client: len(waiting) for client, waiting in self._waiting.items()}
+        return {
+            **self.counters,
+            "active": self.active,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self._queued,
+            "max_queue_depth": self.max_queue_depth,
+            "queued_clients": len(queued_by_client),
+            "wait_ms_p50": waits[len(waits) // 2] * 1000 if waits else 0.0,
+            "wait_ms_p95": waits[min(int(len(waits) * 0.95), len(waits) - 1)] * 1000 if waits else 0.0,
+            "service_time_s": self._service_time,
+        }
@@ -1,22 +1,38 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
-from typing import List, Dict, Any
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Optional
 import sys
 import os
 import asyncio
 import json
+from contextlib import asynccontextmanager
 
 # Add the project root directory to the path to import modules
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 sys.path.append(project_root)
 
-from src.agents.rag_agent import rag_agent, stream_rag_agent
-from src.config.settings import API_HOST, API_PORT, CORS_ORIGINS
-from langchain_core.messages import HumanMessage
+from src.agents.rag_agent import ainvoke_rag_agent, stream_rag_agent_events, agent_metrics, get_rag_agent, close_rag_agent
+from src.agents.collections import UnknownCollection
+from src.agents.limits import run_limits
+from src.backend.api.admission import AdmissionController, AdmissionRejected, AdmissionTicket
+from src.config import settings
+from src.config.settings import (
+    API_HOST, API_PORT, CORS_ORIGINS, API_MAX_TOOL_ITERATIONS, API_MAX_DEADLINE_SECONDS, API_MAX_TOKEN_BUDGET,
+    ADMISSION_MAX_CONCURRENCY, ADMISSION_MAX_QUEUE, ADMISSION_MAX_QUEUED_PER_CLIENT,
+    ADMISSION_QUEUE_TIMEOUT_SECONDS, ADMISSION_CLIENT_HEADER, API_MAX_COLLECTIONS,
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the agent (LLM client, vector store sync, graph) once, off the event loop
+    app.state.rag_agent = await asyncio.to_thread(get_rag_agent)
+    yield
+    await close_rag_agent()
 
-app = FastAPI(title="RAG Agent API", description="API for Stock Market Performance RAG Agent")
+app = FastAPI(title="RAG Agent API", description="API for Stock Market Performance RAG Agent", lifespan=lifespan)
 
 # Add CORS middleware to allow frontend requests
 app.add_middleware(
@@ -27,26 +43,121 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Bounds the agent runs in flight; the rest wait in a per-client fair queue
+admission = AdmissionController(
+    max_concurrency=ADMISSION_MAX_CONCURRENCY,
+    max_queue=ADMISSION_MAX_QUEUE,
+    max_queued_per_client=ADMISSION_MAX_QUEUED_PER_CLIENT,
+    queue_timeout=ADMISSION_QUEUE_TIMEOUT_SECONDS,
+)
+
 class QueryRequest(BaseModel):
     question: str
+    # Continue a conversation: earlier turns are loaded from the checkpoint database
+    thread_id: Optional[str] = Field(default=None, min_length=1, max_length=128)
+    # Per-request run limits; unset values use the AGENT_* settings
+    max_tool_iterations: Optional[int] = Field(default=None, ge=0, le=API_MAX_TOOL_ITERATIONS)
+    deadline_seconds: Optional[float] = Field(default=None, gt=0, le=API_MAX_DEADLINE_SECONDS)
+    token_budget: Optional[int] = Field(default=None, gt=0, le=API_MAX_TOKEN_BUDGET)
+    # Collections to search, each through a tool of its own (see GET /collections); unset: the default one
+    collections: Optional[List[str]] = Field(default=None, min_length=1, max_length=API_MAX_COLLECTIONS)
+
+    def limits(self) -> Optional[dict]:
+        # None keeps the defaults, and lets identical concurrent questions share one run
+        if self.max_tool_iterations is None and self.deadline_seconds is None and self.token_budget is None:
+            return None
+        return run_limits(settings, self.max_tool_iterations, self.deadline_seconds, self.token_budget)
 
 class QueryResponse(BaseModel):
     messages: List[Dict[str, Any]]
     success: bool
     error: str = None
 
+class ClientDisconnected(Exception):
+    pass
+
+async def wait_for_disconnect(request: Request, poll_seconds: float = 0.25):
+    while not await request.is_disconnected():
+        await asyncio.sleep(poll_seconds)
+
+async def run_until_disconnect(request: Request, coro):
+    """Await coro, cancelling it (and the LLM/retrieval calls inside) if the client goes away."""
+    task = asyncio.ensure_future(coro)
+    disconnected = asyncio.create_task(wait_for_disconnect(request))
+    try:
+        done, _ = await asyncio.wait({task, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+        if task not in done:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            raise ClientDisconnected()
+        return task.result()
+    finally:
+        disconnected.cancel()
+
+async def stream_until_disconnect(request: Request, events):
+    """
+    Yield from an async generator, cancelling it as soon as the client goes away.
+
+    Without the watcher a disconnect is only noticed at the next write, i.e.
+    after the LLM or retrieval call in progress has finished.
+    """
+    disconnected = asyncio.create_task(wait_for_disconnect(request))
+    try:
+        while True:
+            next_event = asyncio.ensure_future(events.__anext__())
+            done, _ = await asyncio.wait({next_event, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if next_event not in done:
+                next_event.cancel()
+                await asyncio.gather(next_event, return_exceptions=True)
+                print("Client disconnected, run cancelled")
+                return
+            try:
+                yield next_event.result()
+            except StopAsyncIteration:
+                return
+    finally:
+        disconnected.cancel()
+        await events.aclose()
+
+def check_collections(request: QueryRequest):
+    """404 for an unknown collection, before the request waits for an admission slot."""
+    if request.collections:
+        try:
+            get_rag_agent().collections.check(request.collections)
+        except UnknownCollection as e:
+            raise HTTPException(status_code=404, detail=f"Unknown collection: {e.args[0]}")
+
+async def admit(request: Request) -> AdmissionTicket:
+    """Wait for an admission slot, or answer 429/503 with Retry-After right away."""
+    client = request.headers.get(ADMISSION_CLIENT_HEADER) or (request.client.host if request.client else "unknown")
+    try:
+        # Leaving the queue when the client goes away frees its place for the others
+        return await run_until_disconnect(request, admission.acquire(client))
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.reason, headers={"Retry-After": str(e.retry_after)})
+    except ClientDisconnected:
+        raise HTTPException(status_code=499, detail="Client disconnected")
+
 @app.get("/")
 async def root():
     return {"message": "RAG Agent API is running"}
 
 @app.post("/query", response_model=QueryResponse)
-async def query_rag_agent(request: QueryRequest):
+async def query_rag_agent(request: QueryRequest, http_request: Request):
+    check_collections(request)
+    ticket = await admit(http_request)
     try:
-        # Create a human message with the user's question
-        messages = [HumanMessage(content=request.question)]
-        
-        # Invoke the RAG agent
-        result = rag_agent.invoke({"messages": messages})
+        return await answer_query(request, http_request)
+    finally:
+        ticket.release()
+
+async def answer_query(request: QueryRequest, http_request: Request) -> QueryResponse:
+    try:
+        # Invoke the RAG agent (or its semantic cache) without blocking the event loop
+        result = await run_until_disconnect(
+            http_request,
+            ainvoke_rag_agent(request.question, request.thread_id, request.limits(), request.collections),
+        )
         
         # Convert messages to a format that can be serialized
         serialized_messages = []
@@ -132,55 +243,24 @@ async def query_rag_agent(request: QueryRequest):
         )
 
 @app.post("/chat")
-async def chat_endpoint(request: QueryRequest):
+async def chat_endpoint(request: QueryRequest, http_request: Request):
     """HTTP streaming chat endpoint with tool calls and results"""
+    check_collections(request)
+    # The slot is held until the stream ends, not just until the response starts
+    ticket = await admit(http_request)
     try:
         async def generate_stream():
-            # First, get the complete response to extract tool information
-            messages = [HumanMessage(content=request.question)]
-            result = rag_agent.invoke({"messages": messages})
-            
-            # Extract tool calls and results
-            tool_calls = []
-            tool_results = []
-            
-            for message in result['messages']:
-                if hasattr(message, 'tool_calls') and message.tool_calls:
-                    for tool_call in message.tool_calls:
-                        tool_calls.append({
-                            "id": tool_call['id'],
-                            "name": tool_call['name'],
-                            "args": tool_call['args']
-                        })
-                elif hasattr(message, 'tool_call_id'):
-                    tool_results.append({
-                        "toolCallId": message.tool_call_id,
-                        "result": message.content
-                    })
-            
-            # Stream tool calls first
-            for tool_call in tool_calls:
-                yield json.dumps({'type': 'tool_call', 'data': tool_call}) + '\n'
-                await asyncio.sleep(0.1)
-            
-            # Stream tool results
-            for tool_result in tool_results:
-                # Simplify the result structure
-                simplified_result = tool_result['result']
-                if isinstance(simplified_result, dict) and 'result' in simplified_result:
-                    simplified_result = simplified_result['result']
-                
-                yield json.dumps({'type': 'tool_result', 'data': {'toolCallId': tool_result['toolCallId'], 'result': simplified_result}}) + '\n'
-                await asyncio.sleep(0.1)
-            
-            # Stream the final response
-            final_message = result['messages'][-1]
-            final_text = final_message.content
-            
-            words = final_text.split(' ')
-            for word in words:
-                yield json.dumps({'type': 'text', 'data': f'{word} '}) + '\n'
-                await asyncio.sleep(0.03)
+            # Forward graph events as NDJSON the moment they are produced
+            try:
+                events = stream_rag_agent_events(
+                    request.question, request.thread_id, request.limits(), request.collections
+                )
+                async for event in stream_until_disconnect(http_request, events):
+                    yield json.dumps(event) + '\n'
+            except Exception as e:
+                yield json.dumps({'type': 'error', 'data': str(e)}) + '\n'
+            finally:
+                ticket.release()
             
             # Send completion signal
             yield json.dumps({'type': 'done'}) + '\n'
@@ -188,6 +268,8 @@ async def chat_endpoint(request: QueryRequest):
         return StreamingResponse(
             generate_stream(),
             media_type="text/plain",
+            # Also runs when the stream never started
+            background=BackgroundTask(ticket.release),
             headers={
                 "Cache-Control": "no-cache",
                 "Connection": "keep-alive",
@@ -196,6 +278,7 @@ async def chat_endpoint(request: QueryRequest):
             }
         )
     except Exception as e:
+        ticket.release()
         async def error_stream():
             yield json.dumps({'type': 'error', 'data': str(e)}) + '\n'
         
@@ -215,6 +298,17 @@ async def chat_endpoint(request: QueryRequest):
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/collections")
+async def list_collections():
+    """Collections a request can select, and the ones open right now"""
+    registry = get_rag_agent().collections
+    return {"default": registry.default.name, "collections": registry.available(), "open": registry.stats()["open"]}
+
+@app.get("/metrics")
+async def metrics():
+    """Cache hit/miss counters, embedding batch statistics and admission queue state"""
+    return {**agent_metrics(), "admission": admission.stats()}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host=API_HOST, port=API_PORT) 
\ No newline at end of file
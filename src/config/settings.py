@@ -3,6 +3,7 @@ Application settings and configuration.
 """
 import os
 from pathlib import Path
+from types import SimpleNamespace
 
 # Base directory
 BASE_DIR = Path(__file__).parent.parent.parent
@@ -12,23 +13,205 @@ API_HOST = "0.0.0.0"
 API_PORT = 8000
 API_DEBUG = True
 
+# Admission Control Settings (/query and /chat)
+ADMISSION_MAX_CONCURRENCY = 16  # Agent runs at a time; keep under the LLM provider's rate limits
+ADMISSION_MAX_QUEUE = 64  # Waiting requests before new ones get a 503
+ADMISSION_MAX_QUEUED_PER_CLIENT = 8  # Waiting requests per client before its new ones get a 429
+ADMISSION_QUEUE_TIMEOUT_SECONDS = 30.0
+ADMISSION_CLIENT_HEADER = "X-Client-ID"  # Identifies the client for fair scheduling (default: its IP address)
+
 # Frontend Settings
 FRONTEND_HOST = ""  # Empty string to bind to all interfaces
 FRONTEND_PORT = 3000
 
 # OpenAI Settings
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+LLM_MODEL = "gpt-4o"
+LLM_TEMPERATURE = 0
+EMBEDDING_MODEL = "text-embedding-3-small"
+# Token-length check before embedding (needs tiktoken encodings, i.e. network on first use)
+EMBEDDING_CHECK_CTX_LENGTH = True
+
+# HTTP Client Settings (one connection pool shared by the LLM and embeddings clients)
+HTTP_MAX_CONNECTIONS = 100
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 50  # Idle sockets kept open for reuse
+HTTP_KEEPALIVE_EXPIRY_SECONDS = 60.0
+HTTP_TIMEOUT_SECONDS = 60.0
+HTTP_CONNECT_TIMEOUT_SECONDS = 5.0
 
 # Vector Store Settings
 VECTORSTORE_DIR = BASE_DIR / "vectorstore"
+COLLECTION_NAME = "stock_market"
+# What the default collection holds, for the tool descriptions and system prompts
+COLLECTION_DESCRIPTION = "the Stock Market Performance 2024 document"
+# Tracks file and chunk hashes so startup only embeds what changed
+INGESTION_MANIFEST_PATH = VECTORSTORE_DIR / "ingestion_manifest.json"
+# "chroma", or "numpy" for the in-process memory-mapped flat index (exact search)
+VECTOR_STORE_BACKEND = "chroma"
+NUMPY_INDEX_DIR = VECTORSTORE_DIR / "numpy_index"
+# Stored vector precision: "float32", "float16" (half the size) or "int8" (a quarter)
+NUMPY_INDEX_DTYPE = "float32"
+# "flat" (exact) or "ivf" (approximate: only the nprobe cells nearest the query are scanned)
+NUMPY_INDEX_TYPE = "flat"
+IVF_NLIST = 0  # Cells; 0 picks about 4 * sqrt(chunks) at each retraining
+IVF_NPROBE = 16  # Cells scanned per query: higher is slower but closer to exact recall
+IVF_MIN_ROWS = 20000  # Below this many chunks the exact scan is fast enough
+
+# Embedding Settings
+# Query embeddings arriving within this window are sent as one request
+EMBEDDING_BATCH_WINDOW_MS = 5
+EMBEDDING_BATCH_MAX_SIZE = 64
+EMBEDDING_BATCH_MAX_INFLIGHT = 4  # Batches being embedded at the same time
+
+# Retrieval Cache Settings
+RETRIEVAL_CACHE_ENABLED = True
+# "memory" keeps entries per process, "sqlite" persists them across restarts
+RETRIEVAL_CACHE_BACKEND = "memory"
+RETRIEVAL_CACHE_PATH = VECTORSTORE_DIR / "retrieval_cache.sqlite"
+RETRIEVAL_CACHE_MAX_ENTRIES = 1024
+RETRIEVAL_CACHE_TTL_SECONDS = 24 * 60 * 60
+
+# Hybrid Retrieval Settings
+# Fuse BM25 (exact tickers, figures, index names) with vector search by reciprocal rank
+HYBRID_RETRIEVAL_ENABLED = True
+BM25_INDEX_PATH = VECTORSTORE_DIR / "bm25_index.json"
+BM25_K1 = 1.5
+BM25_B = 0.75
+HYBRID_CANDIDATES = 20  # Results taken from each side before fusion
+RRF_K = 60
+
+# Metadata Filter Settings
+# retriever_tool takes optional document / page range / section / date filters, resolved to
+# chunk IDs through an inverted index so only the matching chunks are scored
+METADATA_FILTERS_ENABLED = True
+METADATA_INDEX_PATH = VECTORSTORE_DIR / "metadata_index.json"
+
+# Fact Index Settings
+# Figures from tables and prose (returns, prices, market caps, P/E ratios) extracted at ingestion
+# into a columnar index; fact_lookup_tool answers exact lookups from it without embeddings
+FACT_INDEX_ENABLED = True
+FACT_INDEX_DIR = VECTORSTORE_DIR / "fact_index"
+FACT_LOOKUP_MAX_RESULTS = 5
+
+# Reranking Settings
+# Over-fetch a candidate pool and rerank it (dense cosine + lexical, NumPy) down to the top 5
+RERANK_ENABLED = False
+RERANK_CANDIDATES = 30
+RERANK_DENSE_WEIGHT = 0.5  # The lexical score gets the rest
+
+# Query Router Settings
+# Routes each question before the first LLM call: small talk is answered without tools,
+# questions about the corpus get their context up front and need one LLM call
+ROUTER_ENABLED = True
+# Cosine similarity to the corpus centroid above which a question counts as about the corpus
+ROUTER_CENTROID_THRESHOLD = 0.35
+# A question term found in at most this share of the chunks (a ticker, a figure) means retrieve,
+ROUTER_SPECIFIC_TERM_DF = 0.25
+# ... provided at least this share of its terms occur in the corpus at all
+ROUTER_MIN_TERM_COVERAGE = 0.5
+
+# Speculative Retrieval Settings (async runs)
+# Retrieve for the raw question while the first LLM call decides whether to call the tool
+SPECULATIVE_RETRIEVAL_ENABLED = False
+# Tool query vs question cosine similarity at which the speculative result is used
+SPECULATIVE_MIN_SIMILARITY = 0.9
+
+# Request Coalescing Settings (async runs without a thread_id or custom limits)
+# Identical questions in flight at the same time share one graph run
+COALESCING_ENABLED = True
+
+# Semantic Answer Cache Settings
+# Off by default: a hit returns a previous answer for a merely similar question
+SEMANTIC_CACHE_ENABLED = False
+SEMANTIC_CACHE_THRESHOLD = 0.95  # Minimum cosine similarity between questions
+SEMANTIC_CACHE_MAX_ENTRIES = 512
+SEMANTIC_CACHE_TTL_SECONDS = 24 * 60 * 60
+
+# Agent Settings
+# Max tool calls from a single LLM turn that run at the same time
+TOOL_CALL_CONCURRENCY = 4
+# Estimated tokens (~4 characters each) of retrieved text per tool call and per question;
+# every retrieval turn re-sends all earlier tool results to the LLM
+CONTEXT_PACKING_ENABLED = True  # Dedupe overlapping chunks, merge neighbours, apply the budgets
+TOOL_RESULT_TOKEN_BUDGET = 1200
+CONVERSATION_TOOL_TOKEN_BUDGET = 4000
+
+# Run Limits (defaults; API requests may set their own within the API bounds)
+AGENT_MAX_TOOL_ITERATIONS = 4  # Retrieval rounds per question before the LLM must answer
+AGENT_DEADLINE_SECONDS = 90.0  # Wall-clock time per request
+AGENT_TOKEN_BUDGET = 30000  # LLM tokens (prompts + completions) per question
+# Highest limits a client may ask for per request
+API_MAX_TOOL_ITERATIONS = 8
+API_MAX_DEADLINE_SECONDS = 300.0
+API_MAX_TOKEN_BUDGET = 100000
+
+# Conversation Memory Settings (requests with a thread_id)
+CHECKPOINT_DB_PATH = VECTORSTORE_DIR / "checkpoints.sqlite"
+# Above this many estimated tokens of history, drop old tool traffic, then summarize old turns
+HISTORY_TOKEN_THRESHOLD = 6000
+HISTORY_KEEP_TURNS = 2  # Most recent finished turns always kept verbatim
+HISTORY_SUMMARY_ANSWER_CHARS = 400
 
 # Data Settings
 DATA_DIR = BASE_DIR / "src" / "data"
 PDF_PATH = DATA_DIR / "Stock_Market_Performance_2024.pdf"
 
+# Collection Settings
+# DATA_DIR is the default collection (COLLECTION_NAME); every subdirectory of COLLECTIONS_DIR is
+# another collection (per client, per year) with its own indexes, searched by its own tool
+COLLECTIONS_DIR = BASE_DIR / "src" / "collections"
+COLLECTIONS_VECTORSTORE_DIR = VECTORSTORE_DIR / "collections"
+# A collection describes itself in this file (e.g. "the 2023 annual reports of ACME"); without
+# one it is "the <name> collection"
+COLLECTION_DESCRIPTION_FILE = "description.txt"
+# Collections are opened when a request first selects them; least recently used ones are
+# closed once the open collections' indexes (estimated from their files) exceed this budget
+COLLECTION_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+API_MAX_COLLECTIONS = 8  # Collections a single request may search
+
+# Ingestion Settings
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+# Every file under DATA_DIR matching these patterns is indexed
+INGEST_FILE_PATTERNS = ("*.pdf",)
+INGEST_WORKERS = min(4, os.cpu_count() or 1)  # Processes parsing and splitting PDFs
+INGEST_BATCH_SIZE = 128  # Chunks per vector store write
+INGEST_EMBED_REQUEST_SIZE = 64  # Texts per embeddings API request
+INGEST_MAX_INFLIGHT = 4  # Embedding requests running at the same time
+# Stay under the provider's limits instead of bouncing off 429s
+INGEST_REQUESTS_PER_MINUTE = 3000
+INGEST_TOKENS_PER_MINUTE = 1_000_000
+INGEST_MAX_RETRIES = 6
+INGEST_BACKOFF_BASE_SECONDS = 1.0
+# Chunk IDs written so far; lets an interrupted ingest resume where it stopped
+INGEST_CHECKPOINT_PATH = VECTORSTORE_DIR / "ingest_checkpoint.jsonl"
+
 # CORS Settings
 CORS_ORIGINS = [
     "http://localhost:3000",
     "http://127.0.0.1:3000",
     "http://localhost:5173",
-] 
\ No newline at end of file
+]
+
+
+def with_overrides(**overrides) -> SimpleNamespace:
+    """Copy of these settings with some values replaced (benchmarks, scripts)."""
+    return _with_overrides({name: value for name, value in globals().items() if name.isupper()}, overrides)
+
+
+def _with_overrides(values: dict, overrides: dict) -> SimpleNamespace:
+    unknown = set(overrides) - set(values)
+    if unknown:
+        raise KeyError(f"Unknown settings: {', '.join(sorted(unknown))}")
+    values = dict(values)
+    if "VECTORSTORE_DIR" in overrides:
+        # Files kept next to the vector store (manifest, caches, indexes) move with it
+        old_dir, new_dir = values["VECTORSTORE_DIR"], Path(overrides["VECTORSTORE_DIR"])
+        for name, value in values.items():
+            if name not in overrides and isinstance(value, Path) and value.parent == old_dir:
+                values[name] = new_dir / value.name
+    values.update(overrides)
+    namespace = SimpleNamespace(**values)
+    # Copies can be overridden again, like the module
+    namespace.with_overrides = lambda **more: _with_overrides(values, more)
+    return namespace
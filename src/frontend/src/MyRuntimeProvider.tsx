@@ -7,6 +7,11 @@ import {
   type ThreadAssistantMessagePart,
 } from "@assistant-ui/react";
 
+// One conversation per page load; the backend keeps its history under this ID.
+// The first question has no history yet, so the backend still shares it with
+// identical concurrent questions and answers it from its cache when it can.
+const threadId = crypto.randomUUID();
+
 const MyModelAdapter: ChatModelAdapter = {
   async *run({ messages, abortSignal }) {
     // Extract the latest user message as the question
@@ -31,6 +36,7 @@ const MyModelAdapter: ChatModelAdapter = {
       },
       body: JSON.stringify({
         question,
+        thread_id: threadId,
       }),
       signal: abortSignal,
     });
@@ -48,6 +54,8 @@ const MyModelAdapter: ChatModelAdapter = {
     let streamedText = "";
     const toolCalls: any[] = [];
     const decoder = new TextDecoder();
+    // Events arrive token by token, so a network chunk can end mid-line
+    let buffered = "";
 
     try {
       while (true) {
@@ -55,8 +63,9 @@ const MyModelAdapter: ChatModelAdapter = {
         
         if (done) break;
         
-        const chunk = decoder.decode(value, { stream: true });
-        const lines = chunk.split('\n');
+        buffered += decoder.decode(value, { stream: true });
+        const lines = buffered.split('\n');
+        buffered = lines.pop() ?? "";
         
         for (const line of lines) {
           if (line.trim()) { // Only process non-empty lines
@@ -0,0 +1,447 @@
+"""
+Figures extracted from the source PDFs for exact lookups.
+
+RecursiveCharacterTextSplitter cuts tables and the sentences around figures
+at arbitrary points, so a question like "S&P 500 2024 return" can take
+several retrieval rounds before the LLM has the number. This stage reads the
+pages from PyPDFLoader and turns every figure into a fact: entity (an index
+or company, with its ticker), metric, year, value, unit, page and the
+sentence or table row it came from. src/retrieval/facts.py stores the facts
+in columns for fact_lookup_tool.
+
+Figures come from two kinds of text:
+
+- tables: runs of at least TABLE_MIN_ROWS lines with the same number of
+  cells, split on tabs, "|" or runs of spaces, or as a label followed by
+  numeric cells (how PyPDFLoader flattens most tables). The first cell
+  names the entity, the header row above names each column's metric.
+- prose: every other line, joined into sentences. A figure (25%, $252,
+  $4 trillion, 40×) belongs to the entity named last before it in the
+  sentence, or else to the one the text was last about (at first, the one
+  in the section heading). Its metric comes from the words around it
+  ("total return", "per share", "market capitalization", "trailing
+  earnings"), and its year from the nearest "in/for/by ... 2024". Figures
+  after a qualifier ("over 20%", "nearly $4 trillion") are bounds: they
+  are kept, flagged, and only returned when no exact figure matches.
+
+Entities are the indexes and companies in KNOWN_ENTITIES plus every
+"Name (TICKER)" found in the document.
+"""
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from src.ingestion.metadata import is_heading
+from src.ingestion.pipeline import load_pdf_pages
+
+TABLE_MIN_ROWS = 3
+# Characters before and after a figure whose words decide its metric
+CONTEXT_BEFORE = 60
+CONTEXT_AFTER = 25
+
+# (name, ticker, other names); tickers of indexes are None
+KNOWN_ENTITIES = (
+    ("S&P 500", None, ("S&P", "SPX")),
+    ("S&P 500 Equal-Weight", None, ()),
+    ("Nasdaq Composite", None, ("Nasdaq",)),
+    ("Nasdaq 100", None, ()),
+    ("Russell 2000", None, ()),
+    ("Dow Jones Industrial Average", None, ("Dow Jones", "Dow", "DJIA")),
+    ("Apple", "AAPL", ()),
+    ("Microsoft", "MSFT", ()),
+    ("Alphabet", "GOOGL", ("Google",)),
+    ("Amazon", "AMZN", ()),
+    ("Meta", "META", ("Facebook", "Meta Platforms")),
+    ("Nvidia", "NVDA", ("NVIDIA",)),
+    ("Tesla", "TSLA", ()),
+    ("Netflix", "NFLX", ()),
+)
+
+# Metrics and the words that give them away, checked in order around each figure
+PERCENT_METRICS = (
+    ("price return", ("price terms", "price return")),
+    ("revenue growth", ("revenue", "sales")),
+    ("earnings growth", ("earnings", "eps", "net income", "profit")),
+    ("return", ("return", "gain", "rose", "rise", "rising", "up ", "climb", "jump", "surg", "soar",
+                "skyrocket", "advanc", "rall", "increase", "doubl", "outpac", "deliver", "finished")),
+)
+DOLLAR_METRICS = (
+    ("market value added", ("added", "adding")),
+    ("market cap", ("market cap", "capitaliz", "market value", "valuation")),
+    ("EPS", ("eps", "earnings per share")),
+    ("revenue", ("revenue", "sales")),
+    ("share price", ("per share", "share price", "price", "closing", "trading", "shares")),
+)
+MULTIPLE_METRICS = (
+    ("price/sales", ("sales", "revenue")),
+    ("P/E ratio", ("earnings", "p/e", "price-to-earnings", "multiple", "valuation")),
+)
+# Figures that describe a part of something else, not the entity itself
+_SKIP_CONTEXT = ("accounted for", "share of")
+_NEGATIVE_CONTEXT = ("fell", "fall", "declin", "down", "drop", "lost", "loss", "slump")
+# "over 20% returns", "nearly $4 trillion": a bound, not the figure itself
+BOUND_QUALIFIERS = ("over", "above", "more than", "at least", "nearly", "almost", "up to", "under", "below",
+                    "less than")
+_BOUND_RE = re.compile(rf"\b(?:{'|'.join(BOUND_QUALIFIERS)})\s*$", re.IGNORECASE)
+
+_SCALE = {"thousand": 1e3, "million": 1e6, "billion": 1e9, "trillion": 1e12}
+_NUMBER = r"\d[\d,]*(?:\.\d+)?"
+_FIGURE_RE = re.compile(
+    # $1.7-$1.8 trillion, $252, $1+ trillion (not "the mid-$20s")
+    rf"(?P<dollar>\$(?P<d1>{_NUMBER})\+?(?:\s*-\s*\$?(?P<d2>{_NUMBER}))?(?![\ds])"
+    rf"(?:\s*(?P<scale>thousand|million|billion|trillion)\b)?)"
+    # 25%, +23%, 10-11%
+    rf"|(?P<percent>(?P<sign>[+-])?(?P<p1>{_NUMBER})(?:\s*-\s*(?P<p2>{_NUMBER}))?\s*%)"
+    # 40 times, 23×, ~52 P/E
+    rf"|(?P<multiple>~?(?P<m1>{_NUMBER})\s*(?:×|x\b|times\b|P/E\b))"
+    # "price-to-earnings ratio had declined to about 40"
+    r"|(?P<ratio>(?:P/E|price-to-earnings)(?: ratio)?[^.\d$%]{0,40}?\b(?P<r1>\d{1,3}(?:\.\d+)?)\b(?![\d%s]))"
+)
+_YEAR_RE = re.compile(r"\b(?:19|20)\d{2}\b")
+# "for 2024", "at the end of 2023", "by December 2024" right after a figure
+_YEAR_AFTER_RE = re.compile(
+    r"^[^.%$]{0,25}?\b(?:in|for|of|by|during)\s+(?:[A-Z][a-z]+\s+)?(?P<year>(?:19|20)\d{2})\b"
+)
+# "Palantir Technologies (PLTR)", "Alphabet (Google) (GOOGL)"; names don't span lines
+_TICKER_RE = re.compile(
+    r"(?P<name>[A-Z][\w&.,'-]*(?:[ \t]+[A-Z][\w&.,'-]*){0,3})[ \t]+(?:\([A-Z][\w ]*\)[ \t]+)?\((?P<ticker>[A-Z]{1,5})\)"
+)
+_NAME_SUFFIX_RE = re.compile(r"(?:,?\s+(?:Inc|Corp|Corporation|Co|Ltd|plc|Holdings|Technologies|Platforms)\.?)+$")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z(\"'])")
+_CELL_SPLIT_RE = re.compile(r"\t|\s*\|\s*|\s{2,}")
+_NUMERIC_CELL_RE = re.compile(rf"^[(+-]?[$~]?[+-]?{_NUMBER}\)?\s*(?:%|×|x|[KMBT])?$")
+# A citation line left between sentences by PyPDFLoader, e.g. "macrotrends.net"
+_CITATION_RE = re.compile(r"^[\w.-]+\.(?:com|net|org|io|gov)$")
+
+
+def _number(text: Optional[str]) -> Optional[float]:
+    return float(text.replace(",", "")) if text else None
+
+
+def _contains(text: str, words: Iterable[str]) -> bool:
+    return any(word in text for word in words)
+
+
+class EntityCatalog:
+    """Names and tickers of the entities figures can belong to."""
+
+    def __init__(self, known=KNOWN_ENTITIES):
+        # name -> {"name", "ticker", "aliases"}
+        self.entities: Dict[str, dict] = {}
+        self._by_ticker: Dict[str, str] = {}
+        self._owners: Dict[str, str] = {}
+        for name, ticker, aliases in known:
+            self.add(name, ticker, aliases)
+        self._pattern = None
+
+    def add(self, name: str, ticker: Optional[str], aliases: Iterable[str] = ()):
+        name = self._by_ticker.get(ticker, name) if ticker else name
+        entity = self.entities.setdefault(name, {"name": name, "ticker": ticker, "aliases": []})
+        for alias in (name, ticker, *aliases):
+            # The first entity to claim a name keeps it ("Amazon" vs "Amazon Web Services (AWS)")
+            if alias and self._owners.setdefault(alias, name) == name and alias not in entity["aliases"]:
+                entity["aliases"].append(alias)
+        if ticker:
+            self._by_ticker[ticker] = name
+        self._pattern = None
+
+    def add_mentions(self, text: str):
+        """Add every "Name (TICKER)" in the text, e.g. "Palantir Technologies (PLTR)"."""
+        for match in _TICKER_RE.finditer(text):
+            full_name = match.group("name").strip(" ,")
+            short = _NAME_SUFFIX_RE.sub("", full_name).replace(".com", "")
+            aliases = [full_name, short]
+            first = short.split()[0] if short else ""
+            if len(first) > 2 and first not in ("The", "An"):
+                aliases.append(first)
+            self.add(short or full_name, match.group("ticker"), aliases)
+
+    def mentions(self, text: str) -> List[Tuple[int, str]]:
+        """(offset, entity name) of every alias in the text; longer names win over their prefixes."""
+        if self._pattern is None:
+            aliases = {alias: entity["name"] for entity in self.entities.values() for alias in entity["aliases"]}
+            self._aliases = aliases
+            alternation = "|".join(re.escape(alias) for alias in sorted(aliases, key=len, reverse=True))
+            self._pattern = re.compile(rf"(?<![\w&])(?:{alternation})(?![\w&]|-Weight)")
+        return [(match.start(), self._aliases[match.group(0)]) for match in self._pattern.finditer(text)]
+
+
+def split_cells(line: str) -> List[str]:
+    """Cells of a table line: split on tabs, "|" or 2+ spaces, else a label and its numeric cells."""
+    cells = [cell for cell in _CELL_SPLIT_RE.split(line.strip()) if cell]
+    if len(cells) >= 2:
+        return cells
+    tokens = line.split()
+    values = []
+    while tokens and _NUMERIC_CELL_RE.match(tokens[-1]) and not _YEAR_RE.fullmatch(tokens[-1]):
+        values.insert(0, tokens.pop())
+    if tokens and values:
+        return [" ".join(tokens)] + values
+    return cells
+
+
+def _is_numeric(cell: str) -> bool:
+    return bool(_NUMERIC_CELL_RE.match(cell.strip()))
+
+
+def detect_tables(lines: List[str]) -> Tuple[List[dict], List[int]]:
+    """
+    Find tables in a page's lines.
+
+    Args:
+        lines (List[str]): Lines of one page
+
+    Returns:
+        Tuple[List[dict], List[int]]: Tables as {"header", "rows", "lines"} and the
+            indexes of the lines that belong to no table
+    """
+    tables, rest = [], []
+    cells = [split_cells(line) for line in lines]
+
+    def is_row(i: int, width: int) -> bool:
+        return (len(cells[i]) == width and not _is_numeric(cells[i][0])
+                and any(_is_numeric(cell) for cell in cells[i][1:]))
+
+    i = 0
+    while i < len(lines):
+        width = len(cells[i])
+        end = i
+        if width >= 2 and is_row(i, width):
+            while end + 1 < len(lines) and is_row(end + 1, width):
+                end += 1
+        if width >= 2 and end - i + 1 >= TABLE_MIN_ROWS:
+            header = None
+            if rest and rest[-1] == i - 1:
+                # A header row above: as many cells without figures, or one per value column
+                above = cells[i - 1]
+                if not any(_is_numeric(cell) for cell in above):
+                    if len(above) == width:
+                        header = above
+                    elif len(above) == width - 1:
+                        header = [""] + above
+                    elif len(lines[i - 1].split()) >= width - 1:
+                        header = [""] + lines[i - 1].split()[-(width - 1):]
+                    if header is not None:
+                        rest.pop()
+            tables.append({"header": header, "rows": cells[i:end + 1], "lines": list(range(i, end + 1))})
+            i = end + 1
+            continue
+        rest.append(i)
+        i += 1
+    return tables, rest
+
+
+def parse_figure(match: re.Match) -> Tuple[float, str]:
+    """(value, unit) of a figure matched by _FIGURE_RE; ranges count as their midpoint."""
+    if match.group("dollar"):
+        low, high = _number(match.group("d1")), _number(match.group("d2"))
+        scale = _SCALE.get(match.group("scale") or "", 1.0)
+        return ((low + high) / 2 if high is not None else low) * scale, "$"
+    if match.group("percent"):
+        low, high = _number(match.group("p1")), _number(match.group("p2"))
+        value = (low + high) / 2 if high is not None else low
+        return (-value if match.group("sign") == "-" else value), "%"
+    return _number(match.group("m1") or match.group("r1")), "x"
+
+
+def classify_metric(unit: str, context: str) -> Optional[str]:
+    """The metric a figure measures, from the lowercase words around it (None if unclear)."""
+    metrics = {"%": PERCENT_METRICS, "$": DOLLAR_METRICS, "x": MULTIPLE_METRICS}[unit]
+    for metric, words in metrics:
+        if _contains(context, words):
+            return metric
+    return "P/E ratio" if unit == "x" else None
+
+
+def _table_facts(table: dict, catalog: EntityCatalog, page: int, year: Optional[int]) -> List[dict]:
+    facts = []
+    header = table["header"] or [""] * len(table["rows"][0])
+    for row in table["rows"]:
+        mentioned = catalog.mentions(row[0])
+        entity = mentioned[0][1] if mentioned else row[0].strip()
+        for column, cell in zip(header[1:], row[1:]):
+            match = _FIGURE_RE.search(cell) if not _YEAR_RE.fullmatch(cell.strip()) else None
+            if match is None:
+                if not _is_numeric(cell):
+                    continue
+                value, unit = _number(re.search(_NUMBER, cell).group(0)), ""
+            else:
+                value, unit = parse_figure(match)
+            column_years = _YEAR_RE.findall(column)
+            label = _YEAR_RE.sub("", column).strip(" ()-").lower()
+            metric = (classify_metric(unit, label) if unit else None) or label or "value"
+            facts.append({
+                "entity": entity,
+                "metric": metric,
+                "year": int(column_years[0]) if column_years else year,
+                "value": value,
+                "unit": unit,
+                "text": cell.strip(),
+                "page": page,
+                "evidence": " | ".join(row),
+                "table": True,
+                "bound": False,
+            })
+    return facts
+
+
+def _sentence_facts(
+    sentence: str,
+    catalog: EntityCatalog,
+    current: Optional[str],
+    year: Optional[int],
+) -> Tuple[List[dict], Optional[str]]:
+    """Facts of one sentence, and the entity the text is about after it."""
+    facts = []
+    mentions = catalog.mentions(sentence)
+    figures = list(_FIGURE_RE.finditer(sentence))
+    previous_end = 0
+    for n, match in enumerate(figures):
+        segment_start, previous_end = previous_end, match.end()
+        next_start = figures[n + 1].start() if n + 1 < len(figures) else len(sentence)
+        before = sentence[max(0, match.start() - CONTEXT_BEFORE):match.start()]
+        following = sentence[match.end():next_start][:CONTEXT_AFTER]
+        context = f"{before} {following}".lower()
+        # "54% of S&P 500 performance" is a share of something, not a figure of its own
+        if _contains(context, _SKIP_CONTEXT) or re.match(r"\s+of\b", following):
+            continue
+        value, unit = parse_figure(match)
+        metric = classify_metric(unit, context)
+        if metric is None:
+            continue
+
+        # The entities named since the previous figure; "each"/"both" share the figure
+        named = list(dict.fromkeys(name for offset, name in mentions if segment_start <= offset < match.start()))
+        if len(named) > 1 and re.search(r"\b(?:each|both)\b", context):
+            entities = named
+        elif len(named) > 2:
+            # "Apple, Microsoft, ... and Tesla collectively surged": a group, not one entity
+            continue
+        elif named:
+            entities = named[-1:]
+        else:
+            earlier = [name for offset, name in mentions if offset < match.start()]
+            entities = earlier[-1:] or ([current] if current else [])
+        if not entities:
+            continue
+
+        after_year = _YEAR_AFTER_RE.match(sentence[match.end():])
+        years_before = _YEAR_RE.findall(sentence[:match.start()])
+        figure_year = int(after_year.group("year")) if after_year else int(years_before[-1]) if years_before else year
+        if unit == "%" and _contains(before[-30:].lower(), _NEGATIVE_CONTEXT):
+            value = -abs(value)
+        bound = _BOUND_RE.search(before)
+        for entity in entities:
+            facts.append({
+                "entity": entity,
+                "metric": metric,
+                "year": figure_year,
+                "value": value,
+                "unit": unit,
+                "text": f"{bound.group(0)}{match.group(0)}".strip() if bound else match.group(0).strip(),
+                "evidence": sentence,
+                "table": False,
+                "bound": bool(bound),
+            })
+    if mentions:
+        current = mentions[-1][1]
+    return facts, current
+
+
+def extract_facts(pages: List[Document], catalog: Optional[EntityCatalog] = None) -> List[dict]:
+    """
+    Facts found in the pages of one document, in document order.
+
+    Args:
+        pages (List[Document]): Pages from PyPDFLoader, in order
+        catalog (Optional[EntityCatalog]): Known entities (defaults to KNOWN_ENTITIES)
+
+    Returns:
+        List[dict]: Facts with entity, metric, year, value, unit, text, page,
+            evidence, table (True for table cells) and bound (True for
+            "over 20%" and the like)
+    """
+    catalog = catalog or EntityCatalog()
+    for page in pages:
+        catalog.add_mentions(page.page_content)
+
+    # The year in the first heading that has one (usually the title) is the default
+    document_year = next((
+        int(year) for page in pages for line in page.page_content.split("\n")
+        if is_heading(line) for year in _YEAR_RE.findall(line)
+    ), None)
+
+    facts = []
+    # Lines outside tables, joined across pages
+    prose: List[Tuple[int, str]] = []
+    for page in pages:
+        number = page.metadata.get("page", 0)
+        lines = page.page_content.split("\n")
+        tables, rest = detect_tables(lines)
+        for table in tables:
+            facts.extend(_table_facts(table, catalog, number, document_year))
+        for i in rest:
+            line = lines[i].strip()
+            if not line or _CITATION_RE.match(line):
+                continue
+            if is_heading(line):
+                prose.append((number, "\n" + line + "\n"))
+            else:
+                prose.append((number, line))
+
+    # A heading starts a new block of text, about the entity it names (if any)
+    current, year = None, document_year
+    block: List[str] = []
+    block_pages: List[int] = []
+    # Conclusions repeat figures from earlier sections, prose repeats table cells
+    seen = {(fact["entity"], fact["metric"], fact["year"], fact["value"], fact["unit"]) for fact in facts}
+
+    def flush():
+        nonlocal current
+        text = " ".join(block)
+        starts = [0] + [match.end() for match in _SENTENCE_RE.finditer(text)]
+        ends = [match.start() for match in _SENTENCE_RE.finditer(text)] + [len(text)]
+        for start, end in zip(starts, ends):
+            sentence = text[start:end].strip(" .")
+            if not sentence:
+                continue
+            found, current = _sentence_facts(sentence + ".", catalog, current, year)
+            for fact in found:
+                # A sentence belongs to the page it starts on
+                fact["page"] = block_pages[start]
+            for fact in found:
+                key = (fact["entity"], fact["metric"], fact["year"], fact["value"], fact["unit"])
+                if key not in seen:
+                    seen.add(key)
+                    facts.append(fact)
+
+    for number, line in prose:
+        if line.startswith("\n"):
+            flush()
+            block, block_pages = [], []
+            heading = line.strip()
+            mentioned = catalog.mentions(heading)
+            current = mentioned[0][1] if mentioned else None
+            years = _YEAR_RE.findall(heading)
+            year = int(years[0]) if years else document_year
+            continue
+        block.append(line)
+        block_pages.extend([number] * (len(line) + 1))
+    flush()
+    return facts
+
+
+def extract_file_facts(path: str) -> Tuple[List[dict], List[dict]]:
+    """
+    Facts of one PDF, and the entities they belong to.
+
+    Returns:
+        Tuple[List[dict], List[dict]]: Facts (see extract_facts) and entities
+            as {"name", "ticker", "aliases"}
+    """
+    catalog = EntityCatalog()
+    facts = extract_facts(load_pdf_pages(path), catalog)
+    for fact in facts:
+        fact["source"] = str(path)
+    return facts, list(catalog.entities.values())
@@ -0,0 +1,124 @@
+"""
+Content-hashed ingestion manifest.
+
+The manifest records a hash for every source file and the IDs of the chunks
+that were embedded from it. The ingestion pipeline compares the files on
+disk against the manifest and only embeds chunks that are new or changed,
+deletes chunks whose source is gone, and skips unchanged files without even
+opening them.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, List
+
+from langchain_core.documents import Document
+
+# Bumped whenever chunks gain metadata or their IDs change, so existing stores
+# are re-split and re-embedded (2: section and date, 3: dates from titles and ISO PDF dates)
+MANIFEST_VERSION = 3
+
+
+def file_sha256(path: str) -> str:
+    """Hash a file on disk in 1 MB blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(doc: Document) -> str:
+    """
+    Stable chunk ID derived from its source, page, section, date and text.
+
+    The section and date are part of the ID because they are stored with the
+    chunk: a chunk whose heading changes is rewritten, not skipped.
+    """
+    digest = hashlib.sha256()
+    for key in ("source", "page", "section", "date"):
+        digest.update(str(doc.metadata.get(key, "")).encode("utf-8"))
+        digest.update(b"\0")
+    digest.update(doc.page_content.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def assign_chunk_ids(chunks: List[Document]) -> List[str]:
+    """
+    Compute chunk IDs, disambiguating identical chunks on the same page.
+
+    Args:
+        chunks (List[Document]): Split documents in source order
+
+    Returns:
+        List[str]: One unique ID per chunk
+    """
+    ids = []
+    seen: Dict[str, int] = {}
+    for doc in chunks:
+        base = chunk_id(doc)
+        count = seen.get(base, 0)
+        seen[base] = count + 1
+        ids.append(base if count == 0 else f"{base}-{count}")
+    return ids
+
+
+class IngestionManifest:
+    """JSON manifest of ingested sources, stored next to the vector store."""
+
+    def __init__(self, path: Path, splitter_config: Dict):
+        self.path = Path(path)
+        self.splitter_config = splitter_config
+        self.sources: Dict[str, Dict] = {}
+        self.exists = False
+        self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable ingestion manifest {self.path}: {e}")
+            return
+
+        self.exists = True
+        # A different splitter or chunk schema produces different chunks, so every source is stale
+        if data.get("version") != MANIFEST_VERSION or data.get("splitter") != self.splitter_config:
+            print("Ingestion settings changed, re-indexing all sources")
+            self.sources = {
+                source: {"sha256": None, "chunks": entry.get("chunks", [])}
+                for source, entry in data.get("sources", {}).items()
+            }
+            return
+        self.sources = data.get("sources", {})
+
+    def collection_version(self) -> str:
+        """Fingerprint of everything indexed; changes whenever a chunk is added or removed."""
+        digest = hashlib.sha256()
+        for source in sorted(self.sources):
+            digest.update(source.encode("utf-8"))
+            digest.update(b"\0")
+            for cid in sorted(self.sources[source].get("chunks", [])):
+                digest.update(cid.encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    def save(self):
+        """Atomically write the manifest to disk."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": MANIFEST_VERSION,
+                    "splitter": self.splitter_config,
+                    "sources": self.sources,
+                },
+                f,
+                indent=2,
+                sort_keys=True,
+            )
+        os.replace(tmp_path, self.path)
+        self.exists = True
@@ -0,0 +1,121 @@
+"""
+Chunk metadata used by filtered retrieval.
+
+PyPDFLoader gives every page its source path and 0-based page number. This
+adds two more fields to every chunk:
+
+- section: the heading in effect at the middle of the chunk. Headings are
+  detected as short, title-cased lines without closing punctuation (e.g.
+  "Amazon.com Inc. (AMZN) - 2024 Performance") and carry over to the
+  following pages until the next heading.
+- date: the period the document is about. A year in its title ("Stock
+  Market Performance in 2024") gives YYYY; otherwise the PDF creation (or
+  modification) date gives YYYY-MM-DD. The file's own date is when the
+  report was written, often the year after the one it covers.
+"""
+import re
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+_WORD_RE = re.compile(r"[A-Za-z][\w&'.-]*")
+# Raw PDF dates ("D:20240315120000+00'00'"); PyPDFLoader may already have made them ISO
+_PDF_DATE_RE = re.compile(r"(?:D:)?(\d{4})(\d{2})?(\d{2})?")
+_YEAR_RE = re.compile(r"\b(?:19|20)\d{2}\b")
+
+
+def is_heading(line: str) -> bool:
+    """True for short title-cased lines without closing punctuation."""
+    line = line.strip()
+    if not line or len(line) > 90 or line[-1] in ".,;:" or not line[0].isupper():
+        return False
+    words = _WORD_RE.findall(line)
+    if not 2 <= len(words) <= 12:
+        return False
+    # Short words ("in", "of", "and") are lowercase in titles too
+    long_words = [word for word in words if len(word) > 3]
+    return bool(long_words) and sum(word[0].isupper() for word in long_words) / len(long_words) >= 0.6
+
+
+def find_headings(text: str) -> List[Tuple[int, str]]:
+    """(character offset, heading) of every heading line in a page, in order."""
+    headings, offset = [], 0
+    for line in text.split("\n"):
+        if is_heading(line):
+            headings.append((offset, line.strip()))
+        offset += len(line) + 1
+    return headings
+
+
+def parse_pdf_date(value: str) -> Optional[str]:
+    """A PDF date, raw ("D:20240315...") or ISO ("2024-03-15T12:00:00+00:00"), as YYYY-MM-DD."""
+    value = value.strip()
+    try:
+        return datetime.fromisoformat(value).date().isoformat()
+    except ValueError:
+        pass
+    match = _PDF_DATE_RE.match(value)
+    if not match:
+        return None
+    year, month, day = match.groups()
+    return f"{year}-{month or '01'}-{day or '01'}"
+
+
+def document_date(metadata: dict, title: Optional[str] = None) -> Optional[str]:
+    """
+    The date a document is about: the year in its title, else its PDF creation (or modification) date.
+
+    Args:
+        metadata (dict): Metadata of the document's first page, from PyPDFLoader
+        title (Optional[str]): The document's first heading, if any
+
+    Returns:
+        Optional[str]: YYYY from the title, YYYY-MM-DD from the file, or None
+    """
+    years = _YEAR_RE.findall(title or "")
+    if years:
+        return years[0]
+    for key in ("creationdate", "moddate", "creation_date", "mod_date"):
+        date = parse_pdf_date(str(metadata.get(key) or ""))
+        if date:
+            return date
+    return None
+
+
+def annotate_chunks(pages: List[Document], chunks: List[Document]) -> List[Document]:
+    """
+    Add section and date metadata to the chunks split from these pages.
+
+    Args:
+        pages (List[Document]): Pages of one document, in order
+        chunks (List[Document]): Chunks split from them with add_start_index=True
+
+    Returns:
+        List[Document]: The same chunks, annotated in place
+    """
+    # Headings per page, plus the section still in effect at the top of each page
+    page_headings, carried, current = {}, {}, None
+    for page in pages:
+        number = page.metadata.get("page")
+        carried[number] = current
+        page_headings[number] = find_headings(page.page_content)
+        if page_headings[number]:
+            current = page_headings[number][-1][1]
+    first_headings = page_headings.get(pages[0].metadata.get("page"), []) if pages else []
+    title = first_headings[0][1] if first_headings else None
+    date = document_date(pages[0].metadata, title) if pages else None
+
+    for chunk in chunks:
+        number = chunk.metadata.get("page")
+        middle = chunk.metadata.get("start_index", 0) + len(chunk.page_content) // 2
+        section = carried.get(number)
+        for offset, heading in page_headings.get(number, []):
+            if offset > middle:
+                break
+            section = heading
+        if section is not None:
+            chunk.metadata["section"] = section
+        if date is not None:
+            chunk.metadata["date"] = date
+    return chunks
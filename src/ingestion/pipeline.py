@@ -0,0 +1,363 @@
+"""
+Parallel, streaming ingestion pipeline.
+
+Source files are discovered under a data directory, hashed against the
+ingestion manifest, and only new or changed files are parsed. Parsing and
+splitting run in a process pool with a bounded number of files in flight;
+chunks are streamed into fixed-size batches that are written to the vector
+store as soon as they fill up. Memory therefore depends on the number of
+workers and the batch size, not on the size of the corpus.
+"""
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_core.documents import Document
+
+from src.ingestion.manifest import IngestionManifest, assign_chunk_ids, file_sha256
+from src.ingestion.metadata import annotate_chunks
+
+
+def discover_sources(data_dir: Path, patterns: Sequence[str] = ("*.pdf",)) -> List[str]:
+    """
+    Find every source file under a directory.
+
+    Args:
+        data_dir (Path): Directory to search recursively
+        patterns (Sequence[str]): Glob patterns of files to ingest
+
+    Returns:
+        List[str]: Sorted file paths
+    """
+    found = set()
+    for pattern in patterns:
+        found.update(str(path) for path in Path(data_dir).rglob(pattern) if path.is_file())
+    return sorted(found)
+
+
+def load_pdf_pages(path: str) -> List[Document]:
+    """Load every page of a PDF as a Document."""
+    return PyPDFLoader(path).load()
+
+
+def parse_and_split(path: str, chunk_size: int, chunk_overlap: int) -> Tuple[int, List[Document]]:
+    """
+    Load a PDF and split it into chunks (runs inside a worker process).
+
+    Chunks carry source, page, start_index, section and date metadata (see
+    src/ingestion/metadata.py).
+
+    Returns:
+        Tuple[int, List[Document]]: Page count and chunks in document order
+    """
+    # start_index lets the context packer cut the overlap between neighbouring chunks
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True
+    )
+    pages = load_pdf_pages(path)
+    return len(pages), annotate_chunks(pages, splitter.split_documents(pages))
+
+
+class IngestionProgress:
+    """Counts pages, chunks and embedded chunks and prints throughput."""
+
+    def __init__(self, total_files: int, interval: float = 2.0, verbose: bool = True):
+        self.total_files = total_files
+        self.interval = interval
+        self.verbose = verbose
+        self.files = 0
+        self.pages = 0
+        self.chunks = 0
+        self.embedded = 0
+        self.started = time.perf_counter()
+        self._last_report = self.started
+
+    def elapsed(self) -> float:
+        return max(time.perf_counter() - self.started, 1e-9)
+
+    def summary(self) -> str:
+        elapsed = self.elapsed()
+        return (
+            f"[{self.files}/{self.total_files} files] "
+            f"{self.pages} pages ({self.pages / elapsed:.1f} pages/s), "
+            f"{self.chunks} chunks ({self.chunks / elapsed:.1f} chunks/s), "
+            f"{self.embedded} embedded in {elapsed:.1f}s"
+        )
+
+    def maybe_report(self, force: bool = False):
+        now = time.perf_counter()
+        if self.verbose and (force or now - self._last_report >= self.interval):
+            self._last_report = now
+            print(self.summary())
+
+
+class ChromaBatchWriter:
+    """Writes chunk batches to a vector store through add_documents (embedding them on the way)."""
+
+    def __init__(self, vectorstore):
+        self.vectorstore = vectorstore
+
+    def write(self, documents: List[Document], ids: List[str]):
+        self.vectorstore.add_documents(documents=documents, ids=ids)
+
+    def delete(self, ids: List[str]):
+        if ids:
+            self.vectorstore.delete(ids=ids)
+
+    def close(self, completed: bool = True):
+        pass
+
+
+class _ChunkBuffer:
+    """
+    Accumulates chunks across files and flushes them in fixed-size batches.
+
+    Writers may store batches asynchronously by returning a Future from
+    write(). A file is committed to the manifest only once every batch up to
+    and including its last chunk has been stored, so an interrupted run never
+    records a file as done too early.
+    """
+
+    def __init__(self, writer, batch_size: int, manifest: IngestionManifest, progress: IngestionProgress):
+        self.writer = writer
+        self.batch_size = batch_size
+        self.manifest = manifest
+        self.progress = progress
+        self.documents: List[Document] = []
+        self.ids: List[str] = []
+        self.queued = 0
+        self.flushed = 0
+        # (future, chunk count) of batches handed to the writer, in submit order
+        self.in_flight: Deque[Tuple[Future, int]] = deque()
+        # (source, manifest entry, sequence number of its last chunk)
+        self.pending_files: List[Tuple[str, Dict, int]] = []
+
+    def add_file(self, source: str, entry: Dict, documents: List[Document], ids: List[str]):
+        for doc, cid in zip(documents, ids):
+            self.documents.append(doc)
+            self.ids.append(cid)
+            self.queued += 1
+            if len(self.documents) >= self.batch_size:
+                self.flush()
+        self.pending_files.append((source, entry, self.queued))
+        self._advance()
+
+    def flush(self):
+        if self.documents:
+            count = len(self.documents)
+            result = self.writer.write(self.documents, self.ids)
+            self.documents, self.ids = [], []
+            if isinstance(result, Future):
+                self.in_flight.append((result, count))
+            else:
+                self._stored(count)
+        self._advance()
+
+    def drain(self):
+        """Wait for every batch handed to the writer."""
+        self.flush()
+        while self.in_flight:
+            future, count = self.in_flight.popleft()
+            future.result()
+            self._stored(count)
+        self._commit_files()
+
+    def _stored(self, count: int):
+        self.flushed += count
+        self.progress.embedded += count
+
+    def _advance(self):
+        # Completion is only counted in submit order, so flushed is a safe prefix
+        while self.in_flight and self.in_flight[0][0].done():
+            future, count = self.in_flight.popleft()
+            future.result()
+            self._stored(count)
+        self._commit_files()
+
+    def _commit_files(self):
+        committed = False
+        while self.pending_files and self.pending_files[0][2] <= self.flushed:
+            source, entry, _ = self.pending_files.pop(0)
+            self.manifest.sources[source] = entry
+            committed = True
+        if committed:
+            self.manifest.save()
+
+
+def run_ingestion(
+    writer,
+    source_paths: Iterable[str],
+    splitter_config: Dict[str, int],
+    manifest_path: Path,
+    workers: int = 1,
+    batch_size: int = 128,
+    existing_ids: Optional[Callable[[], List[str]]] = None,
+    verbose: bool = True,
+) -> Dict[str, Any]:
+    """
+    Bring the vector store in line with the given source files.
+
+    Unchanged files are skipped by file hash. Changed files are re-split and
+    only chunks whose ID is not already indexed get embedded; chunks that
+    disappeared are deleted, as are all chunks of sources no longer listed.
+
+    Args:
+        writer: Batch writer with write(documents, ids), delete(ids) and
+            close(completed); write() may return a Future
+        source_paths (Iterable[str]): Files that should be indexed
+        splitter_config (Dict[str, int]): chunk_size and chunk_overlap
+        manifest_path (Path): Where the manifest is persisted
+        workers (int): Worker processes used to parse and split files
+        batch_size (int): Chunks per write to the vector store
+        existing_ids (Callable): Returns the IDs already in the collection;
+            used to clear untracked chunks when there is no manifest yet
+        verbose (bool): Print progress and throughput
+
+    Returns:
+        Dict[str, Any]: Counts of added, deleted and unchanged chunks,
+            pages and files parsed, and the collection version
+    """
+    manifest = IngestionManifest(manifest_path, splitter_config)
+    stats = {"added": 0, "deleted": 0, "unchanged": 0}
+
+    # Collections built before the manifest existed hold duplicate copies of
+    # every chunk from repeated startups, so start them over once.
+    if not manifest.exists and existing_ids is not None:
+        stale_ids = existing_ids()
+        if stale_ids:
+            print(f"No ingestion manifest found, clearing {len(stale_ids)} untracked chunks")
+            writer.delete(stale_ids)
+            stats["deleted"] += len(stale_ids)
+    # Record that tracking has started, so an interrupted first run isn't cleared again
+    manifest.save()
+
+    wanted = {str(Path(p).resolve()): str(p) for p in source_paths}
+
+    for source in list(manifest.sources):
+        if source not in wanted:
+            removed = manifest.sources.pop(source).get("chunks", [])
+            writer.delete(removed)
+            stats["deleted"] += len(removed)
+            print(f"Removed {len(removed)} chunks from deleted source {source}")
+
+    to_parse = []
+    for source, path in wanted.items():
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"PDF file not found: {path}")
+        sha = file_sha256(path)
+        entry = manifest.sources.get(source)
+        if entry and entry.get("sha256") == sha:
+            stats["unchanged"] += len(entry.get("chunks", []))
+            continue
+        to_parse.append((source, path, sha))
+
+    progress = IngestionProgress(len(to_parse), verbose=verbose)
+    buffer = _ChunkBuffer(writer, batch_size, manifest, progress)
+
+    def handle(source: str, path: str, sha: str, page_count: int, chunks: List[Document]):
+        ids = assign_chunk_ids(chunks)
+        entry = manifest.sources.get(source)
+        old_ids = set(entry.get("chunks", [])) if entry else set()
+        new_docs = [doc for doc, cid in zip(chunks, ids) if cid not in old_ids]
+        new_ids = [cid for cid in ids if cid not in old_ids]
+        removed = list(old_ids - set(ids))
+
+        writer.delete(removed)
+        buffer.add_file(source, {"sha256": sha, "chunks": ids}, new_docs, new_ids)
+
+        stats["added"] += len(new_ids)
+        stats["deleted"] += len(removed)
+        stats["unchanged"] += len(ids) - len(new_ids)
+        progress.files += 1
+        progress.pages += page_count
+        progress.chunks += len(chunks)
+        progress.maybe_report()
+        if verbose:
+            print(f"Indexed {path}: {page_count} pages, {len(new_ids)} new chunks, {len(removed)} removed")
+
+    chunk_size = splitter_config["chunk_size"]
+    chunk_overlap = splitter_config["chunk_overlap"]
+    workers = max(1, min(workers, len(to_parse)))
+    try:
+        if workers == 1:
+            # A single file isn't worth starting a process pool for
+            for source, path, sha in to_parse:
+                handle(source, path, sha, *parse_and_split(path, chunk_size, chunk_overlap))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                queue = iter(to_parse)
+                in_flight = {}
+                # Keep at most two files per worker in flight so parsed chunks never pile up
+                while True:
+                    while len(in_flight) < workers * 2:
+                        item = next(queue, None)
+                        if item is None:
+                            break
+                        future = executor.submit(parse_and_split, item[1], chunk_size, chunk_overlap)
+                        in_flight[future] = item
+                    if not in_flight:
+                        break
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        source, path, sha = in_flight.pop(future)
+                        handle(source, path, sha, *future.result())
+
+        buffer.drain()
+    except BaseException:
+        # Batches already stored stay in the writer's checkpoint for the next run
+        writer.close(completed=False)
+        raise
+    writer.close()
+    # Also persists removed sources when no file needed parsing
+    manifest.save()
+
+    if to_parse:
+        progress.maybe_report(force=True)
+    stats["files_parsed"] = progress.files
+    stats["pages"] = progress.pages
+    stats["version"] = manifest.collection_version()
+    return stats
+
+
+def sync_sources(
+    vectorstore,
+    source_paths: Iterable[str],
+    text_splitter,
+    manifest_path: Path,
+    workers: int = 1,
+    batch_size: int = 128,
+    writer=None,
+) -> Dict[str, Any]:
+    """
+    Sync a vector store with the given source files (see run_ingestion).
+
+    Args:
+        vectorstore: Chroma or NumpyVectorStore to update in place
+        source_paths (Iterable[str]): PDF files that should be indexed
+        text_splitter: Splitter whose settings are used to chunk the pages
+        manifest_path (Path): Where the manifest is persisted
+        workers (int): Worker processes used to parse and split files
+        batch_size (int): Chunks per write to the vector store
+        writer: Batch writer to use (defaults to a plain ChromaBatchWriter)
+
+    Returns:
+        Dict[str, Any]: Ingestion statistics and the collection version
+    """
+    splitter_config = {
+        "chunk_size": text_splitter._chunk_size,
+        "chunk_overlap": text_splitter._chunk_overlap,
+    }
+    return run_ingestion(
+        writer or ChromaBatchWriter(vectorstore),
+        source_paths,
+        splitter_config,
+        manifest_path,
+        workers=workers,
+        batch_size=batch_size,
+        existing_ids=lambda: vectorstore.get(include=[])["ids"],
+    )
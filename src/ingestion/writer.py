@@ -0,0 +1,251 @@
+"""
+Concurrency-limited, rate-limit-aware embedding writer for ingestion.
+
+Chunks are embedded in batches on a bounded thread pool, throttled by token
+buckets for requests and tokens per minute, retried with exponential backoff
+when the API answers 429 (or 5xx), and upserted into the vector store
+together with their vectors. Every written chunk ID is appended to a checkpoint file, so an
+interrupted ingest resumes without embedding those chunks again.
+"""
+import json
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+
+from langchain_core.documents import Document
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float = 1.0) -> float:
+        """
+        Block until `amount` tokens are available and take them.
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return waited
+                delay = (amount - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None and getattr(error, "response", None) is not None:
+        status = getattr(error.response, "status_code", None)
+    return status
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _chroma_metadata(metadata: dict) -> dict:
+    """Chroma only stores scalar metadata values."""
+    return {k: v for k, v in metadata.items() if isinstance(v, (str, int, float, bool))}
+
+
+class EmbeddingBatchWriter:
+    """
+    Batch writer for run_ingestion that embeds and upserts chunks concurrently.
+
+    write() returns a Future per batch and blocks once max_inflight embedding
+    requests are pending, which keeps memory bounded when embedding is the
+    bottleneck.
+    """
+
+    def __init__(
+        self,
+        vectorstore,
+        embeddings,
+        request_size: int = 64,
+        max_inflight: int = 4,
+        requests_per_minute: float = 3000,
+        tokens_per_minute: float = 1_000_000,
+        max_retries: int = 6,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        checkpoint_path: Optional[Path] = None,
+    ):
+        self.vectorstore = vectorstore
+        self.embeddings = embeddings
+        self.request_size = request_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.request_bucket = TokenBucket(requests_per_minute / 60.0, max(1.0, requests_per_minute / 60.0))
+        self.token_bucket = TokenBucket(tokens_per_minute / 60.0, tokens_per_minute / 60.0)
+        self.stats = {"requests": 0, "retries": 0, "rate_limited": 0, "throttled_seconds": 0.0, "skipped": 0}
+
+        self._executor = ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="embed-writer")
+        self._slots = threading.BoundedSemaphore(max_inflight)
+        self._lock = threading.Lock()
+        self._upsert_lock = threading.Lock()
+
+        self.checkpoint_path = Path(checkpoint_path) if checkpoint_path else None
+        self._done_ids = set()
+        self._checkpoint = None
+        if self.checkpoint_path:
+            if self.checkpoint_path.exists():
+                with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        line = line.strip()
+                        if line:
+                            self._done_ids.update(json.loads(line))
+                if self._done_ids:
+                    print(f"Resuming ingest: {len(self._done_ids)} chunks already written per checkpoint")
+            self.checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+            self._checkpoint = open(self.checkpoint_path, "a", encoding="utf-8")
+
+    def _count(self, key: str, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed one request's worth of texts, respecting rate limits and retrying on 429/5xx."""
+        # ~4 characters per token is close enough for budgeting
+        estimated_tokens = sum(len(text) for text in texts) / 4
+        for attempt in range(self.max_retries + 1):
+            waited = self.request_bucket.acquire(1)
+            waited += self.token_bucket.acquire(estimated_tokens)
+            if waited:
+                self._count("throttled_seconds", waited)
+            self._count("requests")
+            try:
+                return self.embeddings.embed_documents(texts)
+            except Exception as e:
+                status = _status_code(e)
+                retryable = status == 429 or (status is not None and status >= 500)
+                if not retryable or attempt == self.max_retries:
+                    raise
+                if status == 429:
+                    self._count("rate_limited")
+                self._count("retries")
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+                    delay *= random.uniform(0.5, 1.0)  # Jitter so workers don't retry in lockstep
+                print(f"Embedding request failed with {status}, retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def _write_request(self, documents: List[Document], ids: List[str]):
+        try:
+            vectors = self._embed([doc.page_content for doc in documents])
+            # NumpyVectorStore takes vectors directly; for Chroma go through the underlying collection
+            upsert = getattr(self.vectorstore, "upsert_embeddings", None) or self.vectorstore._collection.upsert
+            with self._upsert_lock:
+                upsert(
+                    ids=ids,
+                    embeddings=vectors,
+                    documents=[doc.page_content for doc in documents],
+                    metadatas=[_chroma_metadata(doc.metadata) for doc in documents],
+                )
+                if self._checkpoint:
+                    self._checkpoint.write(json.dumps(ids) + "\n")
+                    self._checkpoint.flush()
+        finally:
+            self._slots.release()
+
+    def write(self, documents: List[Document], ids: List[str]) -> Future:
+        """
+        Queue a batch, split into embedding requests that run concurrently.
+
+        Returns:
+            Future: Completes once every chunk of the batch is stored, or with
+                the first error
+        """
+        todo = [(doc, cid) for doc, cid in zip(documents, ids) if cid not in self._done_ids]
+        self._count("skipped", len(ids) - len(todo))
+        batch = Future()
+        if not todo:
+            batch.set_result(None)
+            return batch
+
+        requests = [todo[i:i + self.request_size] for i in range(0, len(todo), self.request_size)]
+        remaining = [len(requests)]
+        remaining_lock = threading.Lock()
+
+        def request_done(future: Future):
+            with remaining_lock:
+                if batch.done():
+                    return
+                if future.exception() is not None:
+                    batch.set_exception(future.exception())
+                    return
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    batch.set_result(None)
+
+        for request in requests:
+            self._slots.acquire()
+            future = self._executor.submit(
+                self._write_request, [doc for doc, _ in request], [cid for _, cid in request]
+            )
+            future.add_done_callback(request_done)
+        return batch
+
+    def delete(self, ids: List[str]):
+        if ids:
+            with self._upsert_lock:
+                self.vectorstore.delete(ids=ids)
+
+    def close(self, completed: bool = True):
+        """
+        Wait for queued batches and release resources.
+
+        Args:
+            completed (bool): The ingest finished; the checkpoint is no longer
+                needed because the manifest now records every file
+        """
+        self._executor.shutdown(wait=True)
+        if self._checkpoint:
+            self._checkpoint.close()
+            self._checkpoint = None
+            if completed and self.checkpoint_path.exists():
+                self.checkpoint_path.unlink()
+
+
+def embedding_writer_from_settings(
+    vectorstore,
+    embeddings,
+    settings,
+    checkpoint_path: Optional[Path] = None,
+) -> EmbeddingBatchWriter:
+    """Build an EmbeddingBatchWriter configured by the INGEST_* settings (checkpoint_path overrides its own)."""
+    return EmbeddingBatchWriter(
+        vectorstore,
+        embeddings,
+        request_size=settings.INGEST_EMBED_REQUEST_SIZE,
+        max_inflight=settings.INGEST_MAX_INFLIGHT,
+        requests_per_minute=settings.INGEST_REQUESTS_PER_MINUTE,
+        tokens_per_minute=settings.INGEST_TOKENS_PER_MINUTE,
+        max_retries=settings.INGEST_MAX_RETRIES,
+        backoff_base=settings.INGEST_BACKOFF_BASE_SECONDS,
+        checkpoint_path=checkpoint_path or settings.INGEST_CHECKPOINT_PATH,
+    )
@@ -0,0 +1 @@
+# Retrieval package 
\ No newline at end of file
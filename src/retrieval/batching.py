@@ -0,0 +1,131 @@
+"""
+Micro-batching wrapper for query embeddings.
+
+Every retriever_tool call embeds one query. Under load that is one HTTP
+round-trip per query even though the embeddings API accepts a list of inputs.
+MicroBatchingEmbeddings collects queries that arrive within a short window
+(or until the batch is full), sends them in a single embed_documents call and
+hands each caller its own vector back.
+"""
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+# Queued by close(): the collector dispatches what it has and exits
+_STOP = object()
+
+
+class MicroBatchingEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that coalesces concurrent embed_query calls.
+
+    Works for both sync callers (Chroma runs similarity search in worker
+    threads) and async callers. Document embedding during ingestion is
+    already batched, so embed_documents goes straight to the wrapped model.
+    """
+
+    def __init__(self, inner: Embeddings, window_ms: float = 5.0, max_batch_size: int = 64, max_inflight: int = 4):
+        self.inner = inner
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self.batches = 0
+        self.queries = 0
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="embed-batch")
+        self._collector = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def _submit(self, text: str) -> Future:
+        future = Future()
+        # Under the lock, so nothing is queued behind close()'s stop marker
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("MicroBatchingEmbeddings is closed")
+            if self._collector is None:
+                self._collector = threading.Thread(target=self._collect, name="embed-collector", daemon=True)
+                self._collector.start()
+            self._queue.put((text, future))
+        return future
+
+    def _collect(self):
+        """Group queued queries into batches and dispatch them."""
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            # Keep collecting while this batch is being embedded
+            self._executor.submit(self._flush, batch)
+
+    def _flush(self, batch: List[tuple]):
+        # Identical queries in the same window share one input
+        unique = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            vectors = self.inner.embed_documents(unique)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        by_text = dict(zip(unique, vectors))
+        with self._lock:
+            self.batches += 1
+            self.queries += len(batch)
+        for text, future in batch:
+            future.set_result(by_text[text])
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._submit(text).result()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await asyncio.wrap_future(self._submit(text))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.inner.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.inner.aembed_documents(texts)
+
+    def close(self):
+        """Stop the collector thread and shut down the batch threads once pending queries are embedded."""
+        with self._lock:
+            self._closed = True
+            collector, self._collector = self._collector, None
+            if collector is not None:
+                self._queue.put(_STOP)
+        if collector is not None:
+            collector.join()
+        self._executor.shutdown(wait=True)
+        # Whatever the collector did not dispatch fails instead of waiting forever
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                item[1].set_exception(RuntimeError("MicroBatchingEmbeddings is closed"))
+
+    def stats(self) -> dict:
+        """Number of embedding requests sent and queries they served."""
+        with self._lock:
+            return {"batches": self.batches, "queries": self.queries}
@@ -0,0 +1,170 @@
+"""
+In-process BM25 index over the ingested chunks.
+
+Dense embeddings are weak at exact tokens such as tickers (PLTR), index names
+(Russell 2000) and figures (340%), which financial questions hinge on. This
+inverted index scores those tokens with Okapi BM25. It is rebuilt from the
+vector store whenever the collection version changes and persisted next to
+it, so a normal start only loads a JSON file.
+"""
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import AbstractSet, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Keeps "s&p", "p/e", "64-67%", "2.0" and "$189" together as single tokens
+_TOKEN_RE = re.compile(r"\$?[a-z0-9]+(?:[&./-][a-z0-9]+)*%?")
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by did do does for from had has have how in is it its of on or "
+    "than that the this to was were what when which who why with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase index terms.
+
+    Figures are indexed both as written and bare ("$189" also yields "189",
+    "23%" also yields "23"), so a question can match either form.
+    """
+    terms = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        terms.append(token)
+        bare = token.strip("$%")
+        if bare != token and bare:
+            terms.append(bare)
+    return terms
+
+
+class BM25Index:
+    """Okapi BM25 over chunk IDs, with incremental add/remove and JSON persistence."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, version: Optional[str] = None):
+        self.k1 = k1
+        self.b = b
+        self.version = version
+        self.doc_terms: Dict[str, Dict[str, int]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_terms)
+
+    def _index(self, chunk_id: str, counts: Dict[str, int]):
+        self.doc_terms[chunk_id] = counts
+        length = sum(counts.values())
+        self.doc_lengths[chunk_id] = length
+        self.total_length += length
+        for term, tf in counts.items():
+            self.postings[term][chunk_id] = tf
+
+    def add(self, ids: Iterable[str], texts: Iterable[str]):
+        """Index chunks; an ID that is already indexed is replaced."""
+        for chunk_id, text in zip(ids, texts):
+            if chunk_id in self.doc_terms:
+                self.remove([chunk_id])
+            self._index(chunk_id, dict(Counter(tokenize(text))))
+
+    def remove(self, ids: Iterable[str]):
+        for chunk_id in ids:
+            counts = self.doc_terms.pop(chunk_id, None)
+            if counts is None:
+                continue
+            self.total_length -= self.doc_lengths.pop(chunk_id)
+            for term in counts:
+                postings = self.postings[term]
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self.postings[term]
+
+    def search(self, query: str, k: int = 20, ids: Optional[AbstractSet[str]] = None) -> List[Tuple[str, float]]:
+        """
+        Score every chunk that shares a term with the query.
+
+        Args:
+            query (str): Free-text query
+            k (int): Number of results to return
+            ids (Optional[AbstractSet[str]]): Only score these chunks
+
+        Returns:
+            List[Tuple[str, float]]: (chunk ID, score), best first
+        """
+        n_docs = len(self.doc_terms)
+        if not n_docs:
+            return []
+        avg_length = self.total_length / n_docs
+        scores: Dict[str, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            df = len(postings)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for chunk_id, tf in postings.items():
+                if ids is not None and chunk_id not in ids:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[chunk_id] / avg_length)
+                scores[chunk_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+
+    def save(self, path: Path):
+        """Persist the index atomically (write to a temp file, then rename)."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.version, "k1": self.k1, "b": self.b, "docs": self.doc_terms}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "BM25Index":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(k1=data["k1"], b=data["b"], version=data.get("version"))
+        for chunk_id, counts in data["docs"].items():
+            index._index(chunk_id, counts)
+        return index
+
+
+def load_or_build_bm25(
+    path: Path,
+    version: str,
+    fetch_chunks: Callable[[], Tuple[List[str], List[str]]],
+    k1: float = 1.5,
+    b: float = 0.75,
+) -> BM25Index:
+    """
+    Load the persisted index, rebuilding it if it belongs to another collection version.
+
+    Args:
+        path (Path): Where the index is persisted
+        version (str): Current collection version (from the ingestion manifest)
+        fetch_chunks (Callable): Returns (ids, texts) of every chunk in the collection
+        k1 (float): BM25 term frequency saturation
+        b (float): BM25 length normalization
+
+    Returns:
+        BM25Index: An index matching the collection
+    """
+    path = Path(path)
+    if path.exists():
+        try:
+            index = BM25Index.load(path)
+            if index.version == version and index.k1 == k1 and index.b == b:
+                return index
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable BM25 index at {path}: {e}")
+
+    ids, texts = fetch_chunks()
+    index = BM25Index(k1=k1, b=b, version=version)
+    index.add(ids, texts)
+    index.save(path)
+    print(f"Built BM25 index over {len(index)} chunks ({len(index.postings)} terms)")
+    return index
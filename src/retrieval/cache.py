@@ -0,0 +1,291 @@
+"""
+Two-level retrieval cache.
+
+Level 1 maps the embedding model and normalized query text to its embedding
+vector, so repeated questions skip the embeddings API. Level 2 maps (embedding, k, collection
+version) to the IDs of the top-k chunks, so repeated searches skip the
+similarity scan and only fetch the chunks by ID. Both levels are bounded
+LRU maps with an optional TTL, kept in memory or in SQLite so they survive
+restarts. Result entries carry the collection version in their key, so
+re-ingesting the collection invalidates them automatically.
+"""
+import asyncio
+import hashlib
+import json
+import re
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase and collapse whitespace so trivially different phrasings share an entry."""
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+
+def vector_key(vector: List[float]) -> str:
+    """Hash an embedding vector into a compact cache key."""
+    return hashlib.sha256(struct.pack(f"{len(vector)}f", *vector)).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU map with optional TTL and hit/miss counters."""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_seconds is not None and time.time() - entry[1] > self.ttl_seconds:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self)}
+
+
+class SQLiteLRUCache(LRUCache):
+    """
+    Disk-backed LRU map sharing one SQLite file between namespaces.
+
+    Values are stored as JSON. Access time is updated on every hit and the
+    least recently used rows are deleted once the namespace exceeds
+    max_entries.
+    """
+
+    def __init__(self, path: Path, namespace: str, max_entries: int = 1024, ttl_seconds: Optional[float] = None):
+        super().__init__(max_entries, ttl_seconds)
+        self.namespace = namespace
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                " created REAL NOT NULL, accessed REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS cache_lru ON cache (namespace, accessed)")
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM cache WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+            if row is not None and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                with self._conn:
+                    self._conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE cache SET accessed = ? WHERE namespace = ? AND key = ?",
+                    (now, self.namespace, key),
+                )
+            self.hits += 1
+            return json.loads(row[0])
+
+    def set(self, key: str, value: Any):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, json.dumps(value), now, now),
+            )
+            self._conn.execute(
+                "DELETE FROM cache WHERE namespace = ? AND key IN ("
+                " SELECT key FROM cache WHERE namespace = ? ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.namespace, self.namespace, self.max_entries),
+            )
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache WHERE namespace = ?", (self.namespace,))
+
+    def retain_prefix(self, prefix: str):
+        """Drop every entry whose key does not start with prefix."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM cache WHERE namespace = ? AND substr(key, 1, ?) != ?",
+                (self.namespace, len(prefix), prefix),
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM cache WHERE namespace = ?", (self.namespace,)
+            ).fetchone()[0]
+
+
+class RetrievalCache:
+    """Query-embedding and search-result caches for one collection version."""
+
+    def __init__(
+        self,
+        collection_version: str,
+        backend: str = "memory",
+        path: Optional[Path] = None,
+        max_entries: int = 1024,
+        ttl_seconds: Optional[float] = None,
+        embedding_model: str = "",
+    ):
+        self.collection_version = collection_version
+        # Vectors of another model (or dimension) must never be served, so it is part of the key
+        self.embedding_model = embedding_model
+        if backend == "sqlite":
+            self.embeddings = SQLiteLRUCache(path, "embedding", max_entries, ttl_seconds)
+            self.results = SQLiteLRUCache(path, "results", max_entries, ttl_seconds)
+            # Results from an older ingest and vectors from an older model can never be hit again
+            self.results.retain_prefix(f"{collection_version}:")
+            self.embeddings.retain_prefix(f"{embedding_model}:")
+        elif backend == "memory":
+            self.embeddings = LRUCache(max_entries, ttl_seconds)
+            self.results = LRUCache(max_entries, ttl_seconds)
+        else:
+            raise ValueError(f"Unknown retrieval cache backend: {backend}")
+
+    def embedding_key(self, query: str) -> str:
+        return f"{self.embedding_model}:{normalize_query(query)}"
+
+    def embed_query(self, embeddings, query: str) -> List[float]:
+        """Embed a query through the level 1 cache."""
+        key = self.embedding_key(query)
+        vector = self.embeddings.get(key)
+        if vector is None:
+            vector = embeddings.embed_query(query)
+            self.embeddings.set(key, vector)
+        return vector
+
+    async def aembed_query(self, embeddings, query: str) -> List[float]:
+        key = self.embedding_key(query)
+        vector = self.embeddings.get(key)
+        if vector is None:
+            vector = await embeddings.aembed_query(query)
+            self.embeddings.set(key, vector)
+        return vector
+
+    def result_key(self, vector: List[float], k: int) -> str:
+        return f"{self.collection_version}:{k}:{vector_key(vector)}"
+
+    def set_collection_version(self, collection_version: str):
+        """Switch to a new collection version; stale result entries stop matching."""
+        self.collection_version = collection_version
+        self.results.clear()
+
+    def stats(self) -> dict:
+        return {
+            "collection_version": self.collection_version,
+            "embedding": self.embeddings.stats(),
+            "results": self.results.stats(),
+        }
+
+
+class CachedRetriever(BaseRetriever):
+    """
+    Similarity retriever over a vector store, backed by a RetrievalCache when one is given.
+
+    Drop-in replacement for vectorstore.as_retriever(search_type="similarity")
+    that also takes a chunk_filter (see src/retrieval/filters.py): the
+    vector store then only scores the allowed chunks.
+    """
+
+    vectorstore: Any
+    embeddings: Any
+    cache: Any = None
+    k: int = 5
+
+    def _docs_by_ids(self, ids: List[str]) -> Optional[List[Document]]:
+        found = self.vectorstore.get(ids=ids, include=["documents", "metadatas"])
+        by_id = {
+            cid: Document(id=cid, page_content=text, metadata=metadata or {})
+            for cid, text, metadata in zip(found["ids"], found["documents"], found["metadatas"])
+        }
+        # A chunk vanished underneath us: treat as a miss rather than return a partial list
+        if len(by_id) != len(ids):
+            return None
+        return [by_id[cid] for cid in ids]
+
+    def _vector_search(self, vector: List[float], chunk_filter=None) -> List[Document]:
+        if chunk_filter is None:
+            return self.vectorstore.similarity_search_by_vector(vector, k=self.k)
+        if not chunk_filter.ids:
+            return []
+        # Both Chroma's query() and NumpyVectorStore score only the given IDs
+        return self.vectorstore.similarity_search_by_vector(
+            vector, k=min(self.k, len(chunk_filter.ids)), ids=sorted(chunk_filter.ids)
+        )
+
+    def _search(self, vector: List[float], chunk_filter=None) -> List[Document]:
+        if self.cache is None:
+            return self._vector_search(vector, chunk_filter)
+        result_key = self.cache.result_key(vector, self.k)
+        if chunk_filter is not None:
+            result_key += f":{chunk_filter.key}"
+        ids = self.cache.results.get(result_key)
+        if ids is not None:
+            docs = self._docs_by_ids(ids)
+            if docs is not None:
+                return docs
+
+        docs = self._vector_search(vector, chunk_filter)
+        if all(doc.id for doc in docs):
+            self.cache.results.set(result_key, [doc.id for doc in docs])
+        return docs
+
+    def _embed(self, query: str) -> List[float]:
+        if self.cache is None:
+            return self.embeddings.embed_query(query)
+        return self.cache.embed_query(self.embeddings, query)
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun, chunk_filter=None
+    ) -> List[Document]:
+        return self._search(self._embed(query), chunk_filter)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun, chunk_filter=None
+    ) -> List[Document]:
+        if self.cache is None:
+            vector = await self.embeddings.aembed_query(query)
+        else:
+            vector = await self.cache.aembed_query(self.embeddings, query)
+        # Vector store lookups are synchronous, keep them off the event loop
+        return await asyncio.to_thread(self._search, vector, chunk_filter)
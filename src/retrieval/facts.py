@@ -0,0 +1,370 @@
+"""
+Columnar index of the figures extracted at ingestion (see src/ingestion/facts.py).
+
+fact_lookup_tool answers exact lookups such as "S&P 500 2024 return" or
+"NVDA market cap" from this index instead of a vector search, so the LLM
+gets the figure as written, its page and its sentence in one call, without
+an embedding request.
+
+Facts are stored one column per field, like NumpyVectorStore's metadata:
+entity, metric, unit and source as dictionary-encoded int32 codes, year,
+page and value as NumPy arrays, and the figure as written and its sentence
+as string lists. A lookup finds the entities (any of their names or
+tickers), metrics (by keyword) and year named in the query with two
+precompiled regexes, then combines boolean masks over the columns: tens of
+microseconds per query.
+
+The index is persisted as facts.npz plus facts.json with the SHA-256 of
+every source file, so only new or changed files are read again.
+"""
+import json
+import os
+import re
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.ingestion.manifest import file_sha256
+
+# Query words that ask for a metric; the metric's own name always counts too
+METRIC_KEYWORDS = {
+    # Not "up"/"down": "look up NVDA market cap" asks for no return
+    "return": ("return", "returns", "performance", "perform", "performed", "gain", "gained", "rise", "rose",
+               "change", "ytd"),
+    "price return": ("price return", "price terms"),
+    "share price": ("share price", "stock price", "price", "close", "closing", "per share", "trading at"),
+    "market cap": ("market cap", "market capitalization", "market value", "worth"),
+    "market value added": ("value added", "added"),
+    "P/E ratio": ("p/e", "pe", "p e", "pe ratio", "price to earnings", "price-to-earnings", "multiple",
+                  "valuation", "trailing earnings"),
+    "price/sales": ("price/sales", "price to sales", "price-to-sales", "p/s"),
+    "revenue": ("revenue", "revenues", "sales"),
+    "revenue growth": ("revenue growth", "sales growth"),
+    "earnings growth": ("earnings", "earnings growth", "eps growth", "profit", "net income"),
+    "EPS": ("eps", "earnings per share"),
+}
+_YEAR_RE = re.compile(r"\b(?:19|20)\d{2}\b")
+# Integer columns; value is float64, table and bound bools
+_CODE_COLUMNS = ("entity", "metric", "unit", "source")
+# Year 0 means the figure's year is unknown
+_NO_YEAR = 0
+
+
+def _alternation(words: Iterable[str]) -> re.Pattern:
+    # Longest first, so "share price" wins over "price" and "S&P 500 Equal-Weight" over "S&P 500"
+    alternation = "|".join(re.escape(word) for word in sorted(set(words), key=len, reverse=True))
+    return re.compile(rf"(?<![\w&])(?:{alternation})(?![\w&]|-Weight)", re.IGNORECASE)
+
+
+def format_value(value: float, unit: str) -> str:
+    """A value in its unit, e.g. 25% or $1.2 trillion."""
+    if unit == "%":
+        return f"{value:g}%"
+    if unit == "x":
+        return f"{value:g}x"
+    if unit == "$":
+        for scale, word in ((1e12, "trillion"), (1e9, "billion"), (1e6, "million")):
+            if abs(value) >= scale:
+                return f"${value / scale:g} {word}"
+        return f"${value:,.2f}".replace(".00", "")
+    return f"{value:g}"
+
+
+class FactIndex:
+    """Facts in columns, with lookups by entity, metric and year."""
+
+    def __init__(self):
+        self.entities: List[dict] = []  # {"name", "ticker", "aliases"}, indexed by entity code
+        self.metrics: List[str] = []
+        self.units: List[str] = []
+        self.sources: List[str] = []
+        self.source_hashes: Dict[str, str] = {}
+        self.columns: Dict[str, np.ndarray] = {
+            **{name: np.zeros(0, dtype=np.int32) for name in _CODE_COLUMNS},
+            "year": np.zeros(0, dtype=np.int32),
+            "page": np.zeros(0, dtype=np.int32),
+            "value": np.zeros(0, dtype=np.float64),
+            "table": np.zeros(0, dtype=bool),
+            "bound": np.zeros(0, dtype=bool),
+        }
+        self.texts: List[str] = []
+        self.evidence: List[str] = []
+        self._compile()
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    @classmethod
+    def from_facts(cls, facts: List[dict], entities: Iterable[dict], source_hashes: Dict[str, str]) -> "FactIndex":
+        """
+        Build the columns from extracted facts.
+
+        Args:
+            facts (List[dict]): Facts from src.ingestion.facts, with their source
+            entities (Iterable[dict]): Entities the facts name; entries with the same ticker (or,
+                without one, the same name) are merged, so "Meta" and "Meta Platforms" are one entity
+            source_hashes (Dict[str, str]): SHA-256 of every source file the facts came from
+
+        Returns:
+            FactIndex: The index, ready for lookups
+        """
+        index = cls()
+        index.source_hashes = dict(source_hashes)
+        # Sources name the same company differently, its ticker is the same
+        by_ticker: Dict[str, dict] = {}
+        by_name: Dict[str, dict] = {}
+        for entity in entities:
+            ticker = entity.get("ticker")
+            merged = (by_ticker.get(ticker) if ticker else None) or by_name.get(entity["name"])
+            if merged is None:
+                merged = {"name": entity["name"], "ticker": ticker, "aliases": []}
+            if ticker:
+                merged["ticker"] = merged["ticker"] or ticker
+                by_ticker.setdefault(ticker, merged)
+            by_name.setdefault(entity["name"], merged)
+            merged["aliases"] += [alias for alias in (entity["name"], *entity["aliases"])
+                                  if alias not in merged["aliases"]]
+        fact_entities = [
+            by_name.setdefault(fact["entity"], {"name": fact["entity"], "ticker": None, "aliases": [fact["entity"]]})
+            for fact in facts
+        ]
+        # Only entities with figures are kept
+        index.entities = list({id(entity): entity for entity in fact_entities}.values())
+        entity_codes = {id(entity): code for code, entity in enumerate(index.entities)}
+
+        codes = {name: {} for name in _CODE_COLUMNS if name != "entity"}
+        columns = {name: [] for name in index.columns}
+        for fact, entity in zip(facts, fact_entities):
+            columns["entity"].append(entity_codes[id(entity)])
+            for name in codes:
+                columns[name].append(codes[name].setdefault(str(fact.get(name) or ""), len(codes[name])))
+            columns["year"].append(fact.get("year") or _NO_YEAR)
+            columns["page"].append(fact.get("page") or 0)
+            columns["value"].append(fact["value"])
+            columns["table"].append(bool(fact.get("table")))
+            columns["bound"].append(bool(fact.get("bound")))
+            index.texts.append(fact["text"])
+            index.evidence.append(fact["evidence"])
+        index.metrics, index.units, index.sources = (list(codes[name]) for name in ("metric", "unit", "source"))
+        index.columns = {name: np.asarray(values, dtype=index.columns[name].dtype) for name, values in columns.items()}
+        index._compile()
+        return index
+
+    def facts(self, source: Optional[str] = None) -> List[dict]:
+        """The facts as dicts (of one source only, if given), in document order."""
+        rows = range(len(self))
+        if source is not None:
+            if source not in self.sources:
+                return []
+            rows = np.flatnonzero(self.columns["source"] == self.sources.index(source))
+        return [self._row(int(row)) for row in rows]
+
+    def _row(self, row: int) -> dict:
+        entity = self.entities[self.columns["entity"][row]]
+        year = int(self.columns["year"][row])
+        return {
+            "entity": entity["name"],
+            "ticker": entity.get("ticker"),
+            "metric": self.metrics[self.columns["metric"][row]],
+            "year": year if year != _NO_YEAR else None,
+            "value": float(self.columns["value"][row]),
+            "unit": self.units[self.columns["unit"][row]],
+            "text": self.texts[row],
+            "page": int(self.columns["page"][row]),
+            "source": self.sources[self.columns["source"][row]],
+            "evidence": self.evidence[row],
+            "table": bool(self.columns["table"][row]),
+            "bound": bool(self.columns["bound"][row]),
+        }
+
+    def _compile(self):
+        """Regexes that find entity names and metric words in a query."""
+        self._entity_codes: Dict[str, int] = {}
+        for code, entity in enumerate(self.entities):
+            for alias in entity["aliases"]:
+                self._entity_codes.setdefault(alias.lower(), code)
+        self._entity_re = _alternation(self._entity_codes) if self._entity_codes else None
+
+        self._metric_codes: Dict[str, List[int]] = {}
+        for code, metric in enumerate(self.metrics):
+            for word in {metric.lower(), *METRIC_KEYWORDS.get(metric, ())}:
+                self._metric_codes.setdefault(word, []).append(code)
+        self._metric_re = _alternation(self._metric_codes) if self._metric_codes else None
+
+    def parse(self, query: str) -> Tuple[List[int], List[int], Optional[int]]:
+        """Entity codes, metric codes (empty: any) and year (or None) named in a query."""
+        entities, metrics = [], []
+        if self._entity_re is not None:
+            entities = list(dict.fromkeys(self._entity_codes[m.group(0).lower()] for m in self._entity_re.finditer(query)))
+            # "Russell 2000" names no year, "S&P 500 Equal-Weight" no metric
+            query = self._entity_re.sub(" ", query)
+        if self._metric_re is not None:
+            for match in self._metric_re.finditer(query):
+                metrics += [code for code in self._metric_codes[match.group(0).lower()] if code not in metrics]
+        years = _YEAR_RE.findall(query)
+        return entities, metrics, int(years[0]) if years else None
+
+    def _any_of(self, column: str, codes: List[int]) -> np.ndarray:
+        # A few equality tests beat np.isin on columns this small
+        mask = self.columns[column] == codes[0]
+        for code in codes[1:]:
+            mask |= self.columns[column] == code
+        return mask
+
+    def lookup(self, query: str, limit: int = 5) -> Tuple[List[dict], dict]:
+        """
+        Facts matching a query like "S&P 500 2024 return" or "NVDA market cap".
+
+        Facts of the year asked for come before those whose year is unknown,
+        table cells before figures from prose, then document order. Bounds
+        ("over 20%") are left out whenever an exact figure matches.
+
+        Args:
+            query (str): Entity (name or ticker), optionally a metric and a year
+            limit (int): Max facts returned
+
+        Returns:
+            Tuple[List[dict], dict]: Matching facts, and what the query was parsed into
+        """
+        entities, metrics, year = self.parse(query)
+        parsed = {
+            "entities": [self.entities[code]["name"] for code in entities],
+            "metrics": [self.metrics[code] for code in metrics],
+            "year": year,
+        }
+        if not entities:
+            return [], parsed
+
+        mask = self._any_of("entity", entities)
+        if metrics:
+            mask &= self._any_of("metric", metrics)
+        if year is not None:
+            mask &= (self.columns["year"] == year) | (self.columns["year"] == _NO_YEAR)
+        if (mask & ~self.columns["bound"]).any():
+            mask &= ~self.columns["bound"]
+        rows = np.flatnonzero(mask)
+        other_year = self.columns["year"][rows] != year if year is not None else np.zeros(len(rows), dtype=bool)
+        # lexsort is stable and sorts by its last key first
+        rows = rows[np.lexsort((~self.columns["table"][rows], other_year))]
+        return [self._row(int(row)) for row in rows[:limit]], parsed
+
+    def describe(self, limit: int = 20) -> str:
+        """Entities and metrics with figures, to tell the LLM what a lookup can match."""
+        names = [entity["name"] + (f" ({entity['ticker']})" if entity.get("ticker") else "")
+                 for entity in self.entities]
+        more = f" (and {len(names) - limit} more)" if len(names) > limit else ""
+        return f"Entities: {', '.join(names[:limit]) or 'none'}{more}\nMetrics: {', '.join(self.metrics) or 'none'}"
+
+    def stats(self) -> dict:
+        return {
+            "facts": len(self),
+            "entities": len(self.entities),
+            "metrics": len(self.metrics),
+            "sources": len(self.source_hashes),
+            "table_cells": int(self.columns["table"].sum()),
+        }
+
+    def save(self, directory: Path):
+        """Persist the columns and dictionaries atomically (temp files, then rename)."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        tmp_columns = directory / "facts.tmp.npz"
+        np.savez(tmp_columns, **self.columns)
+        tmp_json = directory / "facts.json.tmp"
+        with open(tmp_json, "w", encoding="utf-8") as f:
+            json.dump({
+                "entities": self.entities,
+                "metrics": self.metrics,
+                "units": self.units,
+                "sources": self.sources,
+                "source_hashes": self.source_hashes,
+                "texts": self.texts,
+                "evidence": self.evidence,
+            }, f)
+        os.replace(tmp_columns, directory / "facts.npz")
+        os.replace(tmp_json, directory / "facts.json")
+
+    @classmethod
+    def load(cls, directory: Path) -> "FactIndex":
+        directory = Path(directory)
+        with open(directory / "facts.json", "r", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls()
+        with np.load(directory / "facts.npz") as columns:
+            index.columns = {name: columns[name] for name in index.columns}
+        for name in ("entities", "metrics", "units", "sources", "source_hashes", "texts", "evidence"):
+            setattr(index, name, data[name])
+        if any(len(column) != len(index.texts) for column in index.columns.values()):
+            raise ValueError("fact index columns and dictionaries disagree")
+        index._compile()
+        return index
+
+
+def format_facts(facts: List[dict], parsed: dict, index: FactIndex) -> str:
+    """The tool's text output: one line per fact with its page and sentence, or what the index knows."""
+    if not facts:
+        if not parsed["entities"]:
+            reason = "The query names no entity the fact index knows."
+        else:
+            asked = ", ".join(parsed["metrics"]) or "any metric"
+            year = f" in {parsed['year']}" if parsed["year"] else ""
+            reason = f"No figure for {', '.join(parsed['entities'])} ({asked}){year} in the fact index."
+        return f"{reason} Use the search tool instead.\n{index.describe()}"
+
+    lines = []
+    for fact in facts:
+        year = f" {fact['year']}" if fact["year"] else ""
+        ticker = f" ({fact['ticker']})" if fact["ticker"] else ""
+        lines.append(
+            f"{fact['entity']}{ticker} {fact['metric']}{year}: {fact['text']} "
+            f"[{format_value(fact['value'], fact['unit'])}, {Path(fact['source']).name} page {fact['page'] + 1}]\n"
+            f"  \"{fact['evidence']}\""
+        )
+    return "\n".join(lines)
+
+
+def load_or_build_fact_index(
+    directory: Path,
+    source_paths: Iterable[str],
+    extract: Callable[[str], Tuple[List[dict], List[dict]]],
+) -> FactIndex:
+    """
+    Load the persisted index, re-extracting the facts of new or changed source files.
+
+    Args:
+        directory (Path): Where the index is persisted
+        source_paths (Iterable[str]): Files that should be indexed
+        extract (Callable): Returns (facts, entities) of one file
+
+    Returns:
+        FactIndex: An index matching the source files
+    """
+    directory = Path(directory)
+    index = None
+    if (directory / "facts.json").exists():
+        try:
+            index = FactIndex.load(directory)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Ignoring unreadable fact index at {directory}: {e}")
+
+    hashes = {str(Path(path).resolve()): file_sha256(path) for path in source_paths}
+    if index is not None and index.source_hashes == hashes:
+        return index
+
+    facts, entities, parsed = [], list(index.entities) if index is not None else [], 0
+    for source, sha in hashes.items():
+        if index is not None and index.source_hashes.get(source) == sha:
+            facts += index.facts(source)
+            continue
+        found, named = extract(source)
+        for fact in found:
+            fact["source"] = source
+        facts += found
+        entities += named
+        parsed += 1
+    index = FactIndex.from_facts(facts, entities, hashes)
+    index.save(directory)
+    print(f"Built fact index: {len(index)} facts about {len(index.entities)} entities "
+          f"({index.stats()['table_cells']} from tables, {parsed} files read)")
+    return index
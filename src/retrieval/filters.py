@@ -0,0 +1,234 @@
+"""
+Metadata filters for retrieval, backed by an inverted index.
+
+retriever_tool can scope a search to one document, a page range, a section
+or a date range. MetadataIndex maps each metadata value (source file,
+page, section heading, document date) to the IDs of its chunks, so a filter
+resolves to the set of allowed chunk IDs with a few dictionary lookups
+and set operations. The retrievers then score only those chunks: the vector
+store searches within the IDs, and BM25 skips postings outside them. This
+is unlike post-filtering a top-k, which comes back short or empty when the
+scope is small.
+
+The index is built from the vector store's metadata whenever the collection
+version changes and persisted next to it, like the BM25 index.
+"""
+import bisect
+import hashlib
+import json
+import os
+import re
+from collections import defaultdict
+from pathlib import Path
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+# Filter arguments of retriever_tool, in the order they appear in the cache key
+FILTER_FIELDS = ("document", "page_from", "page_to", "section", "date_from", "date_to")
+
+
+def _normalize(text: str) -> str:
+    """Lowercase words only, so "stock market performance" matches "Stock_Market_Performance_2024.pdf"."""
+    return " ".join(re.findall(r"[a-z0-9]+", str(text).lower()))
+
+
+class ChunkFilter:
+    """Resolved filter: the allowed chunk IDs, plus a stable key for caches and logs."""
+
+    def __init__(self, ids: FrozenSet[str], spec: Dict):
+        self.ids = ids
+        self.spec = spec
+        self.key = hashlib.sha256(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __repr__(self) -> str:
+        scope = ", ".join(f"{name}={value!r}" for name, value in self.spec.items())
+        return f"ChunkFilter({scope}: {len(self.ids)} chunks)"
+
+
+def filter_spec(args: Dict) -> Dict:
+    """The filter fields set in a tool call's arguments (None and "" mean unset)."""
+    return {name: args[name] for name in FILTER_FIELDS if args.get(name) not in (None, "")}
+
+
+class MetadataIndex:
+    """Inverted index from chunk metadata values to chunk IDs."""
+
+    def __init__(self, version: Optional[str] = None):
+        self.version = version
+        # chunk ID -> (source, page, section, date); page is 0-based as stored by PyPDFLoader
+        self.chunks: Dict[str, Tuple] = {}
+        self.documents: Dict[str, set] = defaultdict(set)
+        self.sections: Dict[str, set] = defaultdict(set)
+        self.pages: Dict[int, set] = defaultdict(set)
+        self.dates: Dict[str, set] = defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def add(self, ids: Iterable[str], metadatas: Iterable[Optional[dict]]):
+        for chunk_id, metadata in zip(ids, metadatas):
+            metadata = metadata or {}
+            page = metadata.get("page")
+            entry = (metadata.get("source"), page if isinstance(page, int) else None,
+                     metadata.get("section"), metadata.get("date"))
+            self._index(chunk_id, entry)
+
+    def _index(self, chunk_id: str, entry: Tuple):
+        source, page, section, date = entry
+        self.chunks[chunk_id] = entry
+        if source:
+            self.documents[source].add(chunk_id)
+        if page is not None:
+            self.pages[page].add(chunk_id)
+        if section:
+            self.sections[section].add(chunk_id)
+        if date:
+            self.dates[date].add(chunk_id)
+
+    @staticmethod
+    def _matching(values: Dict[str, set], query: str, name: Callable[[str], str] = str) -> set:
+        # A value matches when the query's words appear in its name, in sequence
+        wanted = _normalize(query)
+        if not wanted:
+            return set()
+        ids = set()
+        for value, chunk_ids in values.items():
+            if wanted in _normalize(name(value)):
+                ids |= chunk_ids
+        return ids
+
+    @staticmethod
+    def _in_range(values: Dict, low, high) -> set:
+        keys = sorted(values)
+        start = bisect.bisect_left(keys, low) if low is not None else 0
+        stop = bisect.bisect_right(keys, high) if high is not None else len(keys)
+        ids = set()
+        for key in keys[start:stop]:
+            ids |= values[key]
+        return ids
+
+    @staticmethod
+    def _in_date_range(dates: Dict[str, set], low: Optional[str], high: Optional[str]) -> set:
+        # A date is a period as long as its precision: "2024" overlaps date_from="2024-06-01",
+        # and "2024" as an upper bound means the end of 2024
+        ids = set()
+        for date, chunk_ids in dates.items():
+            if (low is None or date >= low[:len(date)]) and (high is None or date <= high + "\uffff"):
+                ids |= chunk_ids
+        return ids
+
+    def resolve(
+        self,
+        document: Optional[str] = None,
+        page_from: Optional[int] = None,
+        page_to: Optional[int] = None,
+        section: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+    ) -> Optional[ChunkFilter]:
+        """
+        Chunk IDs matching every given filter.
+
+        Args:
+            document (Optional[str]): Words of the file name, e.g. "stock market performance 2024"
+            page_from (Optional[int]): First page, 1-based as printed
+            page_to (Optional[int]): Last page, inclusive
+            section (Optional[str]): Words of the section heading, e.g. "Amazon"
+            date_from (Optional[str]): Earliest document date, YYYY-MM-DD (or a prefix like YYYY);
+                a document dated by year only matches any date in that year
+            date_to (Optional[str]): Latest document date, inclusive
+
+        Returns:
+            Optional[ChunkFilter]: The allowed chunks, or None when no filter is given
+        """
+        spec = filter_spec(locals())
+        if not spec:
+            return None
+        allowed: Optional[set] = None
+
+        def narrow(ids: set):
+            nonlocal allowed
+            allowed = ids if allowed is None else allowed & ids
+
+        if "document" in spec:
+            narrow(self._matching(self.documents, document, lambda source: Path(source).name))
+        if "section" in spec:
+            narrow(self._matching(self.sections, section))
+        if "page_from" in spec or "page_to" in spec:
+            narrow(self._in_range(
+                self.pages,
+                int(spec["page_from"]) - 1 if "page_from" in spec else None,
+                int(spec["page_to"]) - 1 if "page_to" in spec else None,
+            ))
+        if "date_from" in spec or "date_to" in spec:
+            low, high = spec.get("date_from"), spec.get("date_to")
+            narrow(self._in_date_range(self.dates, str(low) if low else None, str(high) if high else None))
+        return ChunkFilter(frozenset(allowed), spec)
+
+    def describe(self, limit: int = 10) -> str:
+        """Known documents and sections, to tell the LLM what a filter can match."""
+        documents = sorted(Path(source).name for source in self.documents)
+        sections = sorted(self.sections)
+        lines = [f"Documents: {', '.join(documents[:limit]) or 'none'}"]
+        if sections:
+            more = f" (and {len(sections) - limit} more)" if len(sections) > limit else ""
+            lines.append(f"Sections: {'; '.join(sections[:limit])}{more}")
+        if self.pages:
+            lines.append(f"Pages: {min(self.pages) + 1}-{max(self.pages) + 1}")
+        if self.dates:
+            lines.append(f"Document dates: {min(self.dates)} to {max(self.dates)}")
+        return "\n".join(lines)
+
+    def save(self, path: Path):
+        """Persist the index atomically (write to a temp file, then rename)."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.version, "chunks": self.chunks}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "MetadataIndex":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(version=data.get("version"))
+        for chunk_id, entry in data["chunks"].items():
+            index._index(chunk_id, tuple(entry))
+        return index
+
+
+def load_or_build_metadata_index(
+    path: Path,
+    version: str,
+    fetch_metadatas: Callable[[], Tuple[List[str], List[dict]]],
+) -> MetadataIndex:
+    """
+    Load the persisted index, rebuilding it if it belongs to another collection version.
+
+    Args:
+        path (Path): Where the index is persisted
+        version (str): Current collection version (from the ingestion manifest)
+        fetch_metadatas (Callable): Returns (ids, metadatas) of every chunk in the collection
+
+    Returns:
+        MetadataIndex: An index matching the collection
+    """
+    path = Path(path)
+    if path.exists():
+        try:
+            index = MetadataIndex.load(path)
+            if index.version == version:
+                return index
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Ignoring unreadable metadata index at {path}: {e}")
+
+    ids, metadatas = fetch_metadatas()
+    index = MetadataIndex(version=version)
+    index.add(ids, metadatas)
+    index.save(path)
+    print(f"Built metadata index over {len(index)} chunks "
+          f"({len(index.documents)} documents, {len(index.sections)} sections)")
+    return index
@@ -0,0 +1,85 @@
+"""
+Hybrid lexical + vector retrieval.
+
+The vector retriever and the BM25 index each return a candidate ranking, and
+the two are merged with reciprocal-rank fusion: score(d) = sum over rankings
+of 1 / (rrf_k + rank). RRF needs no score calibration between BM25 and cosine
+similarity, and a chunk that is ranked well by either side makes the top k.
+"""
+import asyncio
+from collections import defaultdict
+from typing import Any, Dict, List, Sequence, Tuple
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], rrf_k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Fuse several rankings of IDs.
+
+    Args:
+        rankings (Sequence[Sequence[str]]): ID lists, best first
+        rrf_k (int): Damping constant; larger values flatten the rank weights
+
+    Returns:
+        List[Tuple[str, float]]: (ID, fused score), best first
+    """
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] += 1.0 / (rrf_k + rank)
+    return sorted(scores.items(), key=lambda entry: -entry[1])
+
+
+def _doc_key(doc: Document) -> str:
+    return doc.id or doc.page_content
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever that fuses a vector retriever with a BM25 index.
+
+    vector_retriever should return `candidates` documents; BM25 contributes as
+    many. Chunks found only by BM25 are fetched from the vector store by ID.
+    A chunk_filter is applied on both sides before scoring.
+    """
+
+    vector_retriever: Any
+    lexical_index: Any
+    vectorstore: Any
+    k: int = 5
+    candidates: int = 20
+    rrf_k: int = 60
+
+    def _fetch(self, ids: List[str]) -> Dict[str, Document]:
+        if not ids:
+            return {}
+        found = self.vectorstore.get(ids=ids, include=["documents", "metadatas"])
+        return {
+            cid: Document(id=cid, page_content=text, metadata=metadata or {})
+            for cid, text, metadata in zip(found["ids"], found["documents"], found["metadatas"])
+        }
+
+    def _fuse(self, query: str, vector_docs: List[Document], chunk_filter=None) -> List[Document]:
+        allowed = chunk_filter.ids if chunk_filter is not None else None
+        lexical_ids = [cid for cid, _ in self.lexical_index.search(query, self.candidates, ids=allowed)]
+        by_key = {_doc_key(doc): doc for doc in vector_docs}
+        fused = reciprocal_rank_fusion([list(by_key), lexical_ids], self.rrf_k)[:self.k]
+
+        by_key.update(self._fetch([key for key, _ in fused if key not in by_key]))
+        # A chunk deleted since the index was built is simply skipped
+        return [by_key[key] for key, _ in fused if key in by_key]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun, chunk_filter=None
+    ) -> List[Document]:
+        return self._fuse(query, self.vector_retriever.invoke(query, chunk_filter=chunk_filter), chunk_filter)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun, chunk_filter=None
+    ) -> List[Document]:
+        vector_docs = await self.vector_retriever.ainvoke(query, chunk_filter=chunk_filter)
+        # BM25 scoring and the vector store lookup are synchronous, keep them off the event loop
+        return await asyncio.to_thread(self._fuse, query, vector_docs, chunk_filter)
@@ -0,0 +1,167 @@
+"""
+Inverted-file (IVF) approximate nearest-neighbour index.
+
+The stored vectors are clustered into nlist cells by spherical k-means; each
+row is listed under its nearest centroid. A query scores the centroids,
+then scores exactly only the rows of its nprobe best cells. So it reads
+about nprobe / nlist of the matrix instead of all of it. nprobe is the
+recall/speed knob: more cells are slower but miss fewer neighbours that sit
+just across a cell boundary.
+
+IVFLists is immutable. Rows appended after the lists were packed sit in an
+unsorted tail with their cell assignment until the next repack, so readers
+holding an older IVFLists never see it change underneath them.
+"""
+import math
+import time
+from typing import Callable, Optional, Union
+
+import numpy as np
+
+# Rows assigned to centroids per matrix product (bounds the rows x nlist score block)
+ASSIGN_BLOCK_ROWS = 8192
+# Vectors sampled per cell for k-means training
+TRAIN_SAMPLES_PER_LIST = 64
+
+# Reads the store rows selected by a slice or an array of row numbers as unit float32 vectors
+RowReader = Callable[[Union[slice, np.ndarray]], np.ndarray]
+
+
+def default_nlist(rows: int) -> int:
+    """Cells for a corpus of this size: about 4 * sqrt(rows), at least 1."""
+    return max(1, min(rows, int(4 * math.sqrt(rows))))
+
+
+def train_centroids(samples: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """
+    Spherical k-means: unit-length centroids maximizing cosine similarity.
+
+    Args:
+        samples (np.ndarray): Unit-normalized training vectors
+        nlist (int): Number of centroids
+        iterations (int): Lloyd iterations
+        seed (int): Seed of the initial centroid choice
+
+    Returns:
+        np.ndarray: (nlist, dim) float32 centroids
+    """
+    rng = np.random.default_rng(seed)
+    nlist = min(nlist, len(samples))
+    centroids = samples[rng.choice(len(samples), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        # In blocks, so searches running alongside a background training get the GIL in between
+        assignments = assign(lambda rows: samples[rows], 0, len(samples), centroids)
+        by_cell = samples[np.argsort(assignments, kind="stable")]
+        ends = np.cumsum(np.bincount(assignments, minlength=nlist))
+        sums = np.zeros_like(centroids)
+        # One sum per cell (np.add.reduceat is far slower along axis 0 and holds the GIL throughout)
+        for cell, (start, end) in enumerate(zip(np.concatenate(([0], ends[:-1])), ends)):
+            if end > start:
+                by_cell[start:end].sum(axis=0, out=sums[cell])
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        empty = norms[:, 0] == 0
+        # Empty cells restart from a random sample instead of staying dead
+        sums[empty] = samples[rng.choice(len(samples), int(empty.sum()))]
+        norms[empty] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+    return centroids
+
+
+def assign(read_rows: RowReader, start: int, stop: int, centroids: np.ndarray) -> np.ndarray:
+    """Nearest centroid of each row in [start, stop), as int32."""
+    assignments = np.empty(stop - start, dtype=np.int32)
+    for block_start in range(start, stop, ASSIGN_BLOCK_ROWS):
+        block_stop = min(block_start + ASSIGN_BLOCK_ROWS, stop)
+        scores = read_rows(slice(block_start, block_stop)) @ centroids.T
+        assignments[block_start - start:block_stop - start] = np.argmax(scores, axis=1)
+    return assignments
+
+
+class IVFLists:
+    """Cell lists of one store generation: packed rows plus an unsorted tail."""
+
+    def __init__(self, centroids: np.ndarray, generation: str, assignments: np.ndarray, packed_rows: int):
+        self.centroids = centroids
+        self.generation = generation
+        self.assignments = assignments
+        self.rows = len(assignments)
+        self.packed_rows = packed_rows
+        packed = assignments[:packed_rows]
+        # Rows of cell c are order[offsets[c]:offsets[c + 1]]
+        self.order = np.argsort(packed, kind="stable").astype(np.int64)
+        self.offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(packed, minlength=len(centroids)), out=self.offsets[1:])
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def tail(self) -> int:
+        return self.rows - self.packed_rows
+
+    def extend(self, assignments: np.ndarray) -> "IVFLists":
+        """A copy with rows appended to the tail (the cells stay packed as they are)."""
+        extended = IVFLists.__new__(IVFLists)
+        extended.__dict__.update(self.__dict__)
+        extended.assignments = np.concatenate((self.assignments, assignments))
+        extended.rows = len(extended.assignments)
+        return extended
+
+    def candidates(self, query: np.ndarray, nprobe: int, limit: Optional[int] = None) -> np.ndarray:
+        """
+        Rows in the nprobe cells closest to a query.
+
+        Args:
+            query (np.ndarray): Unit-normalized query vector
+            nprobe (int): Cells to visit
+            limit (Optional[int]): Only rows below this (the reader's snapshot)
+
+        Returns:
+            np.ndarray: Candidate row numbers (int64)
+        """
+        nprobe = min(nprobe, self.nlist)
+        cells = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        parts = [self.order[self.offsets[cell]:self.offsets[cell + 1]] for cell in cells]
+        if self.tail:
+            in_cells = np.isin(self.assignments[self.packed_rows:], cells)
+            parts.append(np.flatnonzero(in_cells) + self.packed_rows)
+        rows = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+        if limit is not None and limit < self.rows:
+            rows = rows[rows < limit]
+        return rows
+
+
+def build_lists(
+    read_rows: RowReader,
+    rows: int,
+    generation: str,
+    centroids: Optional[np.ndarray] = None,
+    nlist: int = 0,
+    seed: int = 0,
+) -> IVFLists:
+    """
+    Cell lists over rows [0, rows), training new centroids unless given.
+
+    Args:
+        read_rows (RowReader): Reads rows of the store as unit float32 vectors
+        rows (int): Rows to index
+        generation (str): Store generation the row numbers belong to
+        centroids (Optional[np.ndarray]): Reuse these instead of training
+        nlist (int): Cells to train (0 picks default_nlist(rows))
+        seed (int): Seed for sampling and initialization
+
+    Returns:
+        IVFLists: Fully packed lists
+    """
+    if centroids is None:
+        nlist = nlist or default_nlist(rows)
+        rng = np.random.default_rng(seed)
+        sample_size = min(rows, nlist * TRAIN_SAMPLES_PER_LIST)
+        sample = np.sort(rng.choice(rows, sample_size, replace=False))
+        samples = read_rows(sample if sample_size < rows else slice(0, rows))
+        started = time.perf_counter()
+        centroids = train_centroids(samples, nlist, seed=seed)
+        print(f"Trained {len(centroids)} IVF cells on {sample_size} vectors in {time.perf_counter() - started:.2f}s")
+    assignments = assign(read_rows, 0, rows, centroids)
+    return IVFLists(centroids, generation, assignments, rows)
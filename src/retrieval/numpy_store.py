@@ -0,0 +1,726 @@
+"""
+In-process vector store on memory-mapped NumPy arrays.
+
+For a corpus of up to a few hundred thousand chunks, exact search over a
+flat matrix is fast: top-k is one matrix-vector product plus argpartition,
+with no client, SQLite or HNSW layer in between. NumpyVectorStore keeps
+
+- the unit-normalized embeddings in a memory-mapped matrix, as float32 or
+  quantized to float16 or int8 (one float32 scale per row)
+- chunk IDs and texts as concatenated UTF-8 with end offsets
+- scalar metadata as one dictionary-encoded int32 column per key
+- a live flag per row, so deletes and re-upserts don't rewrite anything
+
+Writes append to the files of the current generation directory and then
+commit the new row count in state.json (written atomically); bytes past the
+committed sizes are cut off on open. When more than compact_ratio of the
+rows are dead, or the requested dtype changes, the live rows are rewritten
+into a new generation and state.json is switched over to it.
+
+With index="ivf", searches go through an inverted-file index (see
+src/retrieval/ivf.py) once the store holds ivf_min_rows live chunks. New
+rows are assigned to the existing cells as they are upserted; a background
+thread retrains the cells when the corpus has doubled since the last
+training and repacks them when the unsorted tail grows, then swaps the new
+lists in with one assignment, so searches never wait for it. Deleted rows
+stay in their cells as tombstones (the live flag is checked per candidate)
+until compaction renumbers the rows, which re-lists them under the same
+centroids. Until the first lists are ready, searches are exact.
+
+It implements the parts of the Chroma/LangChain vector store interface the
+agent uses (get, delete, add_documents, similarity_search_by_vector,
+as_retriever), plus upsert_embeddings for the ingestion writer and
+search_by_vectors for batched multi-query search.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from src.retrieval.ivf import IVFLists, assign, build_lists
+
+DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+# Quantized rows are converted to float32 in blocks this size (small enough to stay in cache)
+QUANTIZED_BLOCK_ROWS = 1024
+INDEX_TYPES = ("flat", "ivf")
+# The IVF cells are repacked once this share of the rows sits in the unsorted tail
+IVF_REPACK_TAIL_RATIO = 0.1
+
+
+def _value_key(value) -> Tuple[str, Any]:
+    # 1, 1.0, True and "1" are different metadata values
+    return type(value).__name__, value
+
+
+class _Snapshot:
+    """Committed arrays for lock-free readers; writers swap in a new one after each commit."""
+
+    def __init__(self, generation: str, rows: int, vectors, scales, live, ids, text_ends, texts, meta):
+        self.generation = generation
+        self.rows = rows
+        self.vectors = vectors
+        self.scales = scales
+        self.live = live
+        self.ids = ids  # Only ever appended to, so rows beyond self.rows don't matter
+        self.text_ends = text_ends
+        self.texts = texts
+        self.meta = meta
+
+    def read_rows(self, rows) -> np.ndarray:
+        """Rows selected by a slice or an array of row numbers, as float32."""
+        vectors = np.asarray(self.vectors[rows], dtype=np.float32)
+        if self.scales is not None:
+            vectors *= self.scales[rows][:, None]
+        return vectors
+
+
+class NumpyVectorStore(VectorStore):
+    """Cosine-similarity vector store on memory-mapped files, exact or with an IVF index."""
+
+    def __init__(
+        self,
+        path,
+        embedding_function: Optional[Embeddings] = None,
+        dtype: str = "float32",
+        compact_ratio: float = 0.25,
+        index: str = "flat",
+        nlist: int = 0,
+        nprobe: int = 16,
+        ivf_min_rows: int = 20000,
+    ):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported dtype {dtype!r}, expected one of {', '.join(DTYPES)}")
+        if index not in INDEX_TYPES:
+            raise ValueError(f"Unsupported index {index!r}, expected one of {', '.join(INDEX_TYPES)}")
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._embedding_function = embedding_function
+        self.compact_ratio = compact_ratio
+        self.index = index
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.ivf_min_rows = ivf_min_rows
+        self._lock = threading.RLock()
+        self._ivf: Optional[IVFLists] = None
+        self._trained_rows = 0
+        self._rebuild_thread: Optional[threading.Thread] = None
+        self.index_counters = {"retrains": 0, "repacks": 0, "ivf_searches": 0, "flat_searches": 0}
+        self._last_rebuild_s = 0.0
+        self._load(dtype)
+        if index == "ivf":
+            self._load_centroids()
+
+    # Files and state
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self._embedding_function
+
+    def _file(self, name: str) -> Path:
+        return self.path / self.state["generation"] / name
+
+    def _load(self, dtype: str):
+        state_path = self.path / "state.json"
+        if state_path.exists():
+            with open(state_path, "r", encoding="utf-8") as f:
+                self.state = json.load(f)
+        else:
+            self.state = {
+                "format": 1, "generation": "gen-000000", "dtype": dtype, "dim": None,
+                "rows": 0, "dead": 0, "metadata_keys": [], "metadata_values": {},
+            }
+        (self.path / self.state["generation"]).mkdir(exist_ok=True)
+        self._truncate_uncommitted()
+
+        self._value_codes = [
+            {_value_key(value): code for code, value in enumerate(self.state["metadata_values"][key])}
+            for key in self.state["metadata_keys"]
+        ]
+        rows = self.state["rows"]
+        self._ids = self._read_strings("ids", rows)
+        self._ids_end = sum(len(cid.encode("utf-8")) for cid in self._ids)
+        self._text_ends = np.fromfile(self._file("texts.ends"), dtype=np.int64, count=rows) if rows else np.zeros(0, np.int64)
+        self._row_by_id = {}
+        live = self._map("live.bin", np.uint8, (rows,), mode="r+")
+        for row, cid in enumerate(self._ids):
+            if live[row]:
+                if cid in self._row_by_id:
+                    # A re-upsert committed just before a crash, ahead of retiring the old row
+                    live[self._row_by_id[cid]] = 0
+                self._row_by_id[cid] = row
+        self._remap()
+
+        if self.state["dtype"] != dtype:
+            print(f"Converting vector index from {self.state['dtype']} to {dtype}")
+            self.compact(dtype)
+
+    def _expected_sizes(self) -> Dict[str, int]:
+        rows, dim = self.state["rows"], self.state["dim"] or 0
+        itemsize = np.dtype(DTYPES[self.state["dtype"]]).itemsize
+        sizes = {
+            "vectors.bin": rows * dim * itemsize,
+            "live.bin": rows,
+            "ids.ends": rows * 8,
+            "texts.ends": rows * 8,
+        }
+        if self.state["dtype"] == "int8":
+            sizes["scales.bin"] = rows * 4
+        for column in range(len(self.state["metadata_keys"])):
+            sizes[f"meta-{column}.bin"] = rows * 4
+        for name in ("ids", "texts"):
+            ends_path = self._file(f"{name}.ends")
+            sizes[f"{name}.bin"] = int(np.fromfile(ends_path, dtype=np.int64, count=rows)[-1]) if rows else 0
+        return sizes
+
+    def _truncate_uncommitted(self):
+        """Cut off bytes appended by a write that crashed before its commit."""
+        for name, size in self._expected_sizes().items():
+            file_path = self._file(name)
+            if not file_path.exists():
+                file_path.touch()
+            if file_path.stat().st_size > size:
+                with open(file_path, "r+b") as f:
+                    f.truncate(size)
+
+    def _map(self, name: str, dtype, shape, mode: str = "r"):
+        if not shape[0] or (len(shape) > 1 and not shape[1]):
+            return None
+        return np.memmap(self._file(name), dtype=dtype, mode=mode, shape=shape)
+
+    def _remap(self):
+        rows, dim = self.state["rows"], self.state["dim"]
+        vectors = self._map("vectors.bin", DTYPES[self.state["dtype"]], (rows, dim or 0))
+        scales = self._map("scales.bin", np.float32, (rows,)) if self.state["dtype"] == "int8" else None
+        # Deletes flip bytes in place, so the live flags are mapped writable
+        live = self._map("live.bin", np.uint8, (rows,), mode="r+")
+        meta = [self._map(f"meta-{column}.bin", np.int32, (rows,)) for column in range(len(self._value_codes))]
+        texts = self._map("texts.bin", np.uint8, (int(self._text_ends[-1]) if rows else 0,))
+        self._snapshot = _Snapshot(
+            self.state["generation"], rows, vectors, scales, live, self._ids, self._text_ends, texts, meta
+        )
+
+    def _read_strings(self, name: str, rows: int) -> List[str]:
+        if not rows:
+            return []
+        ends = np.fromfile(self._file(f"{name}.ends"), dtype=np.int64, count=rows)
+        data = self._file(f"{name}.bin").read_bytes()
+        starts = np.concatenate(([0], ends[:-1]))
+        return [data[start:end].decode("utf-8") for start, end in zip(starts, ends)]
+
+    def _commit(self):
+        state_path = self.path / "state.json"
+        tmp_path = state_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, state_path)
+
+    def __len__(self) -> int:
+        return len(self._row_by_id)
+
+    # Writes
+
+    def _encode_metadata(self, metadatas: Sequence[dict]) -> List[np.ndarray]:
+        """Dictionary codes per metadata column, adding new keys and values to the state."""
+        keys = self.state["metadata_keys"]
+        for metadata in metadatas:
+            for key, value in metadata.items():
+                if not isinstance(value, (str, int, float, bool)):
+                    continue
+                if key not in keys:
+                    keys.append(key)
+                    self.state["metadata_values"][key] = []
+                    self._value_codes.append({})
+                    # Earlier rows don't have the new key
+                    self._file(f"meta-{len(keys) - 1}.bin").write_bytes(
+                        np.full(self.state["rows"], -1, dtype=np.int32).tobytes()
+                    )
+                column = keys.index(key)
+                if _value_key(value) not in self._value_codes[column]:
+                    self._value_codes[column][_value_key(value)] = len(self.state["metadata_values"][key])
+                    self.state["metadata_values"][key].append(value)
+
+        columns = []
+        for column, key in enumerate(keys):
+            codes = self._value_codes[column]
+            columns.append(np.asarray(
+                [codes.get(_value_key(metadata[key]), -1) if key in metadata else -1 for metadata in metadatas],
+                dtype=np.int32,
+            ))
+        return columns
+
+    def _quantize(self, vectors: np.ndarray, dtype: str):
+        if dtype == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+        return vectors.astype(DTYPES[dtype]), None
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        matrix = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1.0, norms)
+
+    def _append(self, name: str, data: bytes):
+        # On disk before the commit that makes it visible
+        with open(self._file(name), "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _append_strings(self, name: str, values: Iterable[str], offset: int) -> np.ndarray:
+        encoded = [value.encode("utf-8") for value in values]
+        ends = offset + np.cumsum([len(value) for value in encoded], dtype=np.int64)
+        self._append(f"{name}.bin", b"".join(encoded))
+        self._append(f"{name}.ends", ends.tobytes())
+        return ends
+
+    def upsert_embeddings(
+        self,
+        ids: List[str],
+        embeddings: Sequence[Sequence[float]],
+        documents: List[str],
+        metadatas: Optional[List[dict]] = None,
+    ):
+        """
+        Insert or replace chunks with precomputed embeddings.
+
+        Args:
+            ids (List[str]): Chunk IDs; existing ones are replaced
+            embeddings (Sequence[Sequence[float]]): One vector per chunk
+            documents (List[str]): Chunk texts
+            metadatas (Optional[List[dict]]): Chunk metadata (scalar values only)
+        """
+        if not ids:
+            return
+        metadatas = metadatas or [{} for _ in ids]
+        # The last copy of an ID within one call wins, as with Chroma
+        last = {cid: i for i, cid in enumerate(ids)}
+        order = sorted(last.values())
+        ids = [ids[i] for i in order]
+        documents = [documents[i] for i in order]
+        metadatas = [metadatas[i] or {} for i in order]
+        vectors = self._normalize([embeddings[i] for i in order])
+
+        with self._lock:
+            if self.state["dim"] is None:
+                self.state["dim"] = int(vectors.shape[1])
+            elif vectors.shape[1] != self.state["dim"]:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the index ({self.state['dim']})")
+
+            replaced = [self._row_by_id[cid] for cid in ids if cid in self._row_by_id]
+            rows = self.state["rows"]
+            quantized, scales = self._quantize(vectors, self.state["dtype"])
+            self._append("vectors.bin", quantized.tobytes())
+            if scales is not None:
+                self._append("scales.bin", scales.tobytes())
+            self._append("live.bin", np.ones(len(ids), dtype=np.uint8).tobytes())
+            self._append_strings("ids", ids, self._ids_end)
+            text_ends = self._append_strings("texts", documents, int(self._text_ends[-1]) if rows else 0)
+            for column, codes in enumerate(self._encode_metadata(metadatas)):
+                self._append(f"meta-{column}.bin", codes.tobytes())
+
+            self.state["rows"] = rows + len(ids)
+            self.state["dead"] += len(replaced)
+            self._commit()
+
+            self._ids_end += sum(len(cid.encode("utf-8")) for cid in ids)
+            self._text_ends = np.concatenate((self._text_ends, text_ends))
+            self._ids.extend(ids)
+            self._remap()
+            if replaced:
+                self._snapshot.live[replaced] = 0
+                self._snapshot.live.flush()
+            for i, cid in enumerate(ids):
+                self._row_by_id[cid] = rows + i
+            self._update_index()
+            self._maybe_compact()
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        if self._embedding_function is None:
+            raise ValueError("NumpyVectorStore.add_texts needs an embedding function")
+        texts = list(texts)
+        if ids is None:
+            import uuid
+            ids = [str(uuid.uuid4()) for _ in texts]
+        self.upsert_embeddings(ids, self._embedding_function.embed_documents(texts), texts, metadatas)
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return True
+        with self._lock:
+            rows = [self._row_by_id.pop(cid) for cid in ids if cid in self._row_by_id]
+            if not rows:
+                return True
+            self._snapshot.live[rows] = 0
+            self._snapshot.live.flush()
+            self.state["dead"] += len(rows)
+            self._commit()
+            self._maybe_compact()
+        return True
+
+    def _maybe_compact(self):
+        if self.state["rows"] and self.state["dead"] / self.state["rows"] > self.compact_ratio:
+            self.compact()
+
+    def compact(self, dtype: Optional[str] = None):
+        """Rewrite the live rows into a new generation (optionally in another dtype)."""
+        with self._lock:
+            rows = sorted(self._row_by_id.values())
+            vectors = self._dequantize(np.asarray(rows, dtype=np.int64))
+            ids = [self._ids[row] for row in rows]
+            texts = [self._text(self._snapshot, row) for row in rows]
+            metadatas = [self._metadata(self._snapshot, row) for row in rows]
+
+            old_generation = self.state["generation"]
+            self.state = {
+                "format": 1,
+                "generation": f"gen-{int(old_generation.split('-')[1]) + 1:06d}",
+                "dtype": dtype or self.state["dtype"],
+                "dim": self.state["dim"],
+                "rows": 0, "dead": 0, "metadata_keys": [], "metadata_values": {},
+            }
+            (self.path / self.state["generation"]).mkdir(exist_ok=True)
+            self._truncate_uncommitted()
+            self._value_codes, self._ids, self._row_by_id, self._ids_end = [], [], {}, 0
+            self._text_ends = np.zeros(0, np.int64)
+            self._remap()
+            # The switch happens with the commit inside upsert_embeddings (or right here when empty)
+            if ids:
+                self.upsert_embeddings(ids, vectors, texts, metadatas)
+            else:
+                self._commit()
+                self._update_index()
+            shutil.rmtree(self.path / old_generation, ignore_errors=True)
+
+    # IVF index
+
+    def _load_centroids(self):
+        """List the rows under the centroids saved by the last training, in the background."""
+        centroids_path = self.path / "ivf.npz"
+        if not centroids_path.exists():
+            self._maybe_rebuild_index()
+            return
+        with np.load(centroids_path) as saved:
+            centroids, trained_rows = saved["centroids"], int(saved["trained_rows"])
+        if centroids.shape[1] != self.state["dim"] or (self.nlist and self.nlist != len(centroids)):
+            self._maybe_rebuild_index()  # Retrains
+            return
+        self._trained_rows = trained_rows
+        self._start_rebuild(centroids)
+
+    def _save_centroids(self, centroids: np.ndarray):
+        tmp_path = self.path / "ivf.tmp.npz"
+        np.savez(tmp_path, centroids=centroids, trained_rows=self._trained_rows)
+        os.replace(tmp_path, self.path / "ivf.npz")
+
+    def _update_index(self):
+        """List the newly committed rows under the current centroids (called with the lock held)."""
+        if self.index != "ivf":
+            return
+        snapshot, ivf = self._snapshot, self._ivf
+        if ivf is not None and ivf.generation != snapshot.generation:
+            # Compaction renumbered the rows; list them again under the same centroids
+            ivf = build_lists(snapshot.read_rows, snapshot.rows, snapshot.generation, ivf.centroids) if snapshot.rows else None
+        elif ivf is not None and ivf.rows < snapshot.rows:
+            ivf = ivf.extend(assign(snapshot.read_rows, ivf.rows, snapshot.rows, ivf.centroids))
+        self._ivf = ivf
+        self._maybe_rebuild_index()
+
+    def _maybe_rebuild_index(self):
+        if self._rebuild_thread is not None:
+            return
+        live, ivf = len(self._row_by_id), self._ivf
+        if live >= self.ivf_min_rows and (ivf is None or live > 2 * self._trained_rows):
+            self._start_rebuild(None)
+        elif ivf is not None and ivf.tail > IVF_REPACK_TAIL_RATIO * ivf.rows:
+            self._start_rebuild(ivf.centroids)
+
+    def _start_rebuild(self, centroids: Optional[np.ndarray]):
+        self._rebuild_thread = threading.Thread(
+            target=self._rebuild_index, args=(centroids,), name="ivf-rebuild", daemon=True
+        )
+        self._rebuild_thread.start()
+
+    def _rebuild_index(self, centroids: Optional[np.ndarray]):
+        """
+        Build packed IVF lists off the lock and swap them in.
+
+        Args:
+            centroids (Optional[np.ndarray]): Repack under these; None retrains
+        """
+        try:
+            started = time.perf_counter()
+            snapshot = self._snapshot
+            if not snapshot.rows:
+                return
+            lists = build_lists(snapshot.read_rows, snapshot.rows, snapshot.generation, centroids, self.nlist)
+            with self._lock:
+                current = self._snapshot
+                if current.generation != lists.generation:
+                    # Compacted in the meantime, and already re-listed under the old centroids
+                    return
+                if current.rows > lists.rows:
+                    # Rows upserted while the lists were being built
+                    lists = lists.extend(assign(current.read_rows, lists.rows, current.rows, lists.centroids))
+                self._ivf = lists
+                if centroids is None:
+                    self._trained_rows = snapshot.rows
+                    self._save_centroids(lists.centroids)
+                    self.index_counters["retrains"] += 1
+                else:
+                    self.index_counters["repacks"] += 1
+                self._last_rebuild_s = time.perf_counter() - started
+        except Exception as e:
+            print(f"IVF index rebuild failed, searches stay on the previous index: {e}")
+        finally:
+            with self._lock:
+                self._rebuild_thread = None
+                # Writes during the rebuild may have earned another one
+                self._maybe_rebuild_index()
+
+    def wait_for_index(self):
+        """Wait until no background rebuild is running (e.g. before a script exits)."""
+        while True:
+            thread = self._rebuild_thread
+            if thread is None:
+                return
+            thread.join()
+
+    def index_stats(self) -> dict:
+        ivf = self._ivf
+        return {
+            "index": self.index,
+            "nlist": ivf.nlist if ivf else 0,
+            "nprobe": self.nprobe,
+            "rows": self._snapshot.rows,
+            "dead_rows": self.state["dead"],
+            "unpacked_rows": ivf.tail if ivf else 0,
+            "trained_rows": self._trained_rows,
+            "rebuilding": self._rebuild_thread is not None,
+            "last_rebuild_s": self._last_rebuild_s,
+            **self.index_counters,
+        }
+
+    # Reads
+
+    def _dequantize(self, rows: np.ndarray) -> np.ndarray:
+        snapshot = self._snapshot
+        if snapshot.vectors is None or not len(rows):
+            return np.zeros((len(rows), self.state["dim"] or 0), dtype=np.float32)
+        return snapshot.read_rows(rows)
+
+    @staticmethod
+    def _text(snapshot: _Snapshot, row: int) -> str:
+        if snapshot.texts is None:
+            return ""
+        start = int(snapshot.text_ends[row - 1]) if row else 0
+        return bytes(snapshot.texts[start:int(snapshot.text_ends[row])]).decode("utf-8")
+
+    def _metadata(self, snapshot: _Snapshot, row: int) -> dict:
+        metadata = {}
+        # Keys and values are only ever appended, so the current lists cover older snapshots
+        for key, codes in zip(self.state["metadata_keys"], snapshot.meta):
+            code = int(codes[row]) if codes is not None else -1
+            if code >= 0:
+                metadata[key] = self.state["metadata_values"][key][code]
+        return metadata
+
+    def _document(self, snapshot: _Snapshot, row: int) -> Document:
+        return Document(id=snapshot.ids[row], page_content=self._text(snapshot, row), metadata=self._metadata(snapshot, row))
+
+    def get(self, ids: Optional[List[str]] = None, include: Optional[List[str]] = None, **kwargs: Any) -> dict:
+        """
+        Chunks by ID (all when ids is None), in Chroma's get() result format.
+
+        Args:
+            ids (Optional[List[str]]): IDs to fetch; unknown IDs are skipped
+            include (Optional[List[str]]): Any of "documents", "metadatas",
+                "embeddings" (default: documents and metadatas)
+
+        Returns:
+            dict: "ids" plus the included fields, in the same order
+        """
+        include = ["documents", "metadatas"] if include is None else include
+        with self._lock:
+            if ids is None:
+                rows = sorted(self._row_by_id.values())
+            else:
+                rows = [self._row_by_id[cid] for cid in ids if cid in self._row_by_id]
+            snapshot = self._snapshot
+            result = {"ids": [snapshot.ids[row] for row in rows]}
+            if "documents" in include:
+                result["documents"] = [self._text(snapshot, row) for row in rows]
+            if "metadatas" in include:
+                result["metadatas"] = [self._metadata(snapshot, row) for row in rows]
+            if "embeddings" in include:
+                result["embeddings"] = self._dequantize(np.asarray(rows, dtype=np.int64))
+        return result
+
+    def get_by_ids(self, ids: Sequence[str], /) -> List[Document]:
+        with self._lock:
+            return [self._document(self._snapshot, self._row_by_id[cid]) for cid in ids if cid in self._row_by_id]
+
+    def _search(
+        self,
+        snapshot: _Snapshot,
+        vectors,
+        k: int,
+        nprobe: Optional[int] = None,
+        ids: Optional[Iterable[str]] = None,
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Top-k rows for a batch of query vectors.
+
+        Args:
+            vectors: Query embeddings, one per row
+            k (int): Results per query
+            nprobe (Optional[int]): IVF cells visited per query (default: self.nprobe)
+            ids (Optional[Iterable[str]]): Only score these chunks (exactly)
+
+        Returns:
+            List[List[Tuple[int, float]]]: (row, cosine similarity) pairs per
+                query, best first
+        """
+        queries = self._normalize(vectors)
+        if snapshot.vectors is None or k <= 0:
+            return [[] for _ in range(len(queries))]
+        if ids is not None:
+            row_by_id = self._row_by_id
+            rows = np.fromiter((row_by_id.get(cid, -1) for cid in ids), dtype=np.int64)
+            # Rows committed after this snapshot was taken are left out, like in an unfiltered search
+            rows = np.sort(rows[(rows >= 0) & (rows < snapshot.rows)])
+            return [self._top_rows(snapshot, rows, query, k) for query in queries]
+        ivf = self._ivf
+        if ivf is not None and ivf.generation == snapshot.generation:
+            self.index_counters["ivf_searches"] += len(queries)
+            return [self._search_ivf(snapshot, ivf, query, k, nprobe or self.nprobe) for query in queries]
+        self.index_counters["flat_searches"] += len(queries)
+        return self._search_flat(snapshot, queries, k)
+
+    @staticmethod
+    def _search_ivf(snapshot: _Snapshot, ivf: IVFLists, query: np.ndarray, k: int, nprobe: int) -> List[Tuple[int, float]]:
+        """Top-k among the rows listed in the query's nprobe nearest cells."""
+        rows = ivf.candidates(query, nprobe, limit=snapshot.rows)
+        if ivf.rows < snapshot.rows:
+            # Committed after this version of the lists was published
+            rows = np.concatenate((rows, np.arange(ivf.rows, snapshot.rows)))
+        # Sorted rows read the memory map front to back
+        return NumpyVectorStore._top_rows(snapshot, np.sort(rows), query, k)
+
+    @staticmethod
+    def _top_rows(snapshot: _Snapshot, rows: np.ndarray, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """Exact top-k among the given (sorted) rows, skipping deleted ones."""
+        rows = rows[snapshot.live[rows] != 0]
+        if not len(rows):
+            return []
+        scores = snapshot.read_rows(rows) @ query
+        k = min(k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(rows[i]), float(scores[i])) for i in top]
+
+    @staticmethod
+    def _search_flat(snapshot: _Snapshot, queries: np.ndarray, k: int) -> List[List[Tuple[int, float]]]:
+        """
+        Exact top-k rows for a batch of normalized query vectors.
+
+        Every block of stored rows is scored against all queries with one
+        matrix product, so a batch costs little more than a single query.
+        """
+        # float32 rows are multiplied straight from the memory map, in one product
+        block_rows = snapshot.rows if snapshot.vectors.dtype == np.float32 else QUANTIZED_BLOCK_ROWS
+        scores = np.empty((len(queries), snapshot.rows), dtype=np.float32)
+        for start in range(0, snapshot.rows, block_rows):
+            block = np.asarray(snapshot.vectors[start:start + block_rows], dtype=np.float32)
+            block_scores = queries @ block.T
+            if snapshot.scales is not None:
+                block_scores *= snapshot.scales[start:start + block_rows]
+            scores[:, start:start + len(block)] = block_scores
+        scores[:, snapshot.live[:snapshot.rows] == 0] = -np.inf
+
+        k = min(k, snapshot.rows)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for query_scores, candidates in zip(scores, top):
+            ranked = candidates[np.argsort(-query_scores[candidates], kind="stable")]
+            results.append([(int(row), float(query_scores[row])) for row in ranked if np.isfinite(query_scores[row])])
+        return results
+
+    def search_by_vectors(
+        self,
+        embeddings,
+        k: int = 5,
+        nprobe: Optional[int] = None,
+        ids: Optional[Iterable[str]] = None,
+    ) -> List[List[Tuple[Document, float]]]:
+        """
+        Batched search: (document, cosine similarity) pairs per query vector, best first.
+
+        ids restricts the search to those chunks (as Chroma's query(ids=...)
+        does); they are scored exactly, without the IVF index.
+        """
+        # Searches read one committed snapshot and never wait for writers
+        snapshot = self._snapshot
+        return [
+            [(self._document(snapshot, row), score) for row, score in hits]
+            for hits in self._search(snapshot, embeddings, k, nprobe, ids)
+        ]
+
+    def similarity_search_by_vectors(self, embeddings, k: int = 5, **kwargs: Any) -> List[List[Document]]:
+        """Batched similarity_search_by_vector: one list of documents per query vector."""
+        return [[doc for doc, _ in hits] for hits in self.search_by_vectors(embeddings, k, **kwargs)]
+
+    def similarity_search_by_vector_with_score(
+        self, embedding: List[float], k: int = 5, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self.search_by_vectors([embedding], k, **kwargs)[0]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 5, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, **kwargs)]
+
+    # kwargs are search_by_vectors' nprobe and ids; anything else (e.g. a Chroma filter) raises TypeError
+    def similarity_search_with_score(self, query: str, k: int = 5, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self._embedding_function.embed_query(query), k, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 5, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        # Scores already are cosine similarities
+        return lambda score: score
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        path=None,
+        dtype: str = "float32",
+        **kwargs: Any,
+    ) -> "NumpyVectorStore":
+        if path is None:
+            raise ValueError("NumpyVectorStore.from_texts needs a path")
+        store = cls(path, embedding_function=embedding, dtype=dtype)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
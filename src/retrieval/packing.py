@@ -0,0 +1,163 @@
+"""
+Token-budgeted context packing for retriever_tool output.
+
+Retrieved chunks are 1000 characters with 200 characters of overlap, so two
+neighbouring hits repeat a fifth of their text, and every extra retrieval
+turn re-sends all earlier tool results to the LLM. The packer:
+
+- drops chunks that an earlier tool call in the conversation already returned
+- merges chunks from the same source and page that overlap or touch, cutting
+  the duplicated span (by start_index offsets, or by matching text when a
+  chunk was ingested without offsets)
+- adds passages best-first until the token budget is reached, truncating the
+  last one at a word boundary
+"""
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+# ~4 characters per token is close enough for budgeting (same as the ingest writer)
+CHARS_PER_TOKEN = 4
+
+# Shortest suffix/prefix match treated as chunk overlap when offsets are missing
+MIN_TEXT_OVERLAP = 20
+
+# Don't bother appending a truncated passage shorter than this
+MIN_PASSAGE_TOKENS = 40
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _text_overlap(left: str, right: str, max_overlap: int) -> int:
+    """Length of the longest suffix of left that is a prefix of right."""
+    for size in range(min(len(left), len(right), max_overlap), MIN_TEXT_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def merge_chunks(docs: List[Document], max_overlap: int = 400) -> List[Dict]:
+    """
+    Merge overlapping and adjacent chunks of the same source page.
+
+    Args:
+        docs (List[Document]): Retrieved chunks, best first
+        max_overlap (int): Longest overlap searched for when chunks have no offsets
+
+    Returns:
+        List[Dict]: Passages ({"source", "page", "text", "ids", "rank"}), best first,
+            where rank is the best retrieval rank among the merged chunks
+    """
+    groups: Dict[Tuple, List[Tuple[int, Document]]] = {}
+    for rank, doc in enumerate(docs):
+        key = (doc.metadata.get("source"), doc.metadata.get("page"))
+        groups.setdefault(key, []).append((rank, doc))
+
+    passages = []
+    for (source, page), members in groups.items():
+        with_offsets = all(isinstance(doc.metadata.get("start_index"), int) for _, doc in members)
+        if with_offsets:
+            members.sort(key=lambda member: member[1].metadata["start_index"])
+
+        current: Optional[Dict] = None
+        for rank, doc in members:
+            text = doc.page_content
+            start = doc.metadata.get("start_index") if with_offsets else None
+            if current is not None:
+                if with_offsets:
+                    overlap = current["end"] - start
+                    adjacent = overlap >= 0
+                else:
+                    overlap = _text_overlap(current["text"], text, max_overlap)
+                    if not overlap:
+                        # Without offsets retrieval order is all we have, so also try it as the predecessor
+                        preceding = _text_overlap(text, current["text"], max_overlap)
+                        if preceding:
+                            current["text"] = text + current["text"][preceding:]
+                            overlap = len(text)
+                    adjacent = overlap > 0
+                if adjacent:
+                    current["text"] += text[min(overlap, len(text)):]
+                    current["end"] = max(current["end"], start + len(text)) if with_offsets else None
+                    current["ids"].append(doc.id)
+                    current["rank"] = min(current["rank"], rank)
+                    continue
+                passages.append(current)
+            current = {
+                "source": source,
+                "page": page,
+                "text": text,
+                "ids": [doc.id],
+                "rank": rank,
+                "end": start + len(text) if with_offsets else None,
+            }
+        if current is not None:
+            passages.append(current)
+
+    passages.sort(key=lambda passage: passage["rank"])
+    for passage in passages:
+        del passage["end"]
+    return passages
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    cut = text[:max_chars]
+    space = cut.rfind(" ")
+    if space > max_chars // 2:
+        cut = cut[:space]
+    return cut.rstrip() + " ..."
+
+
+def _header(index: int, passage: Dict) -> str:
+    details = []
+    if passage["source"]:
+        details.append(str(passage["source"]).replace("\\", "/").rsplit("/", 1)[-1])
+    if isinstance(passage["page"], int):
+        details.append(f"page {passage['page'] + 1}")  # PyPDFLoader pages are 0-based
+    suffix = f" ({', '.join(details)})" if details else ""
+    return f"Document {index}{suffix}:\n"
+
+
+def pack_context(
+    docs: List[Document],
+    token_budget: int,
+    exclude_ids: Iterable[str] = (),
+) -> Tuple[List[str], List[Dict]]:
+    """
+    Select, merge and truncate retrieved chunks to fit a token budget.
+
+    Args:
+        docs (List[Document]): Retrieved chunks, best first
+        token_budget (int): Max estimated tokens of the packed text
+        exclude_ids (Iterable[str]): Chunks already sent earlier in the conversation
+
+    Returns:
+        Tuple[List[str], List[Dict]]: IDs of the chunks included in full and
+            the passages to render, each with a "text" fitted to the budget
+    """
+    excluded = set(exclude_ids)
+    fresh = [doc for doc in docs if doc.id is None or doc.id not in excluded]
+
+    packed, included_ids = [], []
+    remaining = token_budget
+    for passage in merge_chunks(fresh):
+        header_tokens = estimate_tokens(_header(len(packed) + 1, passage))
+        text_tokens = estimate_tokens(passage["text"])
+        if header_tokens + text_tokens <= remaining:
+            # Only passages sent in full count as delivered; a cut one may be retrieved again
+            included_ids.extend(cid for cid in passage["ids"] if cid)
+        elif remaining - header_tokens >= MIN_PASSAGE_TOKENS:
+            passage["text"] = _truncate(passage["text"], (remaining - header_tokens) * CHARS_PER_TOKEN)
+        else:
+            break
+        packed.append(passage)
+        remaining -= header_tokens + estimate_tokens(passage["text"])
+    return included_ids, packed
+
+
+def render_passages(passages: List[Dict]) -> str:
+    """Render packed passages as the tool's text output."""
+    return "\n\n".join(_header(i, passage) + passage["text"] for i, passage in enumerate(passages, start=1))
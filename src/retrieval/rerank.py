@@ -0,0 +1,185 @@
+"""
+Candidate-pool reranking.
+
+The first-stage retriever over-fetches (e.g. 30 chunks) and this stage keeps
+the best k. Each candidate is scored by a blend of dense cosine similarity
+(query vector against the chunk vectors stored in Chroma) and a BM25-style
+lexical score over the query terms. Scoring runs as NumPy matrix operations
+over the whole pool at once, so its cost is a few milliseconds on CPU and
+does not grow with one model call per document, unlike a cross-encoder.
+"""
+import asyncio
+import threading
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from src.retrieval.bm25 import tokenize
+
+
+def _min_max(values: np.ndarray) -> np.ndarray:
+    spread = values.max() - values.min()
+    if spread <= 0:
+        return np.zeros_like(values)
+    return (values - values.min()) / spread
+
+
+def score_candidates(
+    query_vector: np.ndarray,
+    candidate_vectors: np.ndarray,
+    term_counts: np.ndarray,
+    doc_lengths: np.ndarray,
+    dense_weight: float = 0.5,
+    k1: float = 1.5,
+    b: float = 0.75,
+) -> np.ndarray:
+    """
+    Score a candidate pool in one batch.
+
+    Args:
+        query_vector (np.ndarray): Query embedding, shape (dim,)
+        candidate_vectors (np.ndarray): Chunk embeddings, shape (n, dim)
+        term_counts (np.ndarray): Query term frequencies per chunk, shape (n, terms)
+        doc_lengths (np.ndarray): Chunk lengths in terms, shape (n,)
+        dense_weight (float): Weight of the dense score; the lexical score gets the rest
+        k1 (float): BM25 term frequency saturation
+        b (float): BM25 length normalization
+
+    Returns:
+        np.ndarray: Scores in [0, 1], shape (n,)
+    """
+    norms = np.linalg.norm(candidate_vectors, axis=1) * (np.linalg.norm(query_vector) or 1.0)
+    dense = candidate_vectors @ query_vector / np.where(norms == 0, 1.0, norms)
+
+    n = len(doc_lengths)
+    lexical = np.zeros(n, dtype=np.float32)
+    if term_counts.size:
+        df = (term_counts > 0).sum(axis=0)
+        idf = np.log1p((n - df + 0.5) / (df + 0.5))
+        length_norm = k1 * (1 - b + b * doc_lengths / max(doc_lengths.mean(), 1.0))
+        lexical = (idf * term_counts * (k1 + 1) / (term_counts + length_norm[:, None])).sum(axis=1)
+
+    return dense_weight * _min_max(dense) + (1 - dense_weight) * _min_max(lexical)
+
+
+class RerankStats:
+    """Per-request reranking cost, kept for /metrics."""
+
+    def __init__(self, window: int = 1024):
+        self.window = window
+        self._lock = threading.Lock()
+        self._durations: List[float] = []
+        self.requests = 0
+        self.candidates = 0
+
+    def record(self, seconds: float, candidates: int):
+        with self._lock:
+            self.requests += 1
+            self.candidates += candidates
+            self._durations.append(seconds)
+            if len(self._durations) > self.window:
+                del self._durations[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            durations = sorted(self._durations)
+            if not durations:
+                return {"requests": 0}
+            return {
+                "requests": self.requests,
+                "avg_candidates": self.candidates / self.requests,
+                "p50_ms": durations[len(durations) // 2] * 1000,
+                "p99_ms": durations[min(len(durations) - 1, int(len(durations) * 0.99))] * 1000,
+                "last_ms": self._durations[-1] * 1000,
+            }
+
+
+class RerankingRetriever(BaseRetriever):
+    """
+    Over-fetch from a first-stage retriever, rerank the pool, return the top k.
+
+    candidate_retriever should return the pool (e.g. 30 chunks). The query
+    vector comes from the retrieval cache when one is configured, so the
+    first stage and the reranker share a single embeddings call.
+    """
+
+    candidate_retriever: Any
+    vectorstore: Any
+    embeddings: Any
+    cache: Any = None
+    lexical_index: Any = None
+    k: int = 5
+    dense_weight: float = 0.5
+    stats: Any = None
+
+    def _embed(self, query: str) -> List[float]:
+        if self.cache is not None:
+            return self.cache.embed_query(self.embeddings, query)
+        return self.embeddings.embed_query(query)
+
+    async def _aembed(self, query: str) -> List[float]:
+        if self.cache is not None:
+            return await self.cache.aembed_query(self.embeddings, query)
+        return await self.embeddings.aembed_query(query)
+
+    def _term_counts(self, ids: List[str], texts: List[str], terms: List[str]):
+        counts = np.zeros((len(ids), len(terms)), dtype=np.float32)
+        lengths = np.zeros(len(ids), dtype=np.float32)
+        doc_terms: Dict[str, Dict[str, int]] = self.lexical_index.doc_terms if self.lexical_index else {}
+        for row, (cid, text) in enumerate(zip(ids, texts)):
+            # Reuse the counts tokenized at ingestion time when the BM25 index has them
+            tf = doc_terms.get(cid)
+            if tf is None:
+                tf = {}
+                for term in tokenize(text):
+                    tf[term] = tf.get(term, 0) + 1
+            counts[row] = [tf.get(term, 0) for term in terms]
+            lengths[row] = sum(tf.values())
+        return counts, lengths
+
+    def _rerank(self, query: str, query_vector: List[float], candidates: List[Document]) -> List[Document]:
+        if len(candidates) <= 1:
+            return candidates[:self.k]
+        started = time.perf_counter()
+
+        ids = [doc.id for doc in candidates]
+        found = self.vectorstore.get(ids=ids, include=["embeddings"])
+        vector_by_id = dict(zip(found["ids"], found["embeddings"]))
+        # Without stored vectors for every candidate there is nothing to rerank against
+        if any(cid not in vector_by_id for cid in ids):
+            return candidates[:self.k]
+
+        terms = sorted(set(tokenize(query)))
+        counts, lengths = self._term_counts(ids, [doc.page_content for doc in candidates], terms)
+        scores = score_candidates(
+            np.asarray(query_vector, dtype=np.float32),
+            np.asarray([vector_by_id[cid] for cid in ids], dtype=np.float32),
+            counts,
+            lengths,
+            dense_weight=self.dense_weight,
+        )
+        # Stable sort keeps first-stage order between equal scores
+        order = np.argsort(-scores, kind="stable")[:self.k]
+
+        elapsed = time.perf_counter() - started
+        if self.stats is not None:
+            self.stats.record(elapsed, len(candidates))
+        print(f"Reranked {len(candidates)} candidates in {elapsed * 1000:.1f} ms")
+        return [candidates[i] for i in order]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun, chunk_filter=None
+    ) -> List[Document]:
+        candidates = self.candidate_retriever.invoke(query, chunk_filter=chunk_filter)
+        return self._rerank(query, self._embed(query), candidates)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun, chunk_filter=None
+    ) -> List[Document]:
+        candidates = await self.candidate_retriever.ainvoke(query, chunk_filter=chunk_filter)
+        query_vector = await self._aembed(query)
+        return await asyncio.to_thread(self._rerank, query, query_vector, candidates)
@@ -0,0 +1,69 @@
+"""
+Vector store backend selection (VECTOR_STORE_BACKEND).
+
+Each backend keeps its own ingestion manifest and checkpoint, since the
+manifest records which chunks are stored in that particular store; switching
+backends re-ingests into the new one instead of trusting the other's manifest.
+"""
+from pathlib import Path
+from typing import Tuple
+
+VECTOR_STORE_BACKENDS = ("chroma", "numpy")
+
+
+def open_vectorstore(settings, embeddings):
+    """
+    Open (or create) the configured vector store.
+
+    Args:
+        settings: Settings module or namespace
+        embeddings: Embedding function used for text queries and add_documents
+
+    Returns:
+        Chroma or NumpyVectorStore: The vector store
+    """
+    backend = settings.VECTOR_STORE_BACKEND
+    if backend == "chroma":
+        from langchain_chroma import Chroma
+
+        Path(settings.VECTORSTORE_DIR).mkdir(parents=True, exist_ok=True)
+        return Chroma(
+            collection_name=settings.COLLECTION_NAME,
+            embedding_function=embeddings,
+            persist_directory=str(settings.VECTORSTORE_DIR),
+        )
+    if backend == "numpy":
+        from src.retrieval.numpy_store import NumpyVectorStore
+
+        return NumpyVectorStore(
+            Path(settings.NUMPY_INDEX_DIR) / settings.COLLECTION_NAME,
+            embedding_function=embeddings,
+            dtype=settings.NUMPY_INDEX_DTYPE,
+            index=settings.NUMPY_INDEX_TYPE,
+            nlist=settings.IVF_NLIST,
+            nprobe=settings.IVF_NPROBE,
+            ivf_min_rows=settings.IVF_MIN_ROWS,
+        )
+    raise ValueError(f"Unknown VECTOR_STORE_BACKEND {backend!r}, expected one of {', '.join(VECTOR_STORE_BACKENDS)}")
+
+
+def close_vectorstore(vectorstore):
+    """Release a vector store's memory and file handles (an evicted collection)."""
+    if hasattr(vectorstore, "wait_for_index"):
+        # Let a background IVF rebuild finish instead of leaving it writing to a closed store
+        vectorstore.wait_for_index()
+    client = getattr(vectorstore, "_client", None)
+    if client is not None and hasattr(client, "close"):
+        # Chroma keeps one system (SQLite connections, loaded HNSW segments) per directory
+        client.close()
+
+
+def ingestion_paths(settings) -> Tuple[Path, Path]:
+    """Ingestion manifest and checkpoint paths of the configured backend."""
+    if settings.VECTOR_STORE_BACKEND == "numpy":
+        index_dir = Path(settings.NUMPY_INDEX_DIR)
+        return (
+            index_dir / settings.INGESTION_MANIFEST_PATH.name,
+            index_dir / settings.INGEST_CHECKPOINT_PATH.name,
+        )
+    return settings.INGESTION_MANIFEST_PATH, settings.INGEST_CHECKPOINT_PATH
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Burst behaviour of the API with and without admission control.
+
+Serves the FastAPI app against the local fake OpenAI server, which answers
+chat requests beyond --provider-concurrency in flight with a 429 (like a
+provider's concurrency limit). One greedy client fires --greedy /query
+requests at once, a few light clients fire --light each right after it.
+Without admission control (unbounded concurrency) they all hit the provider
+together; with it at most --max-concurrency agent runs are in flight and
+slots go round-robin across clients.
+
+Usage:
+    python src/scripts/bench_admission.py --latency 0.5 --provider-concurrency 8 --max-concurrency 8
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.scripts.fake_openai_server import start_in_thread
+
+
+async def fire(client, url: str, client_id: str, question: str):
+    import httpx
+
+    started = time.perf_counter()
+    try:
+        response = await client.post(url, json={"question": question}, headers={"X-Client-ID": client_id})
+    except httpx.HTTPError:
+        return client_id, "error", time.perf_counter() - started
+    if response.status_code != 200:
+        outcome = str(response.status_code)
+    else:
+        outcome = "ok" if response.json()["success"] else "failed"
+    return client_id, outcome, time.perf_counter() - started
+
+
+async def burst(url: str, greedy: int, light_clients: int, light: int, label: str):
+    import httpx
+
+    async with httpx.AsyncClient(timeout=120, limits=httpx.Limits(max_connections=None)) as client:
+        tasks = [
+            asyncio.create_task(fire(client, url, "greedy", f"How did the S&P 500 do in 2024? ({label} greedy #{i})"))
+            for i in range(greedy)
+        ]
+        await asyncio.sleep(0.05)  # The greedy client's requests get in first
+        tasks += [
+            asyncio.create_task(fire(client, url, f"light-{c}", f"How did NVDA do in 2024? ({label} light-{c} #{i})"))
+            for c in range(light_clients)
+            for i in range(light)
+        ]
+        return await asyncio.gather(*tasks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark API admission control under a burst")
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake server latency per call (s)")
+    parser.add_argument("--provider-concurrency", type=int, default=8, help="Chat calls in flight before 429s")
+    parser.add_argument("--max-concurrency", type=int, default=8, help="Admission limit on agent runs")
+    parser.add_argument("--max-queue", type=int, default=64)
+    parser.add_argument("--greedy", type=int, default=48, help="Requests from the greedy client")
+    parser.add_argument("--light-clients", type=int, default=3)
+    parser.add_argument("--light", type=int, default=4, help="Requests per light client")
+    parser.add_argument("--port", type=int, default=8774)
+    parser.add_argument("--api-port", type=int, default=8775)
+    args = parser.parse_args()
+
+    fake = start_in_thread(port=args.port, latency=args.latency, max_concurrent_chat=args.provider_concurrency)
+    fake_stats = fake.config.app.state.requests
+    os.environ["OPENAI_API_KEY"] = "sk-fake"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+
+    import uvicorn
+    import src.agents.rag_agent as rag_agent_module
+    from src.backend.api import main as api
+    from src.backend.api.admission import AdmissionController
+    from src.config.settings import with_overrides
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="rag-admission-") as tmp:
+        settings = with_overrides(VECTORSTORE_DIR=Path(tmp), EMBEDDING_CHECK_CTX_LENGTH=False)
+        # The app's lifespan picks up this agent instead of building the default one
+        rag_agent_module._agent = rag_agent_module.build_rag_agent(settings)
+        server = uvicorn.Server(uvicorn.Config(api.app, host="127.0.0.1", port=args.api_port, log_level="warning"))
+        threading.Thread(target=server.run, daemon=True).start()
+        while not server.started:
+            time.sleep(0.01)
+
+        url = f"http://127.0.0.1:{args.api_port}/query"
+        for label, max_concurrency in (("unbounded", 10 ** 6), ("admission", args.max_concurrency)):
+            api.admission = AdmissionController(
+                max_concurrency=max_concurrency,
+                max_queue=args.max_queue,
+                max_queued_per_client=args.max_queue,
+                queue_timeout=60.0,
+            )
+            limited_before = fake_stats["rate_limited"]
+            started = time.perf_counter()
+            rows = asyncio.run(burst(url, args.greedy, args.light_clients, args.light, label))
+            results[label] = (
+                rows, time.perf_counter() - started, fake_stats["rate_limited"] - limited_before, api.admission.stats()
+            )
+        server.should_exit = True
+
+    total = args.greedy + args.light_clients * args.light
+    print(f"\n{total} concurrent /query requests ({args.greedy} from one client, {args.light_clients} x {args.light} "
+          f"from others), provider allows {args.provider_concurrency} chat calls in flight")
+    print(f"{'mode':<11}{'ok':>5}{'failed':>8}{'provider 429s':>15}{'light p50 (s)':>15}{'greedy p50 (s)':>16}"
+          f"{'wall (s)':>10}")
+    for label, (rows, wall, provider_429s, _) in results.items():
+        outcomes = Counter(row[1] for row in rows)
+        light = [row[2] for row in rows if row[0] != "greedy" and row[1] == "ok"]
+        greedy = [row[2] for row in rows if row[0] == "greedy" and row[1] == "ok"]
+        light_p50 = f"{statistics.median(light):.2f}" if light else "-"
+        greedy_p50 = f"{statistics.median(greedy):.2f}" if greedy else "-"
+        print(
+            f"{label:<11}{outcomes['ok']:>5}{total - outcomes['ok']:>8}{provider_429s:>15}"
+            f"{light_p50:>15}{greedy_p50:>16}{wall:>10.2f}"
+        )
+    stats = results["admission"][3]
+    print(f"\nAdmission: max queue depth {stats['max_queue_depth']}, "
+          f"wait p50 {stats['wait_ms_p50']:.0f} ms, p95 {stats['wait_ms_p95']:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Recall and latency of the NumPy store's IVF index against exact search.
+
+Builds an index="ivf" NumpyVectorStore incrementally from a clustered
+synthetic corpus (the same data as bench_vector_store.py), in ingestion-sized
+batches, and reports for each (nlist, nprobe) configuration:
+
+- recall@5 against exact brute-force top-5
+- p50/p99 single-query latency, and the share of rows scanned
+- the same for the exact flat scan, for reference
+
+It then measures query latency while a retraining runs in the background
+(searches keep using the old lists until the swap), and recall after
+deleting 10% of the chunks (tombstoned rows must never be returned).
+
+Usage:
+    python src/scripts/bench_ann_index.py --chunks 200000 --dim 384
+    python src/scripts/bench_ann_index.py --nlist 0 1024 --nprobe 4 8 16 32 64
+"""
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.retrieval.numpy_store import NumpyVectorStore
+from src.scripts.bench_vector_store import K, make_data
+
+BATCH = 5000
+
+
+def measure(store: NumpyVectorStore, queries: np.ndarray, truth: np.ndarray, nprobe=None) -> dict:
+    latencies, hits = [], 0
+    for vector, expected in zip(queries, truth):
+        started = time.perf_counter()
+        found = store.search_by_vectors([vector], k=K, nprobe=nprobe)[0]
+        latencies.append(time.perf_counter() - started)
+        hits += len({int(doc.id.split("-")[1]) for doc, _ in found} & set(expected.tolist()))
+    latencies.sort()
+    return {
+        "recall": hits / (K * len(queries)),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)] * 1000,
+    }
+
+
+def scanned_share(store: NumpyVectorStore, queries: np.ndarray, nprobe: int) -> float:
+    ivf = store._ivf
+    return float(np.mean([len(ivf.candidates(query, nprobe)) for query in queries])) / ivf.rows
+
+
+def build(path: Path, corpus: np.ndarray, nlist: int, dtype: str) -> NumpyVectorStore:
+    store = NumpyVectorStore(path, dtype=dtype, index="ivf", nlist=nlist, ivf_min_rows=BATCH)
+    for start in range(0, len(corpus), BATCH):
+        ids = [f"chunk-{i}" for i in range(start, min(start + BATCH, len(corpus)))]
+        store.upsert_embeddings(ids, corpus[start:start + len(ids)], [f"Chunk {i} text" for i in range(start, start + len(ids))])
+    store.wait_for_index()
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the IVF index of the NumPy vector store")
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dtype", default="float32", choices=["float32", "float16", "int8"])
+    parser.add_argument("--nlist", type=int, nargs="+", default=[0], help="Cell counts to build (0: 4 * sqrt(chunks))")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32, 64])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="rag-ann-index-") as tmp:
+        tmp = Path(tmp)
+        make_data(tmp, args.chunks, args.dim, args.queries)
+        corpus = np.load(tmp / "corpus.npy")
+        data = np.load(tmp / "queries.npz")
+        queries, truth = data["queries"], data["truth"]
+
+        rows = []
+        for nlist in args.nlist:
+            started = time.perf_counter()
+            store = build(tmp / f"ivf-{nlist}", corpus, nlist, args.dtype)
+            build_s = time.perf_counter() - started
+            if nlist == args.nlist[0]:
+                flat = NumpyVectorStore(tmp / f"ivf-{nlist}", dtype=args.dtype)
+                rows.append(("flat", "-", 1.0, measure(flat, queries, truth)))
+            cells = store.index_stats()["nlist"]
+            print(f"nlist={nlist or 'auto'}: {cells} cells, built in {build_s:.1f}s "
+                  f"({store.index_stats()['retrains']} trainings)")
+            for nprobe in args.nprobe:
+                rows.append((f"ivf nlist={cells}", nprobe, scanned_share(store, queries, nprobe),
+                             measure(store, queries, truth, nprobe)))
+
+        print(f"\n{args.chunks} chunks x {args.dim} dims ({args.dtype}), {args.queries} queries, top-{K}")
+        print(f"{'index':<18}{'nprobe':>7}{'scanned':>9}{'recall@5':>10}{'p50 (ms)':>10}{'p99 (ms)':>10}")
+        for name, nprobe, share, measured in rows:
+            print(f"{name:<18}{nprobe:>7}{share:>9.1%}{measured['recall']:>10.3f}"
+                  f"{measured['p50_ms']:>10.2f}{measured['p99_ms']:>10.2f}")
+
+        # Searches during a background retraining use the previous lists
+        nprobe = store.nprobe
+        idle = measure(store, queries, truth)
+        store._start_rebuild(None)
+        during = []
+        while store.index_stats()["rebuilding"]:
+            during.append(measure(store, queries[:20], truth[:20]))
+        store.wait_for_index()
+        print(f"\nnprobe={nprobe} idle: p50 {idle['p50_ms']:.2f} ms, p99 {idle['p99_ms']:.2f} ms")
+        if during:
+            print(f"during a background retraining ({len(during) * 20} queries): "
+                  f"p50 {statistics.median(m['p50_ms'] for m in during):.2f} ms, "
+                  f"max p99 {max(m['p99_ms'] for m in during):.2f} ms")
+
+        # Tombstones: deleted chunks are skipped, recall measured against the surviving corpus
+        rng = np.random.default_rng(1)
+        deleted = np.sort(rng.choice(args.chunks, args.chunks // 10, replace=False))
+        store.delete([f"chunk-{i}" for i in deleted])
+        store.wait_for_index()
+        alive = np.ones(args.chunks, dtype=bool)
+        alive[deleted] = False
+        scores = queries @ corpus.T
+        scores[:, ~alive] = -np.inf
+        truth_after = np.argsort(-scores, axis=1)[:, :K]
+        after = measure(store, queries, truth_after)
+        returned_deleted = sum(
+            not alive[int(doc.id.split("-")[1])]
+            for hits in store.search_by_vectors(queries, k=K) for doc, _ in hits
+        )
+        print(f"after deleting {len(deleted)} chunks: recall@5 {after['recall']:.3f}, "
+              f"deleted chunks returned: {returned_deleted}, {store.index_stats()['dead_rows']} tombstones")
+
+
+if __name__ == "__main__":
+    main()
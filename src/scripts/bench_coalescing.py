@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+LLM calls and latency for a burst of identical questions, with and without
+request coalescing.
+
+Fires --copies concurrent requests for each of a few questions (half of
+them streaming like /chat, half blocking like /query, arriving over
+--spread seconds) at the async agent against the local fake OpenAI server,
+once with COALESCING_ENABLED off and once on. The fake server counts chat
+completion and embeddings calls.
+
+Usage:
+    python src/scripts/bench_coalescing.py --latency 0.3 --copies 20
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.scripts.fake_openai_server import start_in_thread
+
+QUESTIONS = [
+    "How did the S&P 500 perform in 2024?",
+    "How much did NVDA gain in 2024?",
+    "What happened to Tesla stock in 2024?",
+]
+
+
+async def ask(agent, question: str, delay: float, streaming: bool) -> float:
+    await asyncio.sleep(delay)
+    started = time.perf_counter()
+    if streaming:
+        async for _ in agent.stream_events(question):
+            pass
+    else:
+        await agent.ainvoke(question)
+    return time.perf_counter() - started
+
+
+async def burst(agent, copies: int, spread: float):
+    rng = random.Random(0)
+    tasks = [
+        ask(agent, question, rng.uniform(0, spread), streaming=i % 2 == 0)
+        for question in QUESTIONS
+        for i in range(copies)
+    ]
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*tasks)
+    return latencies, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark single-flight request coalescing")
+    parser.add_argument("--latency", type=float, default=0.3, help="Fake server latency per call (s)")
+    parser.add_argument("--copies", type=int, default=20, help="Concurrent requests per question")
+    parser.add_argument("--spread", type=float, default=0.5, help="Requests arrive within this many seconds")
+    parser.add_argument("--port", type=int, default=8776)
+    args = parser.parse_args()
+
+    server = start_in_thread(port=args.port, latency=args.latency)
+    server_stats = server.config.app.state.requests
+    os.environ["OPENAI_API_KEY"] = "sk-fake"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+
+    from src.agents.rag_agent import build_rag_agent
+    from src.config.settings import with_overrides
+
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="rag-coalescing-") as tmp:
+        for label, enabled in (("off", False), ("coalescing", True)):
+            settings = with_overrides(
+                VECTORSTORE_DIR=Path(tmp),
+                COALESCING_ENABLED=enabled,
+                RETRIEVAL_CACHE_ENABLED=False,
+                EMBEDDING_CHECK_CTX_LENGTH=False,
+            )
+            agent = build_rag_agent(settings)
+            chat_before, embeddings_before = server_stats["chat"], server_stats["embeddings"]
+            latencies, wall = asyncio.run(burst(agent, args.copies, args.spread))
+            rows.append((
+                label,
+                server_stats["chat"] - chat_before,
+                server_stats["embeddings"] - embeddings_before,
+                latencies,
+                wall,
+                agent.metrics()["coalescing"],
+            ))
+
+    total = len(QUESTIONS) * args.copies
+    print(f"\n{total} requests ({len(QUESTIONS)} questions x {args.copies}) within {args.spread:.1f} s, "
+          f"{args.latency * 1000:.0f} ms per fake API call")
+    print(f"{'mode':<12}{'LLM calls':>10}{'embed calls':>13}{'p50 (s)':>9}{'max (s)':>9}{'wall (s)':>10}")
+    for label, chat_calls, embedding_calls, latencies, wall, _ in rows:
+        print(f"{label:<12}{chat_calls:>10}{embedding_calls:>13}{statistics.median(latencies):>9.2f}"
+              f"{max(latencies):>9.2f}{wall:>10.2f}")
+    print(f"\nCoalescing: {rows[-1][5]}")
+
+
+if __name__ == "__main__":
+    main()
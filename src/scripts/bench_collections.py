@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Memory and latency of serving many collections from one process.
+
+Creates --collections collections (copies of the bundled PDF under a
+temporary COLLECTIONS_DIR) and ingests them once. Then, for each byte budget
+(COLLECTION_CACHE_MAX_BYTES), a fresh process builds the agent and answers
+--requests questions, each selecting one collection with a skewed (Zipf)
+popularity, so a few collections are hot and most are rarely used. It
+reports:
+
+- peak and final RSS of the process
+- collections open at the end, opens and evictions
+- p50 latency of requests that found their collection open vs. had to open it
+
+Runs against the local fake OpenAI server, so the latencies are the agent's own.
+
+Usage:
+    python src/scripts/bench_collections.py --collections 40 --requests 200
+    python src/scripts/bench_collections.py --budgets 0 4000000 --backend numpy
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.scripts.fake_openai_server import start_in_thread
+
+QUESTIONS = [
+    "How did the S&P 500 perform in 2024?",
+    "How much did NVDA gain in 2024?",
+    "What happened to Tesla stock in 2024?",
+]
+
+
+def current_rss() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def build_agent(tmp: Path, backend: str, max_bytes: int):
+    from src.agents.rag_agent import build_rag_agent
+    from src.config.settings import with_overrides
+
+    return build_rag_agent(with_overrides(
+        VECTORSTORE_DIR=tmp / "vectorstore",
+        COLLECTIONS_DIR=tmp / "collections",
+        VECTOR_STORE_BACKEND=backend,
+        COLLECTION_CACHE_MAX_BYTES=max_bytes,
+        SEMANTIC_CACHE_ENABLED=False,
+        EMBEDDING_CHECK_CTX_LENGTH=False,
+    ))
+
+
+async def serve(agent, names, requests: int) -> dict:
+    rng = random.Random(0)
+    weights = [1 / (rank + 1) for rank in range(len(names))]
+    warm, cold = [], []
+    peak = current_rss()
+    for i in range(requests):
+        name = rng.choices(names, weights)[0]
+        opens = agent.collections.opens
+        started = time.perf_counter()
+        await agent.ainvoke(QUESTIONS[i % len(QUESTIONS)], collections=[name])
+        (cold if agent.collections.opens > opens else warm).append(time.perf_counter() - started)
+        peak = max(peak, current_rss())
+    stats = agent.collections.stats()
+    return {
+        "peak_rss": max(peak, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024),
+        "final_rss": current_rss(),
+        "open": len(stats["open"]),
+        "open_bytes": stats["bytes"],
+        "opens": stats["opens"],
+        "evictions": stats["evictions"],
+        "warm_ms": statistics.median(warm) * 1000 if warm else None,
+        "cold_ms": statistics.median(cold) * 1000 if cold else None,
+    }
+
+
+def worker(args):
+    """One budget in a fresh process, so RSS is not inherited from an earlier run."""
+    start_in_thread(port=args.port, latency=0.0)
+    os.environ["OPENAI_API_KEY"] = "sk-fake"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+    tmp = Path(args.tmp)
+    agent = build_agent(tmp, args.backend, args.worker_budget or 2**62)
+    names = sorted(path.name for path in (tmp / "collections").iterdir())
+    if args.prepare:
+        # Ingest every collection once, so the measured runs only open them
+        for name in names:
+            agent.invoke(QUESTIONS[0], collections=[name])
+        return
+    result = asyncio.run(serve(agent, names, args.requests))
+    print("RESULT " + json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark lazy collection loading under a byte budget")
+    parser.add_argument("--collections", type=int, default=40)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--budgets", type=int, nargs="+", default=[0, 8_000_000, 2_500_000],
+                        help="COLLECTION_CACHE_MAX_BYTES values to compare (0: unbounded)")
+    parser.add_argument("--backend", default="chroma", choices=["chroma", "numpy"])
+    parser.add_argument("--port", type=int, default=8779)
+    parser.add_argument("--tmp", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-budget", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--prepare", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.tmp:
+        worker(args)
+        return
+
+    pdf = project_root / "src" / "data" / "Stock_Market_Performance_2024.pdf"
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="rag-collections-") as tmp:
+        for i in range(args.collections):
+            directory = Path(tmp) / "collections" / f"client_{i:03d}"
+            directory.mkdir(parents=True)
+            shutil.copy(pdf, directory / f"client_{i:03d}.pdf")
+
+        def run(budget: int, *extra: str) -> str:
+            command = [sys.executable, __file__, "--tmp", tmp, "--worker-budget", str(budget),
+                       "--backend", args.backend, "--requests", str(args.requests), "--port", str(args.port), *extra]
+            return subprocess.run(command, capture_output=True, text=True, check=True).stdout
+
+        started = time.perf_counter()
+        run(0, "--prepare")
+        print(f"Ingested {args.collections} collections in {time.perf_counter() - started:.1f}s")
+        for budget in args.budgets:
+            output = run(budget)
+            result = json.loads(next(line for line in output.splitlines() if line.startswith("RESULT "))[7:])
+            rows.append((budget, result))
+
+    print(f"\n{args.requests} requests over {args.collections} {args.backend} collections (Zipf popularity)")
+    print(f"{'budget (MB)':>12}{'peak RSS (MB)':>15}{'final RSS (MB)':>16}{'open':>6}{'opens':>7}"
+          f"{'evictions':>11}{'warm p50 (ms)':>15}{'cold p50 (ms)':>15}")
+    for budget, r in rows:
+        label = f"{budget / 1e6:.1f}" if budget else "unbounded"
+        warm = f"{r['warm_ms']:.1f}" if r["warm_ms"] is not None else "-"
+        cold = f"{r['cold_ms']:.1f}" if r["cold_ms"] is not None else "-"
+        print(f"{label:>12}{r['peak_rss'] / 1e6:>15.0f}{r['final_rss'] / 1e6:>16.0f}{r['open']:>6}{r['opens']:>7}"
+              f"{r['evictions']:>11}{warm:>15}{cold:>15}")
+
+
+if __name__ == "__main__":
+    main()
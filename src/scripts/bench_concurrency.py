@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Load benchmark: blocking graph invocation vs async nodes.
+
+Runs the RAG agent against the local fake OpenAI server and fires a burst of
+concurrent questions from a single event loop, the way uvicorn serves them.
+"blocking" calls rag_agent.invoke inside the coroutine (the old API handlers),
+"async" awaits rag_agent.ainvoke. A probe task measures how long the event
+loop is stalled, which is what /health experiences under load.
+
+Usage:
+    python src/scripts/bench_concurrency.py --requests 20 --latency 0.2
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.scripts.fake_openai_server import start_in_thread
+
+
+async def _probe(stop: asyncio.Event, interval: float, stalls: list):
+    """Record how late the loop wakes us up compared to the requested interval."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        stalls.append(time.perf_counter() - started - interval)
+
+
+async def run_burst(rag_agent, mode: str, n_requests: int):
+    from langchain_core.messages import HumanMessage
+
+    async def handler(i: int) -> float:
+        started = time.perf_counter()
+        state = {"messages": [HumanMessage(content=f"How did sector {i} perform in 2024?")]}
+        if mode == "blocking":
+            rag_agent.invoke(state)
+        else:
+            await rag_agent.ainvoke(state)
+        return time.perf_counter() - started
+
+    stop = asyncio.Event()
+    stalls = []
+    probe = asyncio.create_task(_probe(stop, 0.01, stalls))
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(handler(i) for i in range(n_requests)))
+    wall = time.perf_counter() - started
+    stop.set()
+    await probe
+
+    return {
+        "wall": wall,
+        "p50": statistics.median(latencies),
+        "max_stall": max(stalls) if stalls else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark blocking vs async agent invocation")
+    parser.add_argument("--requests", type=int, default=20, help="Concurrent questions per burst")
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake server latency per call (s)")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    start_in_thread(port=args.port, latency=args.latency)
+    os.environ["OPENAI_API_KEY"] = "sk-fake"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+    os.environ["OPENAI_API_BASE"] = os.environ["OPENAI_BASE_URL"]
+
+    # Keep the fake embeddings out of the real vector store
+    from src.config.settings import with_overrides
+    from src.agents.rag_agent import build_rag_agent
+    tmp_dir = Path(tempfile.mkdtemp(prefix="rag-bench-"))
+    settings = with_overrides(
+        VECTORSTORE_DIR=tmp_dir,
+        INGESTION_MANIFEST_PATH=tmp_dir / "ingestion_manifest.json",
+        RETRIEVAL_CACHE_ENABLED=False,
+        EMBEDDING_CHECK_CTX_LENGTH=False,
+    )
+    rag_agent = build_rag_agent(settings).graph
+
+    print(f"\n{args.requests} concurrent questions, {args.latency * 1000:.0f} ms per fake API call")
+    print(f"{'mode':<10}{'wall (s)':>10}{'req/s':>10}{'p50 (s)':>10}{'max loop stall (s)':>20}")
+    for mode in ("blocking", "async"):
+        result = asyncio.run(run_burst(rag_agent, mode, args.requests))
+        print(
+            f"{mode:<10}{result['wall']:>10.2f}{args.requests / result['wall']:>10.1f}"
+            f"{result['p50']:>10.2f}{result['max_stall']:>20.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
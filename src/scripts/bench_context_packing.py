@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Prompt-token benchmark: raw tool results vs token-budgeted context packing.
+
+Runs multi-hop questions (several tickers each) through the agent against the
+local fake OpenAI server in --require-evidence mode, so the fake model keeps
+retrieving until every ticker it asked about shows up. Each extra turn
+re-sends all earlier tool results, which is where packing saves tokens. The
+fake server charges extra latency per prompt token, like a real model's
+prompt processing.
+
+Usage:
+    python src/scripts/bench_context_packing.py --latency 0.2 --prefill 0.2
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.scripts.fake_openai_server import start_in_thread
+
+MULTI_HOP_QUESTIONS = [
+    "Compare the 2024 gains of PLTR and IONQ",
+    "How did AAPL, GOOGL and AMZN perform in 2024?",
+    "Compare META advertising revenue with TSLA earnings in 2024",
+    "Which rose more in 2024, ARM or PLTR?",
+    "How did META and AMZN valuations change in 2024?",
+    "Compare TSLA and AAPL price-to-earnings at the end of 2024",
+]
+
+
+def run_questions(agent, server_stats: dict):
+    from langchain_core.messages import ToolMessage
+
+    from src.retrieval.packing import estimate_tokens
+
+    loops, latencies, prompt_tokens, tool_tokens = [], [], [], []
+    for question in MULTI_HOP_QUESTIONS:
+        before = server_stats["prompt_tokens"]
+        started = time.perf_counter()
+        result = agent.invoke(question)
+        latencies.append(time.perf_counter() - started)
+        prompt_tokens.append(server_stats["prompt_tokens"] - before)
+        tool_messages = [m for m in result["messages"] if isinstance(m, ToolMessage)]
+        loops.append(len(tool_messages))
+        tool_tokens.append(sum(estimate_tokens(str(m.content)) for m in tool_messages))
+    return {
+        "loops": statistics.mean(loops),
+        "tool_tokens": statistics.mean(tool_tokens),
+        "prompt_tokens": statistics.mean(prompt_tokens),
+        "p50": statistics.median(latencies),
+        "total": sum(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark context packing on multi-hop questions")
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake server latency per call (s)")
+    parser.add_argument("--prefill", type=float, default=0.2, help="Extra chat latency per 1000 prompt tokens (s)")
+    parser.add_argument("--port", type=int, default=8768)
+    args = parser.parse_args()
+
+    server = start_in_thread(
+        port=args.port, latency=args.latency, require_evidence=True, prefill_per_1k_tokens=args.prefill
+    )
+    server_stats = server.config.app.state.requests
+    os.environ["OPENAI_API_KEY"] = "sk-fake"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+
+    from src.agents.rag_agent import build_rag_agent
+    from src.config.settings import with_overrides
+
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="rag-packing-") as tmp:
+        for label, pack in (("raw", False), ("packed", True)):
+            settings = with_overrides(
+                VECTORSTORE_DIR=Path(tmp),
+                CONTEXT_PACKING_ENABLED=pack,
+                RETRIEVAL_CACHE_ENABLED=False,
+                EMBEDDING_CHECK_CTX_LENGTH=False,
+            )
+            rows.append((label, run_questions(build_rag_agent(settings), server_stats)))
+
+    print(f"\n{len(MULTI_HOP_QUESTIONS)} multi-hop questions, {args.latency * 1000:.0f} ms per call "
+          f"+ {args.prefill * 1000:.0f} ms per 1k prompt tokens")
+    print(f"{'mode':<8}{'tool loops':>12}{'tool tokens':>13}{'prompt tokens':>15}{'p50 (s)':>10}{'total (s)':>11}")
+    for label, row in rows:
+        print(
+            f"{label:<8}{row['loops']:>12.2f}{row['tool_tokens']:>13.0f}{row['prompt_tokens']:>15.0f}"
+            f"{row['p50']:>10.2f}{row['total']:>11.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Prompt-token benchmark for long conversation threads.
+
+Asks a series of follow-up questions in one thread against the local fake
+OpenAI server, once with history compaction effectively off and once with
+the configured threshold, and prints the prompt tokens the LLM received per
+turn. Without compaction they grow with every turn (all earlier questions,
+answers and tool results are re-sent); with it they level off.
+
+Usage:
+    python src/scripts/bench_conversation_memory.py --turns 24 --threshold 3000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.scripts.fake_openai_server import start_in_thread
+
+FOLLOW_UPS = [
+    "How did PLTR do in 2024?",
+    "And IONQ?",
+    "What about ARM stock?",
+    "Where did GOOGL close at the end of the year?",
+    "What was the AMZN share price in December?",
+    "How large was META advertising revenue?",
+    "What was the all-time closing high of TSLA?",
+    "What P/E did AAPL trade at?",
+    "How did the Russell 2000 perform?",
+    "How much did the Nasdaq Composite jump?",
+    "Which companies make up the Magnificent 7?",
+    "How much did Netflix stock rise?",
+]
+
+
+def run_thread(agent, server_stats: dict, turns: int):
+    thread_id = str(uuid.uuid4())
+    per_turn = []
+    for turn in range(turns):
+        before = server_stats["prompt_tokens"]
+        started = time.perf_counter()
+        agent.invoke(FOLLOW_UPS[turn % len(FOLLOW_UPS)], thread_id=thread_id)
+        per_turn.append((server_stats["prompt_tokens"] - before, time.perf_counter() - started))
+    return per_turn
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark prompt size over a long conversation thread")
+    parser.add_argument("--turns", type=int, default=24)
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake server latency per call (s)")
+    parser.add_argument("--threshold", type=int, default=None, help="History token threshold (default: settings)")
+    parser.add_argument("--port", type=int, default=8769)
+    args = parser.parse_args()
+
+    server = start_in_thread(port=args.port, latency=args.latency)
+    server_stats = server.config.app.state.requests
+    os.environ["OPENAI_API_KEY"] = "sk-fake"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+
+    from src.agents.rag_agent import build_rag_agent
+    from src.config.settings import HISTORY_TOKEN_THRESHOLD, with_overrides
+
+    threshold = args.threshold or HISTORY_TOKEN_THRESHOLD
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="rag-memory-") as tmp:
+        for label, history_threshold in (("full", 10 ** 9), ("compacted", threshold)):
+            settings = with_overrides(
+                VECTORSTORE_DIR=Path(tmp),
+                HISTORY_TOKEN_THRESHOLD=history_threshold,
+                RETRIEVAL_CACHE_ENABLED=False,
+                EMBEDDING_CHECK_CTX_LENGTH=False,
+            )
+            results[label] = run_thread(build_rag_agent(settings), server_stats, args.turns)
+
+    print(f"\n{args.turns} turns in one thread, history threshold {threshold} tokens")
+    print(f"{'turn':>5}{'full prompt':>14}{'compacted prompt':>19}{'full (s)':>10}{'compacted (s)':>15}")
+    for turn, ((full_tokens, full_s), (compact_tokens, compact_s)) in enumerate(
+        zip(results["full"], results["compacted"]), start=1
+    ):
+        print(f"{turn:>5}{full_tokens:>14}{compact_tokens:>19}{full_s:>10.2f}{compact_s:>15.2f}")
+    print(f"{'total':>5}{sum(t for t, _ in results['full']):>14}{sum(t for t, _ in results['compacted']):>19}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Exact figure lookups: fact_lookup_tool vs retriever_tool.
+
+Part 1 extracts the fact index from the bundled PDF and asks both tools the
+same questions, each hinging on one figure. It reports whether the expected
+figure is in the first fact / anywhere in the output, the size of the
+output the LLM has to read (estimated tokens) and the latency: the lookup
+runs in-process, the retriever embeds the question through the fake API
+(--latency per call) before searching.
+
+Part 2 runs the whole agent against the fake OpenAI server in
+--require-evidence mode (the fake model searches again until the tool
+results mention the tickers and figures it asked about), with the fact
+index off and on, and reports LLM calls, tool calls and latency per
+question. The router is off so every question goes through the LLM's tool
+choice.
+
+Usage:
+    python src/scripts/bench_fact_lookup.py --latency 0.2
+    python src/scripts/bench_fact_lookup.py --repeat 10000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.ingestion.facts import extract_file_facts
+from src.retrieval.facts import format_facts, load_or_build_fact_index
+from src.retrieval.packing import estimate_tokens
+from src.scripts.fake_openai_server import start_in_thread
+
+PDF_PATH = project_root / "src" / "data" / "Stock_Market_Performance_2024.pdf"
+
+# (question, the figure as written in the document)
+EVAL_SET = [
+    ("What was the S&P 500 return in 2024?", "25%"),
+    ("How much did PLTR gain in 2024?", "340%"),
+    ("What was the 2024 return of IONQ?", "237%"),
+    ("How did ARM stock do in 2024?", "64%"),
+    ("Where did GOOGL close at the end of 2024?", "$189"),
+    ("What was the AMZN share price in December 2024?", "$219"),
+    ("How large was META advertising revenue in 2024?", "$160 billion"),
+    ("What was the all-time closing high of TSLA?", "$480"),
+    ("What P/E did AAPL trade at by the end of 2024?", "40 times"),
+    ("How did the Russell 2000 perform?", "10-11%"),
+    ("How much did the Nasdaq Composite jump in 2024?", "29%"),
+    ("How much did Netflix stock rise in 2024?", "92%"),
+    ("What was Apple's market cap at the end of 2024?", "$4 trillion"),
+    ("How much did NVDA stock rise in 2024?", "170%"),
+]
+
+
+def build_agent(tmp_dir: Path, facts: bool):
+    from src.agents.rag_agent import build_rag_agent
+    from src.config.settings import with_overrides
+
+    return build_rag_agent(with_overrides(
+        VECTORSTORE_DIR=tmp_dir,
+        FACT_INDEX_ENABLED=facts,
+        ROUTER_ENABLED=False,
+        RETRIEVAL_CACHE_ENABLED=False,
+        EMBEDDING_CHECK_CTX_LENGTH=False,
+    ))
+
+
+def score_lookup(index, repeat: int) -> dict:
+    first, found, tokens, latencies = 0, 0, [], []
+    for question, expected in EVAL_SET:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            facts, parsed = index.lookup(question)
+        latencies.append((time.perf_counter() - started) / repeat)
+        first += bool(facts) and expected in facts[0]["text"]
+        found += any(expected in fact["text"] for fact in facts)
+        tokens.append(estimate_tokens(format_facts(facts, parsed, index)))
+    return {"first": first, "found": found, "tokens": statistics.mean(tokens),
+            "p50_ms": statistics.median(latencies) * 1000}
+
+
+def score_retriever_tool(tool) -> dict:
+    found, tokens, latencies = 0, [], []
+    for question, expected in EVAL_SET:
+        started = time.perf_counter()
+        content = tool.invoke({"query": question})
+        latencies.append(time.perf_counter() - started)
+        found += expected in content
+        tokens.append(estimate_tokens(content))
+    return {"first": None, "found": found, "tokens": statistics.mean(tokens),
+            "p50_ms": statistics.median(latencies) * 1000}
+
+
+def run_agent(agent) -> dict:
+    from langchain_core.messages import AIMessage, ToolMessage
+
+    llm_calls, tool_calls, latencies = [], [], []
+    for question, _ in EVAL_SET:
+        started = time.perf_counter()
+        result = agent.invoke(question)
+        latencies.append(time.perf_counter() - started)
+        llm_calls.append(sum(isinstance(m, AIMessage) for m in result["messages"]))
+        tool_calls.append(sum(isinstance(m, ToolMessage) for m in result["messages"]))
+    return {
+        "llm_calls": statistics.mean(llm_calls),
+        "tool_calls": statistics.mean(tool_calls),
+        "p50": statistics.median(latencies),
+        "total": sum(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the fact index against retrieval for exact figures")
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake server latency per call (s)")
+    parser.add_argument("--repeat", type=int, default=1000, help="Lookups per question when timing the fact index")
+    parser.add_argument("--port", type=int, default=8780)
+    args = parser.parse_args()
+
+    start_in_thread(port=args.port, latency=args.latency, require_evidence=True)
+    os.environ["OPENAI_API_KEY"] = "sk-fake"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+
+    with tempfile.TemporaryDirectory(prefix="rag-facts-") as tmp:
+        started = time.perf_counter()
+        index = load_or_build_fact_index(Path(tmp) / "facts", [str(PDF_PATH)], extract_file_facts)
+        print(f"Extracted {len(index)} facts ({index.stats()['table_cells']} table cells) about "
+              f"{len(index.entities)} entities in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+        without_facts = build_agent(Path(tmp) / "off", facts=False)
+        with_facts = build_agent(Path(tmp) / "on", facts=True)
+
+        print(f"\n{len(EVAL_SET)} questions, fake API with {args.latency * 1000:.0f} ms per call")
+        print(f"{'tool':<18}{'first':>7}{'found':>7}{'tokens':>8}{'p50 (ms)':>11}")
+        rows = [
+            ("fact_lookup_tool", score_lookup(index, args.repeat)),
+            ("retriever_tool", score_retriever_tool(with_facts.tools_dict["retriever_tool"])),
+        ]
+        for label, scores in rows:
+            first = f"{scores['first']}/{len(EVAL_SET)}" if scores["first"] is not None else "-"
+            print(f"{label:<18}{first:>7}{scores['found']:>4}/{len(EVAL_SET):<2}{scores['tokens']:>8.0f}"
+                  f"{scores['p50_ms']:>11.3f}")
+
+        print("\nAgent runs (fake model re-queries until the tool results mention what it asked about)")
+        print(f"{'fact index':<12}{'LLM calls':>11}{'tool calls':>12}{'p50 (s)':>10}{'total (s)':>11}")
+        for label, agent in (("off", without_facts), ("on", with_facts)):
+            run = run_agent(agent)
+            print(f"{label:<12}{run['llm_calls']:>11.2f}{run['tool_calls']:>12.2f}{run['p50']:>10.2f}{run['total']:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Offline eval and latency benchmark: vector-only vs hybrid (BM25 + vector)
+retrieval, with and without the candidate-pool reranker.
+
+Part 1 scores the retriever alone on questions whose answer hinges on an
+exact ticker, index name or figure: hit@5 (the expected text is in one of the
+returned chunks), MRR and the reranker's cost per request. Part 2 runs the whole agent against the local fake
+OpenAI server in --require-evidence mode, where the fake model re-queries
+until the retrieved text mentions the tickers and figures it asked about, and
+reports tool loops and latency per question.
+
+Retrieval latency is measured after the agent run, with query embeddings
+already cached, so it shows the local cost of search, fusion and reranking.
+The fake server's embeddings are hashes, so the vector side is effectively
+random offline; pass --openai to score both sides with the real API instead
+(part 2 always uses the fake server).
+
+Usage:
+    python src/scripts/bench_hybrid_retrieval.py --latency 0.2
+    python src/scripts/bench_hybrid_retrieval.py --openai
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.scripts.fake_openai_server import start_in_thread
+
+# (question, text the supporting chunk must contain)
+EVAL_SET = [
+    ("How much did PLTR gain in 2024?", "340%"),
+    ("What was the 2024 return of IONQ?", "237%"),
+    ("How did ARM stock do in 2024?", "64%"),
+    ("Where did GOOGL close at the end of 2024?", "$189"),
+    ("What was the AMZN share price in December 2024?", "$219"),
+    ("How large was META advertising revenue in 2024?", "$160 billion"),
+    ("What was the all-time closing high of TSLA?", "$480"),
+    ("What P/E did AAPL trade at by the end of 2024?", "40 times"),
+    ("How did the Russell 2000 perform?", "Russell 2000"),
+    ("How much did the Nasdaq Composite jump in 2024?", "29%"),
+    ("Which companies make up the Magnificent 7?", "Magnificent 7"),
+    ("How much did Netflix stock rise in 2024?", "92%"),
+]
+
+
+MODES = [
+    # (label, hybrid, rerank)
+    ("vector", False, False),
+    ("hybrid", True, False),
+    ("rerank", True, True),
+]
+
+
+def build_agent(tmp_dir: Path, hybrid: bool, rerank: bool = False):
+    from src.agents.rag_agent import build_rag_agent
+    from src.config.settings import with_overrides
+
+    settings = with_overrides(
+        VECTORSTORE_DIR=tmp_dir,
+        HYBRID_RETRIEVAL_ENABLED=hybrid,
+        RERANK_ENABLED=rerank,
+        EMBEDDING_CHECK_CTX_LENGTH=False,
+    )
+    return build_rag_agent(settings)
+
+
+def score_retriever(retriever):
+    hits, reciprocal_ranks, latencies = 0, [], []
+    for question, expected in EVAL_SET:
+        started = time.perf_counter()
+        docs = retriever.invoke(question)
+        latencies.append(time.perf_counter() - started)
+        rank = next((i for i, doc in enumerate(docs, start=1) if expected in doc.page_content), None)
+        hits += rank is not None
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+    return {
+        "hit@5": hits / len(EVAL_SET),
+        "mrr": statistics.mean(reciprocal_ranks),
+        "p50_ms": statistics.median(latencies) * 1000,
+    }
+
+
+def run_agent(agent):
+    from langchain_core.messages import ToolMessage
+
+    loops, latencies = [], []
+    for question, _ in EVAL_SET:
+        started = time.perf_counter()
+        result = agent.invoke(question)
+        latencies.append(time.perf_counter() - started)
+        loops.append(sum(isinstance(m, ToolMessage) for m in result["messages"]))
+    return {
+        "loops": statistics.mean(loops),
+        "p50": statistics.median(latencies),
+        "total": sum(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate vector-only, hybrid and reranked retrieval")
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake server latency per call (s)")
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--openai", action="store_true", help="Score the retriever with the real OpenAI API")
+    args = parser.parse_args()
+
+    start_in_thread(port=args.port, latency=args.latency, require_evidence=True)
+    fake_env = {
+        "OPENAI_API_KEY": "sk-fake",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{args.port}/v1",
+    }
+
+    with tempfile.TemporaryDirectory(prefix="rag-hybrid-") as tmp:
+        if args.openai:
+            from dotenv import load_dotenv
+            load_dotenv()
+            print(f"\nRetriever eval ({len(EVAL_SET)} questions, OpenAI embeddings)")
+            for label, hybrid, rerank in MODES:
+                agent = build_agent(Path(tmp) / "openai", hybrid, rerank)
+                scores = score_retriever(agent.retriever)
+                print(
+                    f"{label:<8} hit@5 {scores['hit@5']:.2f}  "
+                    f"MRR {scores['mrr']:.2f}  p50 {scores['p50_ms']:.1f} ms"
+                )
+
+        os.environ.update(fake_env)
+        print(f"\nOffline ({len(EVAL_SET)} questions, fake API with {args.latency * 1000:.0f} ms per call)")
+        print(f"{'mode':<8}{'hit@5':>8}{'MRR':>8}{'retrieve p50 (ms)':>20}{'rerank p50 (ms)':>18}"
+              f"{'tool loops':>12}{'p50 (s)':>10}{'total (s)':>11}")
+        for label, hybrid, rerank in MODES:
+            agent = build_agent(Path(tmp) / "fake", hybrid, rerank)
+            # The agent runs first so its retrievals start from a cold cache
+            run = run_agent(agent)
+            scores = score_retriever(agent.retriever)
+            rerank_ms = agent.rerank_stats.stats()["p50_ms"] if rerank else 0.0
+            print(
+                f"{label:<8}{scores['hit@5']:>8.2f}{scores['mrr']:>8.2f}{scores['p50_ms']:>20.1f}"
+                f"{rerank_ms:>18.2f}{run['loops']:>12.2f}{run['p50']:>10.2f}{run['total']:>11.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Ingestion benchmark: embedding throughput under rate limits.
+
+Copies the sample PDF N times into a temporary data directory and ingests it
+into a temporary Chroma collection through the local fake OpenAI server,
+which can answer every Nth embeddings request with a 429. Compares one
+embedding request at a time with the concurrent writer and checks that no
+chunk is lost to rate limiting.
+
+Usage:
+    python src/scripts/bench_ingest.py --copies 20 --latency 0.1 --rate-limit-every 7
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.scripts.fake_openai_server import start_in_thread
+
+
+def run_once(data_dir: Path, work_dir: Path, max_inflight: int, request_size: int, workers: int, batch_size: int):
+    from langchain_chroma import Chroma
+    from langchain_openai import OpenAIEmbeddings
+
+    from src.config import settings
+    from src.ingestion.pipeline import discover_sources, run_ingestion
+    from src.ingestion.writer import EmbeddingBatchWriter
+
+    embeddings = OpenAIEmbeddings(model=settings.EMBEDDING_MODEL, check_embedding_ctx_length=False, max_retries=0)
+    vectorstore = Chroma(
+        collection_name="bench_ingest",
+        embedding_function=embeddings,
+        persist_directory=str(work_dir / "vectorstore"),
+    )
+    writer = EmbeddingBatchWriter(
+        vectorstore,
+        embeddings,
+        request_size=request_size,
+        max_inflight=max_inflight,
+        backoff_base=0.1,
+        checkpoint_path=work_dir / "checkpoint.jsonl",
+    )
+
+    started = time.perf_counter()
+    stats = run_ingestion(
+        writer,
+        discover_sources(data_dir),
+        {"chunk_size": settings.CHUNK_SIZE, "chunk_overlap": settings.CHUNK_OVERLAP},
+        work_dir / "manifest.json",
+        workers=workers,
+        batch_size=batch_size,
+        verbose=False,
+    )
+    elapsed = time.perf_counter() - started
+    stored = len(vectorstore.get(include=[])["ids"])
+    return elapsed, stats, stored, writer.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark rate-limit-aware ingestion")
+    parser.add_argument("--copies", type=int, default=20, help="Copies of the sample PDF to ingest")
+    parser.add_argument("--latency", type=float, default=0.1, help="Fake server latency per call (s)")
+    parser.add_argument("--rate-limit-every", type=int, default=7, help="Every Nth embeddings call gets a 429")
+    parser.add_argument("--request-size", type=int, default=16, help="Texts per embeddings request")
+    parser.add_argument("--workers", type=int, default=2, help="Parser processes")
+    parser.add_argument("--batch-size", type=int, default=128)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    start_in_thread(port=args.port, latency=args.latency, rate_limit_every=args.rate_limit_every)
+    os.environ["OPENAI_API_KEY"] = "sk-fake"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+
+    from src.config import settings
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(tmp) / "data"
+        data_dir.mkdir()
+        # Chunk IDs include the source path, so every copy is indexed separately
+        for i in range(args.copies):
+            shutil.copy(settings.PDF_PATH, data_dir / f"filing_{i:03d}.pdf")
+
+        print(f"Ingesting {args.copies} copies, 429 on every {args.rate_limit_every}th embeddings call")
+        for label, inflight in (("sequential", 1), ("concurrent", settings.INGEST_MAX_INFLIGHT)):
+            work_dir = Path(tmp) / label
+            elapsed, stats, stored, writer_stats = run_once(
+                data_dir, work_dir, inflight, args.request_size, args.workers, args.batch_size
+            )
+            print(
+                f"{label:>10}: {stats['added']} chunks in {elapsed:.2f}s "
+                f"({stats['added'] / elapsed:.1f} chunks/s), {stored} stored, "
+                f"{writer_stats['requests']} requests, {writer_stats['rate_limited']} rate limited"
+            )
+
+
+if __name__ == "__main__":
+    main()
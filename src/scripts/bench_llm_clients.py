@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Latency benchmark: a ChatOpenAI built per request vs the shared client registry.
+
+Sends streaming chat requests with the retriever tool bound to the local fake
+OpenAI server at a fixed concurrency, in three modes:
+
+- per-request: ChatOpenAI(...).bind_tools(tools) for every call, as
+  stream_rag_agent_advanced used to do
+- per-request-pool: the same with a fresh httpx pool per call, which is what
+  per-request construction costs once the transport is tuned (custom limits,
+  timeouts) instead of the SDK's cached default
+- shared: one ClientRegistry; each call gets a model/temperature override
+  bound on the shared client
+
+Reports p50/p99 per-request latency, including client construction.
+
+Usage:
+    python src/scripts/bench_llm_clients.py --requests 400 --concurrency 16 --latency 0.02
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.scripts.fake_openai_server import start_in_thread
+
+
+def percentile(values, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def run_mode(make_llm, requests: int, concurrency: int):
+    from langchain_core.messages import HumanMessage
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            llm, cleanup = make_llm()
+            async for _ in llm.astream([HumanMessage(content=f"How did the S&P 500 do in 2024? ({i})")]):
+                pass
+            if cleanup is not None:
+                await cleanup()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    wall = time.perf_counter() - started
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "throughput": requests / wall,
+    }
+
+
+async def main_async(args):
+    import httpx
+    from langchain_core.tools import tool
+    from langchain_openai import ChatOpenAI
+
+    from src.agents.clients import ClientRegistry
+    from src.config.settings import with_overrides
+
+    @tool
+    def retriever_tool(query: str) -> str:
+        """Search the Stock Market Performance 2024 document."""
+        return query
+
+    tools = [retriever_tool]
+    settings = with_overrides(EMBEDDING_CHECK_CTX_LENGTH=False)
+    registry = ClientRegistry(settings)
+    shared_llm = registry.llm.bind_tools(tools)
+
+    def per_request():
+        return ChatOpenAI(model=settings.LLM_MODEL, temperature=0, streaming=True).bind_tools(tools), None
+
+    def per_request_pool():
+        http_async_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=settings.HTTP_MAX_CONNECTIONS),
+            timeout=settings.HTTP_TIMEOUT_SECONDS,
+        )
+        llm = ChatOpenAI(
+            model=settings.LLM_MODEL, temperature=0, streaming=True, http_async_client=http_async_client
+        ).bind_tools(tools)
+        return llm, http_async_client.aclose
+
+    def shared():
+        return registry.chat_model(settings.LLM_MODEL, 0, llm=shared_llm), None
+
+    modes = [("per-request", per_request), ("per-request-pool", per_request_pool), ("shared", shared)]
+    # Warm up the fake server and each code path once
+    for _, make_llm in modes:
+        await run_mode(make_llm, args.concurrency, args.concurrency)
+
+    rows = []
+    for label, make_llm in modes:
+        rows.append((label, await run_mode(make_llm, args.requests, args.concurrency)))
+    await registry.aclose()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-request vs shared LLM clients")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.02, help="Fake server latency per call (s)")
+    parser.add_argument("--port", type=int, default=8770)
+    args = parser.parse_args()
+
+    start_in_thread(port=args.port, latency=args.latency)
+    os.environ["OPENAI_API_KEY"] = "sk-fake"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+
+    rows = asyncio.run(main_async(args))
+    print(f"\n{args.requests} streaming requests, concurrency {args.concurrency}, "
+          f"{args.latency * 1000:.0f} ms server latency")
+    print(f"{'mode':<18}{'p50 (ms)':>10}{'p99 (ms)':>10}{'req/s':>9}")
+    for label, row in rows:
+        print(f"{label:<18}{row['p50_ms']:>10.1f}{row['p99_ms']:>10.1f}{row['throughput']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
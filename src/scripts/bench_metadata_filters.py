@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Pre-filtering through the metadata index vs post-filtering the top-k.
+
+Builds a synthetic corpus of many documents (clustered unit vectors, 10
+pages per document, one section per page group) in the vector store, then
+asks scoped questions: "within document D" and "within pages 3-5 of
+document D". The ground truth is the exact top-5 among the chunks in scope.
+
+- post-filter: unfiltered top-5 (or an over-fetched top-50), then drop the
+  chunks outside the scope
+- pre-filter: MetadataIndex.resolve() to the chunk IDs in scope, then a
+  vector search over only those IDs (what retriever_tool does)
+
+Usage:
+    python src/scripts/bench_metadata_filters.py --chunks 20000 --dim 384
+    python src/scripts/bench_metadata_filters.py --backends numpy
+"""
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.retrieval.filters import MetadataIndex
+
+K = 5
+CHUNKS_PER_DOCUMENT = 100
+
+
+def make_corpus(chunks: int, dim: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(chunks // 200, 1), dim)).astype(np.float32)
+    corpus = centers[rng.integers(0, len(centers), chunks)] + 0.6 * rng.normal(size=(chunks, dim)).astype(np.float32)
+    corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+    ids = [f"chunk-{i}" for i in range(chunks)]
+    metadatas = [
+        {
+            "source": f"/data/filing-{i // CHUNKS_PER_DOCUMENT:04d}.pdf",
+            "page": (i % CHUNKS_PER_DOCUMENT) // 10,
+            "section": f"Section {(i % CHUNKS_PER_DOCUMENT) // 30 + 1}",
+            "date": f"{2015 + (i // CHUNKS_PER_DOCUMENT) % 10}-06-30",
+        }
+        for i in range(chunks)
+    ]
+    return corpus, ids, metadatas
+
+
+def open_store(backend: str, path: Path):
+    if backend == "chroma":
+        from langchain_chroma import Chroma
+
+        return Chroma(collection_name="bench", persist_directory=str(path))
+    from src.retrieval.numpy_store import NumpyVectorStore
+
+    return NumpyVectorStore(path)
+
+
+def build(store, backend: str, corpus, ids, metadatas):
+    for start in range(0, len(ids), 5000):
+        stop = start + 5000
+        texts = [f"Chunk {i} text" for i in range(start, min(stop, len(ids)))]
+        if backend == "chroma":
+            store._collection.upsert(ids=ids[start:stop], embeddings=corpus[start:stop], documents=texts,
+                                     metadatas=metadatas[start:stop])
+        else:
+            store.upsert_embeddings(ids[start:stop], corpus[start:stop], texts, metadatas[start:stop])
+
+
+def run(store, queries, scopes, truths, strategy: str, index: MetadataIndex) -> dict:
+    latencies, hits, returned = [], 0, 0
+    for vector, scope, truth in zip(queries, scopes, truths):
+        vector = vector.tolist()
+        started = time.perf_counter()
+        if strategy == "pre-filter":
+            allowed = index.resolve(**scope).ids
+            docs = store.similarity_search_by_vector(vector, k=min(K, len(allowed)), ids=sorted(allowed))
+        else:
+            fetch = K if strategy == "post-filter top-5" else 10 * K
+            allowed = index.resolve(**scope).ids
+            docs = [doc for doc in store.similarity_search_by_vector(vector, k=fetch) if doc.id in allowed][:K]
+        latencies.append(time.perf_counter() - started)
+        returned += len(docs)
+        hits += len({doc.id for doc in docs} & truth)
+    return {
+        "recall": hits / (K * len(queries)),
+        "returned": returned / len(queries),
+        "p50_ms": statistics.median(latencies) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark metadata-filtered retrieval")
+    parser.add_argument("--chunks", type=int, default=20_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--backends", nargs="+", default=["numpy", "chroma"], choices=["numpy", "chroma"])
+    args = parser.parse_args()
+
+    corpus, ids, metadatas = make_corpus(args.chunks, args.dim)
+    index = MetadataIndex()
+    started = time.perf_counter()
+    index.add(ids, metadatas)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    rng = np.random.default_rng(1)
+    documents = args.chunks // CHUNKS_PER_DOCUMENT
+    scopes = []
+    for i in range(args.queries):
+        document = f"filing {rng.integers(0, documents):04d}"
+        scopes.append({"document": document} if i % 2 == 0 else {"document": document, "page_from": 3, "page_to": 5})
+    queries = corpus[rng.integers(0, args.chunks, args.queries)] + 0.3 * rng.normal(size=(args.queries, args.dim))
+    queries = (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+
+    position = {cid: i for i, cid in enumerate(ids)}
+    truths, resolve_times = [], []
+    for vector, scope in zip(queries, scopes):
+        started = time.perf_counter()
+        allowed = sorted(index.resolve(**scope).ids, key=position.get)
+        resolve_times.append(time.perf_counter() - started)
+        rows = np.asarray([position[cid] for cid in allowed])
+        best = rows[np.argsort(-(corpus[rows] @ vector))[:K]]
+        truths.append({ids[row] for row in best})
+    print(f"Metadata index over {args.chunks} chunks built in {build_ms:.0f} ms; "
+          f"resolving a filter takes {statistics.median(resolve_times) * 1e6:.0f} us (p50); "
+          f"scopes hold {CHUNKS_PER_DOCUMENT} or 30 chunks")
+
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="rag-filters-") as tmp:
+        for backend in args.backends:
+            store = open_store(backend, Path(tmp) / backend)
+            build(store, backend, corpus, ids, metadatas)
+            for strategy in ("post-filter top-5", "post-filter top-50", "pre-filter"):
+                rows.append((backend, strategy, run(store, queries, scopes, truths, strategy, index)))
+
+    print(f"\n{args.chunks} chunks x {args.dim} dims, {args.queries} scoped queries, top-{K}")
+    print(f"{'backend':<9}{'strategy':<21}{'recall@5':>9}{'results':>9}{'p50 (ms)':>10}")
+    for backend, strategy, measured in rows:
+        print(f"{backend:<9}{strategy:<21}{measured['recall']:>9.3f}{measured['returned']:>9.2f}{measured['p50_ms']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
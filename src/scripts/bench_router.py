@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+LLM calls and latency per question with and without the query router.
+
+Runs a mix of small talk, questions naming something in the corpus and
+general questions through the agent against the local fake OpenAI server,
+once with ROUTER_ENABLED off (every question starts with a tool-calling LLM
+turn) and once on. The fake server counts chat completion calls.
+
+Usage:
+    python src/scripts/bench_router.py --latency 0.3 --prefill 0.2
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.scripts.fake_openai_server import start_in_thread
+
+QUESTIONS = [
+    # (kind, question)
+    ("smalltalk", "Hi!"),
+    ("smalltalk", "Thanks, that's great"),
+    ("smalltalk", "Good morning"),
+    ("corpus", "How much did PLTR gain in 2024?"),
+    ("corpus", "What was the 2024 return of IONQ?"),
+    ("corpus", "Where did GOOGL close at the end of 2024?"),
+    ("corpus", "How large was META advertising revenue in 2024?"),
+    ("corpus", "How did the Russell 2000 perform?"),
+    ("corpus", "How much did the Nasdaq Composite jump in 2024?"),
+    ("corpus", "Which companies make up the Magnificent 7?"),
+    ("general", "What is a price to earnings ratio?"),
+    ("general", "Should I buy index funds?"),
+]
+
+
+def run_questions(agent, server_stats: dict):
+    rows = []
+    for kind, question in QUESTIONS:
+        calls_before = server_stats["chat"]
+        started = time.perf_counter()
+        agent.invoke(question)
+        rows.append((kind, server_stats["chat"] - calls_before, time.perf_counter() - started))
+    return rows
+
+
+def summarize(rows, kind=None):
+    selected = [row for row in rows if kind is None or row[0] == kind]
+    return statistics.mean(row[1] for row in selected), statistics.median(row[2] for row in selected)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the query router")
+    parser.add_argument("--latency", type=float, default=0.3, help="Fake server latency per call (s)")
+    parser.add_argument("--prefill", type=float, default=0.2, help="Extra chat latency per 1000 prompt tokens (s)")
+    parser.add_argument("--port", type=int, default=8771)
+    args = parser.parse_args()
+
+    server = start_in_thread(port=args.port, latency=args.latency, prefill_per_1k_tokens=args.prefill)
+    server_stats = server.config.app.state.requests
+    os.environ["OPENAI_API_KEY"] = "sk-fake"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+
+    from src.agents.rag_agent import build_rag_agent
+    from src.config.settings import with_overrides
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="rag-router-") as tmp:
+        for label, enabled in (("no router", False), ("router", True)):
+            settings = with_overrides(
+                VECTORSTORE_DIR=Path(tmp),
+                ROUTER_ENABLED=enabled,
+                RETRIEVAL_CACHE_ENABLED=False,
+                EMBEDDING_CHECK_CTX_LENGTH=False,
+            )
+            agent = build_rag_agent(settings)
+            results[label] = (run_questions(agent, server_stats), agent.metrics()["router"])
+
+    print(f"\n{len(QUESTIONS)} questions, {args.latency * 1000:.0f} ms per call "
+          f"+ {args.prefill * 1000:.0f} ms per 1k prompt tokens")
+    print(f"{'mode':<11}{'kind':<11}{'LLM calls/q':>12}{'p50 (s)':>10}")
+    for label, (rows, _) in results.items():
+        for kind in ("smalltalk", "corpus", "general", None):
+            calls, p50 = summarize(rows, kind)
+            print(f"{label:<11}{kind or 'all':<11}{calls:>12.2f}{p50:>10.2f}")
+        print(f"{'':<11}{'total (s)':<11}{sum(row[2] for row in rows):>22.2f}")
+    print(f"\nRoutes: {results['router'][1]}")
+
+
+if __name__ == "__main__":
+    main()
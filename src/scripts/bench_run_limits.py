@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Worst-case LLM calls and latency per question with and without run limits.
+
+Runs questions whose tickers and figures are not in the corpus through the
+async agent against the local fake OpenAI server in --require-evidence mode,
+where the fake model keeps re-querying for the missing terms (up to
+--max-tool-calls retrieval rounds). Once with limits loose enough never to
+trigger, once with the given tool-iteration cap, deadline and token budget.
+
+Usage:
+    python src/scripts/bench_run_limits.py --latency 0.3 --max-tool-iterations 2 --deadline 1.5
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.scripts.fake_openai_server import start_in_thread
+
+QUESTIONS = [
+    "What did ZQX report for 2031?",
+    "How much did QRTZ gain in 2029?",
+    "Where did NVDA and XYZW close on 2024-12-31?",
+    "What was the 2027 return of the FOO 300 index?",
+    "How much did PLTR gain in 2024?",
+    "How did the S&P 500 do in 2024?",
+]
+
+
+async def run_questions(agent, server_stats: dict, settings, limits: dict):
+    from src.agents.limits import run_limits
+
+    rows = []
+    for question in QUESTIONS:
+        calls_before = server_stats["chat"]
+        started = time.perf_counter()
+        result = await agent.ainvoke(question, limits=run_limits(settings, **limits))
+        rows.append((
+            server_stats["chat"] - calls_before,
+            time.perf_counter() - started,
+            result["messages"][-1].response_metadata.get("limit"),
+        ))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-request run limits")
+    parser.add_argument("--latency", type=float, default=0.3, help="Fake server latency per call (s)")
+    parser.add_argument("--port", type=int, default=8773)
+    parser.add_argument("--max-tool-calls", type=int, default=6, help="Retrieval rounds the fake model may ask for")
+    parser.add_argument("--max-tool-iterations", type=int, default=2)
+    parser.add_argument("--deadline", type=float, default=1.5, help="Per-request deadline (s)")
+    parser.add_argument("--token-budget", type=int, default=30000)
+    args = parser.parse_args()
+
+    server = start_in_thread(
+        port=args.port, latency=args.latency, require_evidence=True, max_tool_calls=args.max_tool_calls
+    )
+    server_stats = server.config.app.state.requests
+    os.environ["OPENAI_API_KEY"] = "sk-fake"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+
+    from src.agents.rag_agent import build_rag_agent
+    from src.config.settings import with_overrides
+
+    modes = {
+        "unbounded": {"max_tool_iterations": 100, "deadline_seconds": 3600.0, "token_budget": 10 ** 9},
+        "limited": {
+            "max_tool_iterations": args.max_tool_iterations,
+            "deadline_seconds": args.deadline,
+            "token_budget": args.token_budget,
+        },
+    }
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="rag-limits-") as tmp:
+        settings = with_overrides(
+            VECTORSTORE_DIR=Path(tmp),
+            ROUTER_ENABLED=False,
+            RETRIEVAL_CACHE_ENABLED=False,
+            EMBEDDING_CHECK_CTX_LENGTH=False,
+        )
+        agent = build_rag_agent(settings)
+        for label, limits in modes.items():
+            results[label] = asyncio.run(run_questions(agent, server_stats, settings, limits))
+
+    print(f"\n{len(QUESTIONS)} questions, {args.latency * 1000:.0f} ms per fake API call, "
+          f"fake model asks for up to {args.max_tool_calls} retrieval rounds")
+    print(f"limited: {modes['limited']}")
+    print(f"{'mode':<11}{'LLM calls/q':>12}{'max calls':>11}{'p50 (s)':>9}{'max (s)':>9}  limits hit")
+    for label, rows in results.items():
+        hit = Counter(row[2] for row in rows if row[2])
+        print(
+            f"{label:<11}{statistics.mean(row[0] for row in rows):>12.2f}{max(row[0] for row in rows):>11}"
+            f"{statistics.median(row[1] for row in rows):>9.2f}{max(row[1] for row in rows):>9.2f}  {dict(hit) or '-'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
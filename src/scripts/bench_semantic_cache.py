@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Hit-rate / latency trade-off of the semantic answer cache.
+
+Replays a workload of paraphrased questions through SemanticAnswerCache at
+several similarity thresholds. Each miss is charged the simulated cost of a
+full agent run; each hit costs the measured lookup time. Paraphrase hits are
+hits on a differently worded question of the same intent. A hit whose
+cached question belongs to a different intent is counted as a wrong answer,
+which is the price of a lower threshold.
+
+Embeddings are a local hashed bag of words/bigrams so the benchmark runs
+offline; real embeddings separate paraphrases better, so treat the numbers
+as relative.
+
+Usage:
+    python src/scripts/bench_semantic_cache.py --questions 2000 --agent-latency 4.0
+"""
+
+import argparse
+import hashlib
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.agents.semantic_cache import SemanticAnswerCache
+
+# Each inner list is one intent phrased several ways
+INTENTS = [
+    ["How did the S&P 500 perform in 2024?", "What was the S&P 500 return in 2024?",
+     "How much did the S&P 500 gain in 2024?", "S&P 500 performance 2024"],
+    ["Which sector performed best in 2024?", "What was the top performing sector in 2024?",
+     "Best performing sector of 2024?", "Which sector led the market in 2024?"],
+    ["How did the Nasdaq do in 2024?", "What was the Nasdaq return in 2024?",
+     "Nasdaq performance in 2024", "How much did the Nasdaq gain in 2024?"],
+    ["What happened to interest rates in 2024?", "How did the Fed change rates in 2024?",
+     "Did the Federal Reserve cut rates in 2024?", "Interest rate changes in 2024"],
+    ["How did Apple stock perform in 2024?", "What was Apple's return in 2024?",
+     "Apple share price performance 2024", "How much did Apple stock gain in 2024?"],
+    ["How did Nvidia stock perform in 2024?", "What was Nvidia's return in 2024?",
+     "Nvidia share price performance 2024", "How much did Nvidia stock gain in 2024?"],
+    ["What was the worst performing sector in 2024?", "Which sector lagged the market in 2024?",
+     "Which sector did worst in 2024?", "Weakest sector of 2024?"],
+    ["How did small caps perform in 2024?", "What was the Russell 2000 return in 2024?",
+     "Small cap stock performance 2024", "How did the Russell 2000 do in 2024?"],
+]
+
+
+def hashed_embedding(text: str, dim: int = 512) -> np.ndarray:
+    """Hashed bag of words and bigrams, L2-normalized."""
+    words = re.findall(r"[a-z0-9&']+", text.lower())
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature in features:
+        digest = hashlib.md5(feature.encode("utf-8")).digest()
+        index = int.from_bytes(digest[:4], "little") % dim
+        vector[index] += 1.0 if digest[4] & 1 else -1.0
+    return vector / (np.linalg.norm(vector) or 1.0)
+
+
+def run(threshold: float, workload, agent_latency: float, max_entries: int):
+    cache = SemanticAnswerCache(threshold=threshold, max_entries=max_entries)
+    wrong = 0
+    paraphrase = 0
+    lookup_time = 0.0
+    for intent, question in workload:
+        vector = hashed_embedding(question)
+        started = time.perf_counter()
+        entry = cache.lookup(vector, "v1")
+        lookup_time += time.perf_counter() - started
+        if entry is None:
+            cache.store(question, vector, "v1", [intent])
+        elif entry["messages"][0] != intent:
+            wrong += 1
+        elif entry["question"] != question:
+            paraphrase += 1
+
+    stats = cache.stats()
+    misses = stats["misses"]
+    mean_latency = (misses * agent_latency + lookup_time) / len(workload)
+    return (
+        stats["hit_rate"],
+        paraphrase / len(workload),
+        wrong / len(workload),
+        mean_latency,
+        lookup_time / len(workload),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Semantic cache hit-rate / latency trade-off")
+    parser.add_argument("--questions", type=int, default=2000)
+    parser.add_argument("--agent-latency", type=float, default=4.0, help="Seconds per uncached agent run")
+    parser.add_argument("--max-entries", type=int, default=512)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    workload = []
+    for _ in range(args.questions):
+        intent = rng.randrange(len(INTENTS))
+        workload.append((intent, rng.choice(INTENTS[intent])))
+
+    print(f"{args.questions} questions over {len(INTENTS)} intents, {args.agent_latency:.1f} s per agent run")
+    print(f"{'threshold':>10}{'hit rate':>10}{'paraphrase':>12}{'wrong':>10}{'mean latency (s)':>18}{'lookup (us)':>13}")
+    for threshold in (0.99, 0.95, 0.90, 0.80, 0.70, 0.60, 0.50):
+        hit_rate, paraphrase_rate, wrong_rate, mean_latency, lookup = run(
+            threshold, workload, args.agent_latency, args.max_entries
+        )
+        print(
+            f"{threshold:>10.2f}{hit_rate:>10.1%}{paraphrase_rate:>12.1%}{wrong_rate:>10.1%}"
+            f"{mean_latency:>18.3f}{lookup * 1e6:>13.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Latency benchmark for speculative retrieval.
+
+Runs questions through the async agent against the local fake OpenAI server
+with the router off, so every question starts with a tool-deciding LLM call,
+once without and once with SPECULATIVE_RETRIEVAL_ENABLED. The fake model
+calls the tool with the question's own text, then (in --require-evidence
+mode) re-queries with extra terms, which speculation can't serve. Each
+retrieval costs one fake embeddings call.
+
+Usage:
+    python src/scripts/bench_speculative_retrieval.py --latency 0.3
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.scripts.fake_openai_server import start_in_thread
+from src.scripts.bench_hybrid_retrieval import EVAL_SET
+
+
+async def run_questions(agent):
+    latencies = []
+    for question, _ in EVAL_SET:
+        started = time.perf_counter()
+        await agent.ainvoke(question)
+        latencies.append(time.perf_counter() - started)
+    return {"p50": statistics.median(latencies), "total": sum(latencies)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark speculative retrieval")
+    parser.add_argument("--latency", type=float, default=0.3, help="Fake server latency per call (s)")
+    parser.add_argument("--port", type=int, default=8772)
+    parser.add_argument("--require-evidence", action="store_true", help="Fake model re-queries for missing terms")
+    args = parser.parse_args()
+
+    start_in_thread(port=args.port, latency=args.latency, require_evidence=args.require_evidence)
+    os.environ["OPENAI_API_KEY"] = "sk-fake"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+
+    from src.agents.rag_agent import build_rag_agent
+    from src.config.settings import with_overrides
+
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="rag-speculative-") as tmp:
+        for label, enabled in (("off", False), ("speculative", True)):
+            settings = with_overrides(
+                VECTORSTORE_DIR=Path(tmp),
+                ROUTER_ENABLED=False,
+                SPECULATIVE_RETRIEVAL_ENABLED=enabled,
+                EMBEDDING_CHECK_CTX_LENGTH=False,
+            )
+            agent = build_rag_agent(settings)
+            result = asyncio.run(run_questions(agent))
+            rows.append((label, result, agent.metrics()["speculative_retrieval"]))
+
+    print(f"\n{len(EVAL_SET)} questions, {args.latency * 1000:.0f} ms per fake API call"
+          f"{', fake model re-queries for missing terms' if args.require_evidence else ''}")
+    print(f"{'mode':<13}{'p50 (s)':>9}{'total (s)':>11}{'hit rate':>10}{'saved p50 (ms)':>16}{'unused':>8}")
+    for label, result, stats in rows:
+        stats = stats or {"hit_rate": 0.0, "saved_ms_p50": 0.0, "unused": 0}
+        print(
+            f"{label:<13}{result['p50']:>9.2f}{result['total']:>11.2f}{stats['hit_rate']:>10.2f}"
+            f"{stats['saved_ms_p50']:>16.0f}{stats['unused']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
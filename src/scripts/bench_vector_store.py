@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Chroma vs the in-process NumPy vector store: recall@5, latency and memory.
+
+Generates a clustered synthetic corpus (unit vectors around random topic
+centers, like chunk embeddings) and queries near corpus vectors, with exact
+top-5 ground truth from brute force. Each backend is built in one
+subprocess and queried in a fresh one, so the resident memory reported is
+what opening the store and serving the queries added to the process.
+
+- single query: similarity_search_by_vector (the retriever path, documents included)
+- batch: all queries at once (Chroma's query() with query_embeddings,
+  NumpyVectorStore.search_by_vectors)
+
+Usage:
+    python src/scripts/bench_vector_store.py --chunks 100000 --dim 384
+    python src/scripts/bench_vector_store.py --chunks 300000 --dim 1536 --backends chroma numpy-int8
+"""
+
+import argparse
+import json
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+BACKENDS = ["chroma", "numpy-float32", "numpy-float16", "numpy-int8"]
+K = 5
+
+
+def rss_mb() -> float:
+    """Current resident set size (peak RSS where /proc isn't available)."""
+    try:
+        with open("/proc/self/status", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def make_data(path: Path, chunks: int, dim: int, queries: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(chunks // 200, 1), dim)).astype(np.float32)
+    corpus = centers[rng.integers(0, len(centers), chunks)] + 0.6 * rng.normal(size=(chunks, dim)).astype(np.float32)
+    corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+    picked = rng.integers(0, chunks, queries)
+    query_vectors = corpus[picked] + 0.05 * rng.normal(size=(queries, dim)).astype(np.float32)
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    truth = np.argsort(-(query_vectors @ corpus.T), axis=1)[:, :K]
+    np.save(path / "corpus.npy", corpus)
+    np.savez(path / "queries.npz", queries=query_vectors, truth=truth)
+
+
+def open_store(backend: str, path: Path):
+    if backend == "chroma":
+        from langchain_chroma import Chroma
+
+        return Chroma(collection_name="bench", persist_directory=str(path))
+    from src.retrieval.numpy_store import NumpyVectorStore
+
+    return NumpyVectorStore(path, dtype=backend.split("-")[1])
+
+
+def build(backend: str, data_dir: Path, store_dir: Path):
+    corpus = np.load(data_dir / "corpus.npy")
+    store = open_store(backend, store_dir)
+    started = time.perf_counter()
+    for start in range(0, len(corpus), 5000):
+        ids = [f"chunk-{i}" for i in range(start, min(start + 5000, len(corpus)))]
+        texts = [f"Chunk {i} text" for i in range(start, start + len(ids))]
+        metadatas = [{"source": f"doc-{i // 100}.pdf", "page": i % 100} for i in range(start, start + len(ids))]
+        vectors = corpus[start:start + len(ids)]
+        if backend == "chroma":
+            store._collection.upsert(ids=ids, embeddings=vectors, documents=texts, metadatas=metadatas)
+        else:
+            store.upsert_embeddings(ids, vectors, texts, metadatas)
+    print(json.dumps({"build_s": time.perf_counter() - started}))
+
+
+def query(backend: str, data_dir: Path, store_dir: Path):
+    data = np.load(data_dir / "queries.npz")
+    queries, truth = data["queries"], data["truth"]
+    baseline = rss_mb()
+    store = open_store(backend, store_dir)
+
+    latencies, hits = [], 0
+    for vector, expected in zip(queries, truth):
+        started = time.perf_counter()
+        docs = store.similarity_search_by_vector(vector.tolist(), k=K)
+        latencies.append(time.perf_counter() - started)
+        found = {int(doc.id.split("-")[1]) for doc in docs}
+        hits += len(found & set(expected.tolist()))
+
+    started = time.perf_counter()
+    if backend == "chroma":
+        store._collection.query(query_embeddings=queries, n_results=K, include=["distances"])
+    else:
+        store.search_by_vectors(queries, k=K)
+    batch_s = time.perf_counter() - started
+
+    latencies.sort()
+    print(json.dumps({
+        "recall": hits / (K * len(queries)),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)] * 1000,
+        "batch_qps": len(queries) / batch_s,
+        "rss_mb": rss_mb() - baseline,
+    }))
+
+
+def disk_mb(path: Path) -> float:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file()) / (1024 * 1024)
+
+
+def run_child(*args) -> dict:
+    output = subprocess.run(
+        [sys.executable, __file__, *args], check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Chroma against the NumPy vector store")
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--backends", nargs="+", default=BACKENDS, choices=BACKENDS)
+    parser.add_argument("--child", nargs=4, metavar=("STEP", "BACKEND", "DATA_DIR", "STORE_DIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        step, backend, data_dir, store_dir = args.child
+        (build if step == "build" else query)(backend, Path(data_dir), Path(store_dir))
+        return
+
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="rag-vector-store-") as tmp:
+        tmp = Path(tmp)
+        make_data(tmp, args.chunks, args.dim, args.queries)
+        for backend in args.backends:
+            store_dir = tmp / backend
+            built = run_child("--child", "build", backend, str(tmp), str(store_dir))
+            measured = run_child("--child", "query", backend, str(tmp), str(store_dir))
+            rows.append((backend, built, measured, disk_mb(store_dir)))
+            shutil.rmtree(store_dir, ignore_errors=True)
+
+    print(f"\n{args.chunks} chunks x {args.dim} dims, {args.queries} queries, top-{K}")
+    print(f"{'backend':<15}{'recall@5':>9}{'p50 (ms)':>10}{'p99 (ms)':>10}{'batch q/s':>11}"
+          f"{'RSS (MB)':>10}{'disk (MB)':>11}{'build (s)':>11}")
+    for backend, built, measured, disk in rows:
+        print(
+            f"{backend:<15}{measured['recall']:>9.3f}{measured['p50_ms']:>10.2f}{measured['p99_ms']:>10.2f}"
+            f"{measured['batch_qps']:>11.0f}{measured['rss_mb']:>10.0f}{disk:>11.0f}{built['build_s']:>11.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
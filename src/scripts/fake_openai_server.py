@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Local fake OpenAI-compatible server for benchmarks.
+
+Serves /v1/chat/completions (plain and streaming) and /v1/embeddings with a
+configurable artificial latency, so the agent can be load-tested offline.
+The fake model calls retriever_tool once and answers after the tool result,
+or, with --require-evidence, keeps re-querying while the retrieved text lacks
+the tickers and figures the question asks about.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+EMBEDDING_DIM = 64
+
+
+def fake_embedding(text: str, dim: int = EMBEDDING_DIM):
+    """Deterministic unit vector derived from the text hash."""
+    seed = hashlib.sha256(text.encode("utf-8")).digest()
+    values = [(seed[i % len(seed)] - 127.5) / 127.5 + math.sin(i) for i in range(dim)]
+    norm = math.sqrt(sum(v * v for v in values)) or 1.0
+    return [v / norm for v in values]
+
+
+def _key_terms(question: str):
+    """Terms a grounded answer must find: tickers, capitalized names and figures."""
+    words = re.findall(r"[A-Za-z0-9&$%.-]+", question)
+    return [
+        word.strip(".").lower() for word in words
+        if any(ch.isdigit() for ch in word) or (len(word) > 1 and word.isupper())
+    ]
+
+
+def _next_message(
+    messages,
+    require_evidence: bool = False,
+    max_tool_calls: int = 3,
+    tool_names=("retriever_tool",),
+):
+    """
+    Call the tools on the first turn (each offered tool once), answer once a tool result is present.
+
+    With require_evidence the fake model behaves like one that re-queries when
+    the retrieved text doesn't mention the ticker or figure it asked about,
+    up to max_tool_calls retrieval turns.
+    """
+    question = next(
+        (m.get("content") for m in reversed(messages) if m.get("role") == "user"),
+        "stock market 2024",
+    )
+    if isinstance(question, list):
+        question = " ".join(part.get("text", "") for part in question)
+
+    # Only this question's retrievals count; a thread also carries earlier turns
+    last_user = max((i for i, m in enumerate(messages) if m.get("role") == "user"), default=-1)
+    tool_results = [m for m in messages[last_user + 1:] if m.get("role") == "tool"]
+    tool_turns = sum(1 for m in messages[last_user + 1:] if m.get("role") == "assistant" and m.get("tool_calls"))
+    if messages and messages[-1].get("role") == "tool":
+        # The results of every tool called on the last turn
+        last_turn = max((i for i, m in enumerate(messages) if m.get("role") != "tool"), default=-1)
+        evidence = ""
+        for message in messages[last_turn + 1:]:
+            content = message.get("content") or ""
+            if isinstance(content, list):
+                content = " ".join(part.get("text", "") for part in content)
+            evidence += f"{content}\n"
+        missing = [term for term in _key_terms(question) if term not in evidence.lower()]
+        if not require_evidence or not missing or tool_turns >= max_tool_calls:
+            return {"content": "Based on the document, the S&P 500 gained 23% in 2024.", "tool_calls": None}
+        query = f"{question} {' '.join(missing)}"
+    else:
+        query = question
+
+    return {
+        "content": None,
+        "tool_calls": [{
+            "id": f"call_{hashlib.md5(f'{name}{query}{len(tool_results)}'.encode('utf-8')).hexdigest()[:12]}",
+            "type": "function",
+            "function": {"name": name, "arguments": json.dumps({"query": query})},
+        } for name in tool_names],
+    }
+
+
+def _prompt_tokens(messages) -> int:
+    """Rough prompt size (~4 characters per token) of a chat request."""
+    chars = 0
+    for message in messages:
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content)
+        chars += len(content)
+    return chars // 4
+
+
+def create_app(
+    latency: float = 0.2,
+    rate_limit_every: int = 0,
+    require_evidence: bool = False,
+    prefill_per_1k_tokens: float = 0.0,
+    max_tool_calls: int = 3,
+    max_concurrent_chat: int = 0,
+) -> FastAPI:
+    """
+    Build the fake server app.
+
+    Args:
+        latency (float): Seconds to wait before answering each request
+        rate_limit_every (int): Answer every Nth embeddings request with a
+            429 and a Retry-After header (0 disables)
+        require_evidence (bool): Re-query when the tool result lacks the
+            question's tickers and figures (see _next_message)
+        prefill_per_1k_tokens (float): Extra chat latency per 1000 prompt
+            tokens, like a real model's prompt processing time
+        max_tool_calls (int): Retrieval turns before a require_evidence
+            model gives up and answers
+        max_concurrent_chat (int): Answer chat requests beyond this many in
+            flight with a 429, like a provider's concurrency limit (0 disables)
+
+    Returns:
+        FastAPI: The application
+    """
+    app = FastAPI(title="Fake OpenAI")
+    app.state.requests = {"chat": 0, "embeddings": 0, "embedded_inputs": 0, "rate_limited": 0, "prompt_tokens": 0}
+    app.state.chat_in_flight = 0
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body["input"]
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        app.state.requests["embeddings"] += 1
+        if rate_limit_every and app.state.requests["embeddings"] % rate_limit_every == 0:
+            app.state.requests["rate_limited"] += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}},
+                status_code=429,
+                headers={"retry-after": "0.1"},
+            )
+        app.state.requests["embedded_inputs"] += len(inputs)
+        await asyncio.sleep(latency)
+
+        data = []
+        for i, item in enumerate(inputs):
+            # Token arrays are sent when tiktoken is used for length checks
+            text = item if isinstance(item, str) else " ".join(str(t) for t in item)
+            data.append({"object": "embedding", "index": i, "embedding": fake_embedding(text)})
+        return JSONResponse({
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "fake-embedding"),
+            "usage": {"prompt_tokens": len(inputs), "total_tokens": len(inputs)},
+        })
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests["chat"] += 1
+        if max_concurrent_chat and app.state.chat_in_flight >= max_concurrent_chat:
+            app.state.requests["rate_limited"] += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}},
+                status_code=429,
+                headers={"retry-after": "0.5"},
+            )
+        prompt_tokens = _prompt_tokens(body.get("messages", []))
+        app.state.requests["prompt_tokens"] += prompt_tokens
+        if body.get("tools"):
+            tool_names = [tool["function"]["name"] for tool in body["tools"]]
+            message = _next_message(body.get("messages", []), require_evidence, max_tool_calls, tool_names)
+        else:
+            # Without tools (e.g. a routed small-talk turn) there is nothing to call
+            message = {"content": "Hello! Ask me anything about the 2024 stock market.", "tool_calls": None}
+        model = body.get("model", "fake-gpt")
+        created = int(time.time())
+        # Unique like the real API: message IDs must not collide within a conversation thread
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        app.state.chat_in_flight += 1
+        try:
+            await asyncio.sleep(latency + prefill_per_1k_tokens * prompt_tokens / 1000)
+        finally:
+            app.state.chat_in_flight -= 1
+
+        if not body.get("stream"):
+            finish_reason = "tool_calls" if message["tool_calls"] else "stop"
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", **message},
+                    "finish_reason": finish_reason,
+                }],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 10, "total_tokens": prompt_tokens + 10},
+            })
+
+        async def sse():
+            def chunk(delta, finish_reason=None):
+                payload = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                }
+                return f"data: {json.dumps(payload)}\n\n"
+
+            if message["tool_calls"]:
+                tool_calls = [dict(call, index=i) for i, call in enumerate(message["tool_calls"])]
+                yield chunk({"role": "assistant", "content": None, "tool_calls": tool_calls})
+                yield chunk({}, "tool_calls")
+            else:
+                yield chunk({"role": "assistant", "content": ""})
+                for word in message["content"].split(" "):
+                    yield chunk({"content": f"{word} "})
+                yield chunk({}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(sse(), media_type="text/event-stream")
+
+    return app
+
+
+def start_in_thread(
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    latency: float = 0.2,
+    rate_limit_every: int = 0,
+    require_evidence: bool = False,
+    prefill_per_1k_tokens: float = 0.0,
+    max_tool_calls: int = 3,
+    max_concurrent_chat: int = 0,
+) -> uvicorn.Server:
+    """Start the fake server on a daemon thread and wait until it accepts requests."""
+    app = create_app(
+        latency, rate_limit_every, require_evidence, prefill_per_1k_tokens, max_tool_calls, max_concurrent_chat
+    )
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a fake OpenAI-compatible server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds of artificial latency per request")
+    parser.add_argument("--rate-limit-every", type=int, default=0,
+                        help="Answer every Nth embeddings request with a 429")
+    parser.add_argument("--require-evidence", action="store_true",
+                        help="Re-query when tool results lack the question's tickers and figures")
+    parser.add_argument("--prefill-per-1k-tokens", type=float, default=0.0,
+                        help="Extra chat latency (s) per 1000 prompt tokens")
+    parser.add_argument("--max-tool-calls", type=int, default=3,
+                        help="Retrieval turns before a --require-evidence model answers")
+    parser.add_argument("--max-concurrent-chat", type=int, default=0,
+                        help="Answer chat requests beyond this many in flight with a 429")
+    args = parser.parse_args()
+    app = create_app(
+        args.latency, args.rate_limit_every, args.require_evidence, args.prefill_per_1k_tokens,
+        args.max_tool_calls, args.max_concurrent_chat,
+    )
+    uvicorn.run(app, host=args.host, port=args.port)
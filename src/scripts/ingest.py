@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Standalone ingestion CLI.
+
+Indexes every PDF under the data directory into the vector store the API
+serves from (VECTOR_STORE_BACKEND) (and the BM25, metadata and fact indexes used at query time), printing progress and throughput (pages/s, chunks/s).
+Only new or changed files are parsed and embedded, with bounded concurrency,
+rate limiting and 429 backoff; an interrupted run resumes from its
+checkpoint. See src/ingestion.
+
+With --collection, indexes a collection under COLLECTIONS_DIR into its own
+store instead, so the API doesn't sync it on the first request selecting it.
+
+Usage:
+    python src/scripts/ingest.py
+    python src/scripts/ingest.py --data-dir /path/to/filings --workers 8 --batch-size 256
+    python src/scripts/ingest.py --collection client_a_2024
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from dotenv import load_dotenv
+from langchain_openai import OpenAIEmbeddings
+
+from src.agents.collections import collection_settings
+from src.config import settings as default_settings
+from src.ingestion.facts import extract_file_facts
+from src.ingestion.pipeline import discover_sources, run_ingestion
+from src.ingestion.writer import EmbeddingBatchWriter
+from src.retrieval.bm25 import load_or_build_bm25
+from src.retrieval.facts import load_or_build_fact_index
+from src.retrieval.filters import load_or_build_metadata_index
+from src.retrieval.stores import ingestion_paths, open_vectorstore
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index PDFs into the vector store")
+    parser.add_argument("--collection", default=default_settings.COLLECTION_NAME,
+                        help="Collection to index (a directory under COLLECTIONS_DIR, or the default collection)")
+    parser.add_argument("--data-dir", help="Directory searched for source files (default: the collection's)")
+    parser.add_argument("--workers", type=int, default=default_settings.INGEST_WORKERS, help="Parser processes")
+    parser.add_argument("--batch-size", type=int, default=default_settings.INGEST_BATCH_SIZE, help="Chunks per write")
+    parser.add_argument("--max-inflight", type=int, default=default_settings.INGEST_MAX_INFLIGHT,
+                        help="Concurrent embedding requests")
+    parser.add_argument("--rpm", type=float, default=default_settings.INGEST_REQUESTS_PER_MINUTE,
+                        help="Embedding requests per minute")
+    parser.add_argument("--tpm", type=float, default=default_settings.INGEST_TOKENS_PER_MINUTE,
+                        help="Embedding tokens per minute")
+    args = parser.parse_args()
+
+    load_dotenv()
+    settings = collection_settings(default_settings, args.collection)
+    data_dir = Path(args.data_dir or settings.DATA_DIR)
+    sources = discover_sources(data_dir, settings.INGEST_FILE_PATTERNS)
+    print(f"Found {len(sources)} source files under {data_dir} (collection {args.collection!r})")
+
+    settings.VECTORSTORE_DIR.mkdir(parents=True, exist_ok=True)
+    # Retries on 429 are handled by the writer's backoff, not the client
+    embeddings = OpenAIEmbeddings(
+        model=settings.EMBEDDING_MODEL,
+        check_embedding_ctx_length=settings.EMBEDDING_CHECK_CTX_LENGTH,
+        max_retries=0,
+    )
+    vectorstore = open_vectorstore(settings, embeddings)
+    manifest_path, checkpoint_path = ingestion_paths(settings)
+    writer = EmbeddingBatchWriter(
+        vectorstore,
+        embeddings,
+        request_size=settings.INGEST_EMBED_REQUEST_SIZE,
+        max_inflight=args.max_inflight,
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+        max_retries=settings.INGEST_MAX_RETRIES,
+        backoff_base=settings.INGEST_BACKOFF_BASE_SECONDS,
+        checkpoint_path=checkpoint_path,
+    )
+
+    stats = run_ingestion(
+        writer,
+        sources,
+        {"chunk_size": settings.CHUNK_SIZE, "chunk_overlap": settings.CHUNK_OVERLAP},
+        manifest_path,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        existing_ids=lambda: vectorstore.get(include=[])["ids"],
+    )
+    print(f"Embedding requests: {writer.stats}")
+
+    def fetch_chunks():
+        found = vectorstore.get(include=["documents"])
+        return found["ids"], found["documents"]
+
+    # Rebuilt only when the collection changed; the API loads it at startup
+    load_or_build_bm25(
+        settings.BM25_INDEX_PATH, stats["version"], fetch_chunks, k1=settings.BM25_K1, b=settings.BM25_B
+    )
+    if settings.METADATA_FILTERS_ENABLED:
+
+        def fetch_metadatas():
+            found = vectorstore.get(include=["metadatas"])
+            return found["ids"], found["metadatas"]
+
+        load_or_build_metadata_index(settings.METADATA_INDEX_PATH, stats["version"], fetch_metadatas)
+    if settings.FACT_INDEX_ENABLED:
+        # Only files whose hash changed are read again
+        load_or_build_fact_index(settings.FACT_INDEX_DIR, sources, extract_file_facts)
+    if hasattr(vectorstore, "wait_for_index"):
+        # The IVF index trains in a background thread; let it finish and save its centroids
+        vectorstore.wait_for_index()
+    print(
+        f"Done: {stats['files_parsed']} files parsed, {stats['pages']} pages, "
+        f"{stats['added']} chunks added, {stats['deleted']} deleted, {stats['unchanged']} unchanged "
+        f"(collection version {stats['version']})"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Render the RAG agent graph.
+
+PNG output goes through the remote mermaid.ink service, so it needs network
+access; --mermaid prints the Mermaid source instead and works offline.
+
+Usage:
+    python src/scripts/render_graph.py               # writes rag_agent.png in the repo root
+    python src/scripts/render_graph.py -o graph.png
+    python src/scripts/render_graph.py --mermaid
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.agents.rag_agent import build_rag_agent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render the RAG agent graph")
+    parser.add_argument("-o", "--output", default=str(project_root / "rag_agent.png"), help="PNG file to write")
+    parser.add_argument("--mermaid", action="store_true", help="Print Mermaid source instead of rendering a PNG")
+    args = parser.parse_args()
+
+    graph = build_rag_agent().graph.get_graph()
+    if args.mermaid:
+        print(graph.draw_mermaid())
+        return
+
+    png_data = graph.draw_mermaid_png()
+    with open(args.output, "wb") as f:
+        f.write(png_data)
+    print(f"Graph image saved as: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import asyncio
+
+import pytest
+
+from src.backend.api.admission import AdmissionController, AdmissionRejected
+
+
+async def settle():
+    # Let queued tasks run up to their next await
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_admits_up_to_max_concurrency_then_queues():
+    async def run():
+        controller = AdmissionController(max_concurrency=1)
+        first = await controller.acquire("a")
+        waiter = asyncio.create_task(controller.acquire("b"))
+        await settle()
+        assert not waiter.done() and controller.stats()["queue_depth"] == 1
+
+        first.release()
+        second = await waiter
+        # The slot passed straight to the waiter
+        assert controller.active == 1
+        second.release()
+        second.release()
+        assert controller.active == 0
+        assert controller.counters["admitted"] == 2 and controller.counters["queued"] == 1
+
+    asyncio.run(run())
+
+
+def test_slots_go_round_robin_between_clients():
+    async def run():
+        controller = AdmissionController(max_concurrency=1)
+        running = await controller.acquire("busy")
+        order = []
+
+        async def request(client, name):
+            ticket = await controller.acquire(client)
+            order.append(name)
+            await asyncio.sleep(0)
+            ticket.release()
+
+        tasks = [asyncio.create_task(request("busy", f"busy{i}")) for i in range(3)]
+        await settle()
+        tasks.append(asyncio.create_task(request("quiet", "quiet")))
+        await settle()
+        running.release()
+        await asyncio.gather(*tasks)
+        # "quiet" doesn't wait behind every queued request of "busy"
+        assert order == ["busy0", "quiet", "busy1", "busy2"]
+        assert controller.active == 0
+
+    asyncio.run(run())
+
+
+def test_429_for_a_client_over_its_share_503_for_a_full_queue():
+    async def run():
+        controller = AdmissionController(max_concurrency=1, max_queue=3, max_queued_per_client=2)
+        await controller.acquire("a")
+        tasks = [asyncio.create_task(controller.acquire("a")) for _ in range(2)]
+        await settle()
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("a")
+        assert rejected.value.status_code == 429
+
+        tasks.append(asyncio.create_task(controller.acquire("b")))
+        await settle()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("c")
+        assert rejected.value.status_code == 503
+        assert controller.counters["rejected_429"] == 1 and controller.counters["rejected_503"] == 1
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        assert controller.stats()["queue_depth"] == 0
+
+    asyncio.run(run())
+
+
+def test_retry_after_grows_with_the_queue():
+    async def run():
+        controller = AdmissionController(max_concurrency=1)
+        controller._service_time = 2.0
+        assert controller.retry_after() == 2
+        await controller.acquire("a")
+        tasks = [asyncio.create_task(controller.acquire(f"c{i}")) for i in range(3)]
+        await settle()
+        # Three waiting plus the new request, one at a time, 2 s each
+        assert controller.retry_after() == 8
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run(run())
+
+
+def test_wait_times_out_with_503():
+    async def run():
+        controller = AdmissionController(max_concurrency=1, queue_timeout=0.01)
+        await controller.acquire("a")
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("b")
+        assert rejected.value.status_code == 503
+        assert rejected.value.retry_after >= 1
+        assert controller.counters["timed_out"] == 1
+        assert controller.stats()["queue_depth"] == 0
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def run():
+        controller = AdmissionController(max_concurrency=1)
+        running = await controller.acquire("a")
+        waiter = asyncio.create_task(controller.acquire("b"))
+        await settle()
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert controller.stats()["queue_depth"] == 0 and controller.stats()["queued_clients"] == 0
+        running.release()
+        assert controller.active == 0
+
+    asyncio.run(run())
+
+
+def test_slot_handed_to_a_cancelled_waiter_passes_on():
+    async def run():
+        controller = AdmissionController(max_concurrency=1)
+        running = await controller.acquire("a")
+        first = asyncio.create_task(controller.acquire("b"))
+        await settle()
+        second = asyncio.create_task(controller.acquire("c"))
+        await settle()
+
+        # The slot goes to the first waiter, which is cancelled before it resumes
+        running.release()
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        assert first.cancelled()
+
+        ticket = await asyncio.wait_for(second, 1)
+        assert controller.active == 1
+        ticket.release()
+        assert controller.active == 0 and controller.stats()["queue_depth"] == 0
+
+    asyncio.run(run())
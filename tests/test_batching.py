@@ -0,0 +1,71 @@
+import asyncio
+import threading
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from src.retrieval.batching import MicroBatchingEmbeddings
+
+
+class FakeEmbeddings(Embeddings):
+    """Vectors from the text length; records every request."""
+
+    def __init__(self, gate: threading.Event = None):
+        self.requests = []
+        self.gate = gate
+
+    def embed_documents(self, texts):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.requests.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def test_concurrent_queries_share_one_request():
+    inner = FakeEmbeddings()
+    embeddings = MicroBatchingEmbeddings(inner, window_ms=50)
+
+    async def run():
+        return await asyncio.gather(*(embeddings.aembed_query(text) for text in ("a", "bb", "a", "ccc")))
+
+    assert asyncio.run(run()) == [[1.0], [2.0], [1.0], [3.0]]
+    # Identical queries in the same window share one input
+    assert inner.requests == [["a", "bb", "ccc"]]
+    assert embeddings.stats() == {"batches": 1, "queries": 4}
+    embeddings.close()
+
+
+def test_errors_reach_every_caller():
+    class Failing(FakeEmbeddings):
+        def embed_documents(self, texts):
+            raise ValueError("rate limited")
+
+    embeddings = MicroBatchingEmbeddings(Failing())
+    with pytest.raises(ValueError):
+        embeddings.embed_query("a")
+    embeddings.close()
+
+
+def test_close_finishes_pending_queries_then_rejects_new_ones():
+    gate = threading.Event()
+    embeddings = MicroBatchingEmbeddings(FakeEmbeddings(gate), window_ms=1)
+    pending = embeddings._submit("abc")
+    closing = threading.Thread(target=embeddings.close)
+    closing.start()
+    gate.set()
+    closing.join(5)
+    assert not closing.is_alive()
+    assert pending.result(timeout=1) == [3.0]
+    with pytest.raises(RuntimeError):
+        embeddings.embed_query("abc")
+    assert not [thread for thread in threading.enumerate() if thread.name.startswith("embed-")]
+
+
+def test_close_without_queries():
+    embeddings = MicroBatchingEmbeddings(FakeEmbeddings())
+    embeddings.close()
+    with pytest.raises(RuntimeError):
+        embeddings.embed_query("a")
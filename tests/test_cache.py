@@ -0,0 +1,76 @@
+import asyncio
+
+from langchain_core.embeddings import Embeddings
+
+from src.retrieval.cache import LRUCache, RetrievalCache, SQLiteLRUCache
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self, dimensions: int = 2):
+        self.dimensions = dimensions
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += len(texts)
+        return [[float(len(text))] * self.dimensions for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats() == {"hits": 3, "misses": 1, "entries": 2}
+
+
+def test_ttl_expires_entries():
+    cache = LRUCache(ttl_seconds=0)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+
+
+def test_sqlite_cache_survives_reopen(tmp_path):
+    path = tmp_path / "cache.sqlite"
+    SQLiteLRUCache(path, "embedding", max_entries=2).set("a", [1.0])
+    cache = SQLiteLRUCache(path, "embedding", max_entries=2)
+    assert cache.get("a") == [1.0]
+    # Namespaces share the file but not their entries
+    assert SQLiteLRUCache(path, "results").get("a") is None
+    cache.set("b", [2.0])
+    cache.set("c", [3.0])
+    assert len(cache) == 2
+
+
+def test_query_embeddings_are_cached_by_normalized_text():
+    cache = RetrievalCache("v1", embedding_model="small")
+    embeddings = CountingEmbeddings()
+    assert cache.embed_query(embeddings, "How did  NVDA do?") == [17.0, 17.0]
+    assert asyncio.run(cache.aembed_query(embeddings, "how did nvda do?")) == [17.0, 17.0]
+    assert embeddings.calls == 1
+
+
+def test_other_embedding_model_misses(tmp_path):
+    path = tmp_path / "cache.sqlite"
+    RetrievalCache("v1", "sqlite", path, embedding_model="small").embed_query(CountingEmbeddings(2), "nvda")
+
+    embeddings = CountingEmbeddings(3)
+    cache = RetrievalCache("v1", "sqlite", path, embedding_model="large")
+    assert cache.embed_query(embeddings, "nvda") == [4.0, 4.0, 4.0]
+    assert embeddings.calls == 1
+    # The old model's vectors are dropped on open
+    assert len(cache.embeddings) == 1
+
+
+def test_new_collection_version_drops_results(tmp_path):
+    path = tmp_path / "cache.sqlite"
+    old = RetrievalCache("v1", "sqlite", path)
+    old.results.set(old.result_key([1.0], 5), ["chunk"])
+    new = RetrievalCache("v2", "sqlite", path)
+    assert len(new.results) == 0
+    assert new.result_key([1.0], 5) != old.result_key([1.0], 5)
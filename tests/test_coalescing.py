@@ -0,0 +1,124 @@
+import asyncio
+
+from langchain_core.messages import AIMessage
+
+from src.agents.coalescing import SingleFlight, flight_key
+
+
+def make_run(started: list, release: asyncio.Event, fail: bool = False):
+    """A fake graph run: two events around a wait, then one message."""
+
+    async def run(messages):
+        started.append(True)
+        yield {"type": "text", "data": "first"}
+        await release.wait()
+        if fail:
+            raise RuntimeError("LLM down")
+        messages.append(AIMessage(content="answer"))
+        yield {"type": "text", "data": "second"}
+
+    return run
+
+
+async def collect(events):
+    return [event async for event in events]
+
+
+def test_flight_key_normalizes_question():
+    assert flight_key("How did  NVDA do?", "v1") == flight_key("how did nvda do?", "v1")
+    assert flight_key("How did NVDA do?", "v1") != flight_key("How did NVDA do?", "v2")
+
+
+def test_concurrent_requests_share_one_run():
+    async def run():
+        flights, started, release = SingleFlight(), [], asyncio.Event()
+        key = flight_key("q", "v1")
+        first = asyncio.create_task(collect(flights.events(key, make_run(started, release))))
+        await asyncio.sleep(0.01)
+        # Joins late: gets the first event replayed, then the live one
+        late = asyncio.create_task(collect(flights.events(key, make_run(started, release))))
+        blocking = asyncio.create_task(flights.result(key, make_run(started, release)))
+        await asyncio.sleep(0.01)
+        release.set()
+
+        expected = [{"type": "text", "data": "first"}, {"type": "text", "data": "second"}]
+        assert await first == expected and await late == expected
+        assert [message.content for message in await blocking] == ["answer"]
+        assert len(started) == 1
+        stats = flights.stats()
+        assert stats["runs"] == 1 and stats["coalesced"] == 2 and stats["replayed_events"] == 2
+        assert stats["in_flight"] == 0
+
+    asyncio.run(run())
+
+
+def test_events_hand_back_the_run_messages():
+    async def run():
+        flights, release = SingleFlight(), asyncio.Event()
+        release.set()
+        messages = []
+        await collect(flights.events(flight_key("q", "v1"), make_run([], release), messages))
+        assert [message.content for message in messages] == ["answer"]
+
+    asyncio.run(run())
+
+
+def test_finished_run_frees_the_key():
+    async def run():
+        flights, started, release = SingleFlight(), [], asyncio.Event()
+        release.set()
+        key = flight_key("q", "v1")
+        await flights.result(key, make_run(started, release))
+        await flights.result(key, make_run(started, release))
+        assert len(started) == 2
+
+    asyncio.run(run())
+
+
+def test_errors_reach_every_subscriber():
+    async def run():
+        flights, release = SingleFlight(), asyncio.Event()
+        key = flight_key("q", "v1")
+        tasks = [asyncio.create_task(flights.result(key, make_run([], release, fail=True))) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        release.set()
+        for outcome in await asyncio.gather(*tasks, return_exceptions=True):
+            assert isinstance(outcome, RuntimeError)
+
+    asyncio.run(run())
+
+
+def test_run_is_cancelled_when_the_last_subscriber_leaves():
+    async def run():
+        flights, started, release = SingleFlight(), [], asyncio.Event()
+        key = flight_key("q", "v1")
+        subscribers = [asyncio.create_task(flights.result(key, make_run(started, release))) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        flight = flights._flights[key]
+
+        subscribers[0].cancel()
+        await asyncio.gather(subscribers[0], return_exceptions=True)
+        assert not flight.task.done()
+
+        subscribers[1].cancel()
+        await asyncio.gather(subscribers[1], return_exceptions=True)
+        await asyncio.sleep(0)
+        assert flight.task.cancelled()
+        assert flights.stats()["in_flight"] == 0
+
+    asyncio.run(run())
+
+
+def test_cancelled_run_is_not_reused():
+    async def run():
+        flights, started, release = SingleFlight(), [], asyncio.Event()
+        key = flight_key("q", "v1")
+        subscriber = asyncio.create_task(flights.result(key, make_run(started, release)))
+        await asyncio.sleep(0.01)
+        subscriber.cancel()
+        await asyncio.gather(subscriber, return_exceptions=True)
+        release.set()
+        assert [message.content for message in await flights.result(key, make_run(started, release))] == ["answer"]
+        assert len(started) == 2
+
+    asyncio.run(run())
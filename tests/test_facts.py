@@ -0,0 +1,66 @@
+from langchain_core.documents import Document
+
+from src.ingestion.facts import extract_facts
+from src.retrieval.facts import FactIndex
+
+PAGE = Document(
+    page_content=(
+        "Stock Market Performance 2024\n"
+        "The benchmark S&P 500 index delivered roughly a 25% total return for 2024 "
+        "(around +23% in price terms).\n"
+        "This marked the second consecutive year of over 20% returns for the S&P 500 - "
+        "a feat not observed since the late 1990s.\n"
+        "The Nasdaq Composite jumped nearly 29% in 2024."
+    ),
+    metadata={"page": 0},
+)
+
+
+def build_index():
+    facts = extract_facts([PAGE])
+    for fact in facts:
+        fact["source"] = "report.pdf"
+    return facts, FactIndex.from_facts(facts, [], {"report.pdf": ""})
+
+
+def test_threshold_figure_is_a_bound():
+    facts, _ = build_index()
+    returns = {fact["text"]: fact for fact in facts if fact["entity"] == "S&P 500" and fact["metric"] == "return"}
+    assert returns["25%"]["bound"] is False
+    assert returns["over 20%"]["bound"] is True
+
+
+def test_exact_lookup_skips_bounds():
+    _, index = build_index()
+    facts, _ = index.lookup("S&P 500 2024 return")
+    assert [fact["text"] for fact in facts] == ["25%"]
+
+
+def test_bound_returned_when_nothing_exact():
+    _, index = build_index()
+    facts, _ = index.lookup("Nasdaq Composite 2024 return")
+    assert [fact["text"] for fact in facts] == ["nearly 29%"]
+
+
+def fact(entity, value, source):
+    return {"entity": entity, "metric": "market cap", "year": 2024, "value": value, "unit": "$",
+            "text": f"${value:g}", "page": 0, "evidence": "", "source": source}
+
+
+def test_entities_merge_by_ticker_across_sources():
+    index = FactIndex.from_facts(
+        [fact("Meta", 1.5e12, "a.pdf"), fact("Meta Platforms", 1.6e12, "b.pdf")],
+        [{"name": "Meta", "ticker": "META", "aliases": ["Meta", "META"]},
+         {"name": "Meta Platforms", "ticker": "META", "aliases": ["Meta Platforms", "META"]}],
+        {"a.pdf": "", "b.pdf": ""},
+    )
+    assert len(index.entities) == 1
+    facts, parsed = index.lookup("Meta Platforms market cap")
+    assert parsed["entities"] == ["Meta"]
+    assert sorted(f["source"] for f in facts) == ["a.pdf", "b.pdf"]
+
+
+def test_look_up_asks_for_no_return():
+    _, index = build_index()
+    _, parsed = index.lookup("look up the S&P 500 figures")
+    assert parsed["metrics"] == []
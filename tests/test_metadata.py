@@ -0,0 +1,39 @@
+from langchain_core.documents import Document
+
+from src.ingestion.metadata import annotate_chunks, document_date
+from src.retrieval.filters import MetadataIndex
+
+
+def test_iso_pdf_date():
+    # PyPDFLoader turns "D:20240315120000+00'00'" into ISO text
+    assert document_date({"creationdate": "2024-03-15T12:00:00+00:00"}) == "2024-03-15"
+
+
+def test_raw_pdf_date():
+    assert document_date({"creationdate": "D:20240315120000+00'00'"}) == "2024-03-15"
+    assert document_date({"moddate": "D:2024"}) == "2024-01-01"
+
+
+def test_title_year_wins_over_file_date():
+    metadata = {"creationdate": "D:20250411184712"}
+    assert document_date(metadata, "Stock Market Performance in 2024") == "2024"
+    assert document_date(metadata, "Market Overview") == "2025-04-11"
+    assert document_date({}) is None
+
+
+def test_chunks_dated_by_title():
+    page = Document(
+        page_content="Stock Market Performance in 2024\nThe year was a strong one for equities.",
+        metadata={"page": 0, "creationdate": "D:20250411184712"},
+    )
+    chunk = Document(page_content="The year was a strong one for equities.", metadata={"page": 0, "start_index": 33})
+    assert annotate_chunks([page], [chunk])[0].metadata["date"] == "2024"
+
+
+def test_date_filters():
+    index = MetadataIndex()
+    index.add(["report", "memo"], [{"date": "2024"}, {"date": "2025-04-11"}])
+    assert index.resolve(date_from="2024", date_to="2024").ids == {"report"}
+    assert index.resolve(date_from="2024-06-01", date_to="2024-12-31").ids == {"report"}
+    assert index.resolve(date_from="2025-01-01").ids == {"memo"}
+    assert index.resolve(date_to="2023").ids == set()
@@ -0,0 +1,39 @@
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from src.retrieval.numpy_store import NumpyVectorStore
+
+VECTORS = {"apple": [1.0, 0.0, 0.0], "nvidia": [0.0, 1.0, 0.0], "tesla": [0.0, 0.0, 1.0]}
+
+
+class WordEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return [VECTORS[text] for text in texts]
+
+    def embed_query(self, text):
+        return VECTORS[text]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = NumpyVectorStore(tmp_path / "index", WordEmbeddings())
+    store.add_texts(list(VECTORS), ids=list(VECTORS))
+    return store
+
+
+def test_similarity_search(store):
+    assert [doc.id for doc in store.similarity_search("nvidia", k=1)] == ["nvidia"]
+    doc, score = store.similarity_search_with_score("tesla", k=1)[0]
+    assert doc.page_content == "tesla" and score == pytest.approx(1.0)
+
+
+def test_ids_restrict_the_search(store):
+    assert [doc.id for doc in store.similarity_search("nvidia", k=1, ids=["apple", "tesla"])] != ["nvidia"]
+    assert {doc.id for doc in store.similarity_search("nvidia", k=3, ids=["apple", "tesla"])} == {"apple", "tesla"}
+
+
+def test_unsupported_arguments_fail_loudly(store):
+    with pytest.raises(TypeError):
+        store.similarity_search("apple", k=1, filter={"source": "a.pdf"})
+    with pytest.raises(TypeError):
+        store.similarity_search_by_vector(VECTORS["apple"], k=1, where={"page": 1})
@@ -0,0 +1,52 @@
+import numpy as np
+
+from src.agents.semantic_cache import SemanticAnswerCache
+
+
+def test_similar_question_hits():
+    cache = SemanticAnswerCache(threshold=0.95)
+    cache.store("How did NVDA do?", [1.0, 0.0], "v1", ["answer"])
+    hit = cache.lookup([0.99, 0.05], "v1")
+    assert hit["question"] == "How did NVDA do?" and hit["messages"] == ["answer"]
+    assert hit["similarity"] > 0.95
+
+
+def test_dissimilar_question_misses():
+    cache = SemanticAnswerCache(threshold=0.95)
+    cache.store("How did NVDA do?", [1.0, 0.0], "v1", ["answer"])
+    assert cache.lookup([0.7, 0.7], "v1") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_other_collection_version_misses():
+    cache = SemanticAnswerCache()
+    cache.store("How did NVDA do?", [1.0, 0.0], "v1", ["old answer"])
+    assert cache.lookup([1.0, 0.0], "v2") is None
+    cache.store("How did NVDA do?", [1.0, 0.0], "v2", ["new answer"])
+    assert cache.lookup([1.0, 0.0], "v2")["messages"] == ["new answer"]
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticAnswerCache(max_entries=2)
+    cache.store("a", [1.0, 0.0, 0.0], "v1", ["a"])
+    cache.store("b", [0.0, 1.0, 0.0], "v1", ["b"])
+    assert cache.lookup([1.0, 0.0, 0.0], "v1") is not None
+    cache.store("c", [0.0, 0.0, 1.0], "v1", ["c"])
+    assert cache.lookup([0.0, 1.0, 0.0], "v1") is None
+    assert cache.lookup([1.0, 0.0, 0.0], "v1") is not None
+    assert cache.stats()["entries"] == 2
+
+
+def test_entries_expire():
+    cache = SemanticAnswerCache(ttl_seconds=0)
+    cache.store("a", [1.0, 0.0], "v1", ["a"])
+    assert cache.lookup([1.0, 0.0], "v1") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_caller_vectors_are_not_modified():
+    cache = SemanticAnswerCache()
+    vector = np.array([3.0, 4.0], dtype=np.float32)
+    cache.store("a", vector, "v1", ["a"])
+    cache.lookup(vector, "v1")
+    assert vector.tolist() == [3.0, 4.0]